@@ -0,0 +1,233 @@
+"""
+Created on 17/10/2026
+
+@author: gioia
+
+This script benchmarks the ChatServer backends when many idle clients are connected.
+
+For each backend and for each number of connections, the script:
+- runs the server into a child process;
+- connects the given number of idle clients, measuring the connection rate;
+- measures the memory used by the server for each connection;
+- measures the time needed to broadcast a message to all the connected clients.
+
+Presence announcements are disabled during the benchmark: announcing N clients costs O(N^2) messages,
+which would hide the cost of the event loop itself. The select backend cannot watch more than FD_SETSIZE
+(1024) sockets, so it is expected to fail beyond that number of connections.
+
+The programming language used is Python 2.7 and it is assumed you have it installed into your PC.
+The operating system of reference is Linux. There are two basic ways to execute this script in Linux:
+1 - launching it by the command shell through the python command;
+2 - making it executable first and then launching it by the command shell.
+
+
+Enjoy!
+"""
+import os
+import sys
+import time
+import errno
+import select
+import socket
+import struct
+import argparse
+import resource
+import multiprocessing
+
+from chat_server import ChatServer, EpollChatServer
+from chat_cluster import ChatCluster
+
+_HOST = '127.0.0.1'  # defines the host as "localhost"
+_PORT = 10100        # defines the first port used by the benchmarked servers
+_CONNECT_TIMEOUT = 5  # defines the max waiting time (in seconds) for a client connection
+_BROADCAST_TIMEOUT = 30  # defines the max waiting time (in seconds) for a broadcast to be completed
+
+_BACKENDS = {'select': ChatServer, 'epoll': EpollChatServer,
+             'cluster': ChatCluster}  # maps each backend name to its server class
+
+
+def _raise_fd_limit():
+    """
+    Raises the soft limit of open file descriptors to the hard limit.
+    """
+    _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _serve(server_class, port):
+    """
+    Runs a server without presence announcements into the current process.
+
+    :param server_class: the class of the server
+    :param port: the port on which the server is bounded
+    """
+    _raise_fd_limit()
+    sys.stdout = open(os.devnull, 'w')  # Silences the connection logs
+    server = server_class(_HOST, port)
+    server.ANNOUNCE_PRESENCE = False
+    server.run()
+
+
+def _get_rss(pid):
+    """
+    Gets the resident memory of a process, including the memory of its children (i.e. the workers of a cluster).
+
+    :param pid: the process identifier
+    :return: the resident memory (in KB)
+    """
+    rss = 0
+    with open('/proc/%d/status' % pid) as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                rss = int(line.split()[1])
+    try:
+        with open('/proc/%d/task/%d/children' % (pid, pid)) as children:
+            rss += sum(_get_rss(int(child)) for child in children.read().split())
+    except IOError:
+        pass  # The kernel does not list the children
+    return rss
+
+
+def _connect_client(port, retry=False):
+    """
+    Connects a new client to the server.
+
+    :param port: the port on which the server is bounded
+    :param retry: tells whether the connection should be retried until the server is ready
+    :return: the non-blocking client socket
+    """
+    deadline = time.time() + _CONNECT_TIMEOUT
+    while True:
+        client = socket.socket()
+        client.settimeout(_CONNECT_TIMEOUT)
+        try:
+            client.connect((_HOST, port))
+        except socket.error:
+            client.close()
+            if not retry or time.time() > deadline:
+                raise
+            time.sleep(0.05)
+        else:
+            client.setblocking(0)
+            return client
+
+
+def _broadcast(clients, msg):
+    """
+    Sends a message from the first client and waits until all the other clients have received it.
+
+    :param clients: the list of the non-blocking client sockets
+    :param msg: the message to send
+    :return: the elapsed time (in seconds)
+    """
+    poller = select.epoll()
+    expected = {}  # maps the file descriptor of each receiving client to the number of bytes it still expects
+    by_fd = {}
+    frame_len = len(struct.pack('>I', 0)) + len("\r<%s> " % (clients[0].getsockname(),)) + len(msg)
+    for client in clients[1:]:
+        expected[client.fileno()] = frame_len
+        by_fd[client.fileno()] = client
+        poller.register(client.fileno(), select.EPOLLIN)
+    start = time.time()
+    clients[0].setblocking(1)
+    clients[0].sendall(struct.pack('>I', len(msg)) + msg)
+    clients[0].setblocking(0)
+    try:
+        while expected:
+            ready = poller.poll(_BROADCAST_TIMEOUT)
+            if not ready:
+                raise RuntimeError('%d clients did not receive the broadcast' % len(expected))
+            for fd, _ in ready:
+                try:
+                    data = by_fd[fd].recv(expected[fd])
+                except socket.error as e:
+                    if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        continue
+                    raise
+                if not data:
+                    raise RuntimeError('A client was disconnected by the server')
+                expected[fd] -= len(data)
+                if not expected[fd]:
+                    del expected[fd]
+                    poller.unregister(fd)
+        return time.time() - start
+    finally:
+        poller.close()
+
+
+def _run_benchmark(backend, port, connections, rounds):
+    """
+    Benchmarks a backend with the given number of idle connections.
+
+    :param backend: the name of the backend
+    :param port: the port on which the server is bounded
+    :param connections: the number of idle clients
+    :param rounds: the number of measured broadcasts
+    :return: the dictionary of the measured values
+    """
+    result = {'backend': backend, 'connections': connections}
+    server = multiprocessing.Process(target=_serve, args=(_BACKENDS[backend], port))
+    server.start()
+    clients = []
+    try:
+        clients.append(_connect_client(port, retry=True))  # Waits for the server to be ready
+        rss_before = _get_rss(server.pid)
+        start = time.time()
+        for _ in xrange(connections - 1):
+            clients.append(_connect_client(port))
+        connect_time = time.time() - start
+        time.sleep(0.5)  # Gives the server the time for accepting the last connections
+        if not server.is_alive():
+            raise RuntimeError('The server crashed')
+        result['connect_per_sec'] = (connections - 1) / connect_time
+        result['rss_kb_per_conn'] = (_get_rss(server.pid) - rss_before) / float(connections)
+        times = sorted(_broadcast(clients, 'x' * 64) for _ in xrange(rounds))
+        result['broadcast_ms'] = times[len(times) // 2] * 1000
+    except (socket.error, RuntimeError) as e:
+        result['error'] = str(e) or e.__class__.__name__
+    finally:
+        for client in clients:
+            client.close()
+        server.terminate()
+        server.join()
+    return result
+
+
+def _display_result(result):
+    """
+    Simply displays the values measured for a backend.
+
+    :param result: the dictionary of the measured values
+    """
+    if 'error' in result:
+        print '{backend:>8} {connections:>8} failed: {error}'.format(**result)
+    else:
+        print ('{backend:>8} {connections:>8} {connect_per_sec:>14.0f} {rss_kb_per_conn:>15.2f} '
+               '{broadcast_ms:>14.2f}'.format(**result))
+
+
+def main():
+    """
+    The main function of the program. It benchmarks each backend with each number of connections.
+    """
+    parser = argparse.ArgumentParser(description='Benchmarks the ChatServer backends with many idle clients.')
+    parser.add_argument('-backends', help='the benchmarked backends', nargs='+', choices=sorted(_BACKENDS),
+                        default=['select', 'epoll', 'cluster'])
+    parser.add_argument('-connections', help='the numbers of idle clients', nargs='+', type=int,
+                        default=[1000, 5000, 20000])
+    parser.add_argument('-rounds', help='the number of measured broadcasts', type=int, default=5)
+    args = parser.parse_args()
+    _raise_fd_limit()
+    print '{:>8} {:>8} {:>14} {:>15} {:>14}'.format('backend', 'clients', 'connect/sec', 'rss KB/client',
+                                                    'broadcast ms')
+    port = _PORT
+    for connections in args.connections:
+        for backend in args.backends:
+            _display_result(_run_benchmark(backend, port, connections, args.rounds))
+            port += 1
+
+
+if __name__ == '__main__':
+    """The entry point of the program. It simply calls the main function.
+    """
+    main()
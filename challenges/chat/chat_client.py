@@ -7,8 +7,13 @@ This script runs a simple ChatClient built with sockets.
 
 The code is organized as follows:
 - the ChatClient class defines the behaviour of the client;
+- the PollChatClient class defines a client driven by a poll event loop over a non-blocking socket;
 - the main module function simply executes the server.
 
+The client keeps track of the sequence number of the next message of each room it has joined. When the connection
+is lost, the client may reconnect (RECONNECT_ATTEMPTS): it then joins its rooms again and asks the server for the
+messages published meanwhile, which are replayed as the client reads them.
+
 The programming language used is Python 2.7 and it is assumed you have it installed into your PC.
 The operating system of reference is Linux. There are two basic ways to execute this script in Linux:
 1 - launching it by the command shell through the python command;
@@ -17,20 +22,31 @@ The operating system of reference is Linux. There are two basic ways to execute
 
 Enjoy!
 """
+import re
 import sys
-import math
+import time
+import errno
 import struct
 import socket
 import select
+import argparse
 import threading
 
+from chat_framing import FrameDecoder
+
 _HOST = '127.0.0.1'  # defines the host as "localhost"
 _PORT = 10000        # defines the port as "10000"
 
+_READ_EVENTS = select.POLLIN | select.POLLPRI  # defines the events signalling a readable file descriptor
+_WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK)  # defines the errors raised by a non-blocking socket not ready
+_HISTORY_END = re.compile(r'\nHistory of the room (\S+) replayed up to #(\d+)\n$')  # matches the end of a history
+
 class ChatClient(threading.Thread):
 
     RECV_BUFFER = 4096  # defines the size (in bytes) of the receiving buffer
     RECV_MSG_LEN = 4  # defines the size (in bytes) of the placeholder contained at the beginning of the messages
+    RECONNECT_ATTEMPTS = 0  # defines how many times the client tries to reconnect when the server is lost
+    RECONNECT_DELAY = 1  # defines the waiting time (in seconds) before each attempt to reconnect
 
     def __init__(self, host, port):
         """
@@ -43,10 +59,15 @@ class ChatClient(threading.Thread):
         self.port = port
         self.running = True
         self.client_socket = None
+        self.decoder = FrameDecoder(self.RECV_BUFFER)  # reassembles the messages received from the server
+        self.rooms = {}  # maps each joined room to the sequence number of its next message (None until known)
 
-    def _connect(self):
+    def _connect(self, exit_on_failure=True):
         """
         Creates the client socket and connects it to the given host and port.
+
+        :param exit_on_failure: tells whether the client should exit when the server is unreachable
+        :return: True if the client is connected, False otherwise
         """
         self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.client_socket.settimeout(2)
@@ -54,8 +75,69 @@ class ChatClient(threading.Thread):
             self.client_socket.connect((self.host, self.port))
         except socket.error:
             print 'Unable to connect.'
-            sys.exit()
+            if exit_on_failure:
+                sys.exit()
+            self.client_socket.close()
+            return False
         print 'Connected to remote host. Start sending messages.'
+        return True
+
+    def _reconnect(self):
+        """
+        Tries to connect again to the server, then resumes the rooms the client had joined.
+
+        :return: True if the client has reconnected, False otherwise
+        """
+        self.client_socket.close()
+        self.decoder = FrameDecoder(self.RECV_BUFFER)  # Drops the incomplete message of the lost connection
+        for _ in xrange(self.RECONNECT_ATTEMPTS):
+            time.sleep(self.RECONNECT_DELAY)
+            if self._connect(exit_on_failure=False):
+                self._resume_rooms()
+                return True
+        return False
+
+    def _resume_rooms(self):
+        """
+        Joins again the rooms of the client and asks for the messages published since the last one received.
+        """
+        for room, seq in self.rooms.iteritems():
+            self._send('/join %s\n' % room)
+            self._send('/history %s %s\n' % (room, '' if seq is None else seq))
+
+    def _handle_input(self, msg):
+        """
+        Sends a message entered by the user, keeping track of the rooms joined and of the messages published.
+
+        :param msg: the message
+        """
+        command, _, args = msg.partition(' ')
+        room = args.partition(' ')[0].strip()
+        self._send(msg)
+        if room and command == '/join' and room not in self.rooms:
+            self.rooms[room] = None
+            self._send('/history %s\n' % room)  # Asks for the sequence number of the next message of the room
+        elif room and command == '/leave':
+            self.rooms.pop(room, None)
+        elif room and command == '/pub' and self.rooms.get(room) is not None:
+            self.rooms[room] += 1  # The server does not send the client its own messages
+
+    def _handle_message(self, data):
+        """
+        Writes a message received from the server, keeping track of the sequence numbers of the rooms.
+
+        :param data: the unpacked message
+        """
+        if data.startswith('\r['):
+            room = data[2:data.find(']')]
+            if self.rooms.get(room) is not None:
+                self.rooms[room] += 1
+        else:
+            history_end = _HISTORY_END.match(data)
+            if history_end is not None and history_end.group(1) in self.rooms:
+                self.rooms[history_end.group(1)] = int(history_end.group(2))
+        sys.stdout.write(data)  # Writes the server message
+        self._prompt()          # followed by a prompt
 
     def _prompt(self):
         """
@@ -75,32 +157,17 @@ class ChatClient(threading.Thread):
 
     def _receive(self, sock):
         """
-        Receives an incoming message from the client and unpacks it.
+        Receives the bytes available on the socket and unpacks the whole messages received.
 
         :param sock: the incoming socket
-        :return: the unpacked message
-        """
-        data = None
-        # Retrieves the first 4 bytes from the message
-        msg_len = sock.recv(self.RECV_MSG_LEN)
-        # If the message has the 4 bytes representing the length...
-        if msg_len:
-            data = ''
-            # Unpacks the message and gets the message length
-            msg_len = struct.unpack('>I', msg_len)[0]
-            # Computes the number of expected chunks of RECV_BUFFER size
-            chunks = int(math.ceil(msg_len / float(self.RECV_BUFFER)))
-            for _ in xrange(chunks):
-                # Retrieves the chunk i-th chunk of RECV_BUFFER size
-                chunk = sock.recv(self.RECV_BUFFER)
-                # If there isn't the expected chunk...
-                if not chunk:
-                    data = None
-                    break # ... Simply breaks the loop
-                else:
-                    # Merges the chunks content
-                    data += chunk
-        return data
+        :return: the list of the unpacked messages, or None if the server has disconnected
+        """
+        try:
+            return self.decoder.recv_from(sock)
+        except socket.error as e:
+            if e.errno in _WOULD_BLOCK or e.errno == errno.EINTR:
+                return []
+            return None
 
     def _run(self):
         """
@@ -119,17 +186,18 @@ class ChatClient(threading.Thread):
                 for sock in ready_to_read:
                     # If there's an incoming message from the server...
                     if sock == self.client_socket:
-                        data = self._receive(sock)  # Gets the server message
-                        if not data:
+                        messages = self._receive(sock)  # Gets the server messages
+                        if messages is None:
                             print '\nDisconnected from the server.'
-                            sys.exit()
-                        else:
-                            sys.stdout.write(data)  # Writes the server message
-                            self._prompt()          # followed by a prompt
+                            if not self._reconnect():
+                                sys.exit()
+                            break
+                        for data in messages:
+                            self._handle_message(data)  # Writes the server message
                     # ... else, the user has entered a message on the console
                     else :
                         msg = sys.stdin.readline()
-                        self._send(msg) # Sends the message to the server...
+                        self._handle_input(msg) # Sends the message to the server...
                         self._prompt()  # ...and returns the prompt
         # Clears the socket connection
         self.stop()
@@ -149,14 +217,119 @@ class ChatClient(threading.Thread):
         self.running = False
         self.client_socket.close()
 
+class PollChatClient(ChatClient):
+    """
+    Defines a chat client driven by a poll event loop over a non-blocking socket. Incoming messages are
+    reassembled from the stream exactly as the server framed them, whatever the size of the chunks
+    returned by the socket, and outgoing messages never block the loop.
+    """
+
+    def __init__(self, host, port):
+        """
+        Initializes a new PollChatClient
+        :param host: the host on which the client connects
+        :param port: the port on which the client connects
+        """
+        ChatClient.__init__(self, host, port)
+        self.poller = None
+        self.out_buffer = bytearray()  # collects the bytes the socket was not ready to send
+
+    def _connect(self, exit_on_failure=True):
+        """
+        Creates the client socket, connects it to the given host and port and registers it
+        into the poller together with the standard input.
+
+        :param exit_on_failure: tells whether the client should exit when the server is unreachable
+        :return: True if the client is connected, False otherwise
+        """
+        if not ChatClient._connect(self, exit_on_failure):
+            return False
+        del self.out_buffer[:]  # Drops the bytes the lost connection was not able to send
+        self.client_socket.setblocking(0)
+        self.poller = select.poll()
+        self.poller.register(self.client_socket.fileno(), _READ_EVENTS)
+        self.poller.register(sys.stdin.fileno(), _READ_EVENTS)
+        return True
+
+    def _send(self, msg):
+        """
+        Prefixes each message with a 4-byte length and sends it without blocking.
+        """
+        # Packs the message with 4 leading bytes representing the message length
+        self.out_buffer += struct.pack('>I', len(msg))
+        self.out_buffer += msg
+        self._flush()
+
+    def _flush(self):
+        """
+        Sends as many buffered bytes as the socket accepts, then watches the socket for
+        writability only if some bytes are still waiting.
+        """
+        try:
+            sent = self.client_socket.send(self.out_buffer)
+        except socket.error as e:
+            if e.errno not in _WOULD_BLOCK:
+                raise
+            sent = 0
+        del self.out_buffer[:sent]
+        events = _READ_EVENTS | select.POLLOUT if self.out_buffer else _READ_EVENTS
+        self.poller.modify(self.client_socket.fileno(), events)
+
+    def _run(self):
+        """
+        Actually runs the client.
+        """
+        while self.running:
+            socket_fd = self.client_socket.fileno()
+            # Gets the list of file descriptors which are ready through the poller
+            # The poll has a timeout of 60 seconds
+            try:
+                ready = self.poller.poll(60 * 1000)
+            except select.error:
+                continue  # Interrupted by a signal
+            for fd, events in ready:
+                # If there's an incoming message from the server...
+                if fd == socket_fd:
+                    if events & select.POLLOUT:
+                        self._flush()  # Sends the bytes still waiting
+                    if events & ~select.POLLOUT:
+                        messages = self._receive(self.client_socket)  # Gets the server messages
+                        if messages is None:
+                            print '\nDisconnected from the server.'
+                            if not self._reconnect():
+                                sys.exit()
+                            break
+                        for data in messages:
+                            self._handle_message(data)  # Writes the server message
+                # ... else, the user has entered a message on the console
+                else:
+                    msg = sys.stdin.readline()
+                    if not msg:
+                        self.poller.unregister(fd)  # The standard input has been closed
+                        continue
+                    self._handle_input(msg) # Sends the message to the server...
+                    self._prompt()  # ...and returns the prompt
+        # Clears the socket connection
+        self.stop()
+
+
+_BACKENDS = {'select': ChatClient, 'poll': PollChatClient}  # maps each client mode to its class
+
+
 def main():
     """
     The main function of the program. It creates and runs a new ChatClient.
     """
-    chat_client = ChatClient(_HOST, _PORT)
+    parser = argparse.ArgumentParser(description='Runs a simple ChatClient.')
+    parser.add_argument('-backend', help='the event loop used by the client (default: select)',
+                        choices=sorted(_BACKENDS), default='select')
+    parser.add_argument('-reconnect', help='the number of attempts to reconnect when the server is lost',
+                        type=int, default=0)
+    args = parser.parse_args()
+    chat_client = _BACKENDS[args.backend](_HOST, _PORT)
+    chat_client.RECONNECT_ATTEMPTS = args.reconnect
     chat_client.start()
 
-
 if __name__ == '__main__':
     """The entry point of the program. It simply calls the main function.
     """
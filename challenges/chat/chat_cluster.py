@@ -0,0 +1,265 @@
+"""
+Created on 17/10/2026
+
+@author: gioia
+
+This script runs a ChatServer spread over many worker processes, so that the server is not bound to a single core.
+
+The code is organized as follows:
+- the ClusterChatServer class defines a worker: an EpollChatServer which shares its port with the other workers
+  and relays its broadcasts to them;
+- the ChatCluster class forks the workers and connects them to each other;
+- the main module function simply executes the cluster.
+
+All the workers accept the connections on the same port (SO_REUSEPORT), so that the kernel spreads the clients
+among them. Each pair of workers is connected by a Unix socket, on which the broadcast messages travel with the
+same framing used by the clients: this way every client still receives every message, whatever the worker it is
+connected to. Each relayed message starts with the (packed) room it was published to, which is empty for the
+messages broadcast to everyone; room subscriptions stay local to the worker of each client. Each worker keeps its
+own history of the rooms, so the sequence numbers of a room are only meaningful to the worker which sent them.
+
+The programming language used is Python 2.7 and it is assumed you have it installed into your PC.
+The operating system of reference is Linux (SO_REUSEPORT requires Linux 3.9). There are two basic ways to
+execute this script in Linux:
+1 - launching it by the command shell through the python command;
+2 - making it executable first and then launching it by the command shell.
+
+
+Enjoy!
+"""
+import signal
+import socket
+import struct
+import argparse
+import multiprocessing
+
+from chat_framing import encode_frame
+from chat_server import EpollChatServer, _Connection, _READ_EVENTS, _WRITE_EVENTS
+
+_HOST = '127.0.0.1'  # defines the host as "localhost"
+_PORT = 10000        # defines the port as "10000"
+_ROOM_LEN = 4        # defines the size (in bytes) of the placeholder of the room at the beginning of relayed messages
+
+
+class ClusterChatServer(EpollChatServer):
+    """
+    Defines a worker of the chat cluster. Messages broadcast or published by its clients are also relayed to
+    the other workers, while messages relayed by the other workers are only sent to its clients.
+    """
+
+    REUSE_PORT = True  # lets all the workers accept connections on the same port
+    BUS_HIGH_WATER_MARK = 64 << 20  # defines the max number of bytes queued for another worker before detaching it
+
+    def __init__(self, host, port, bus_sockets):
+        """
+        Initializes a new ClusterChatServer.
+
+        :param host: the host on which the server is bounded
+        :param port: the port on which the server is bounded
+        :param bus_sockets: the list of the sockets connected to the other workers
+        """
+        EpollChatServer.__init__(self, host, port)
+        self.bus_sockets = bus_sockets
+        self.bus = {}  # maps the file descriptor of each bus socket to the _Connection of the other worker
+
+    def _bind_socket(self):
+        """
+        Creates the server socket, binds it to the given host and port and registers both
+        the server socket and the bus sockets into the poller.
+        """
+        EpollChatServer._bind_socket(self)
+        for sock in self.bus_sockets:
+            sock.setblocking(0)
+            peer = _Connection(sock, sock.getpeername(), self.RECV_BUFFER)
+            self.bus[peer.fd] = peer
+            self.poller.register(peer.fd, _READ_EVENTS)
+
+    def _broadcast(self, client_conn, client_message):
+        """
+        Broadcasts a message to all the local clients different from the client sending the message
+        and relays it to the other workers.
+
+        :param client_conn: the _Connection of the client sending the message
+        :param client_message: the message to broadcast
+        """
+        self._fan_out(client_conn, encode_frame(client_message))
+        self._relay('', client_message)
+
+    def _publish(self, client_conn, room, client_message):
+        """
+        Sends a message to the local subscribers of a room different from the client sending the message
+        and relays it to the other workers.
+
+        :param client_conn: the _Connection of the client sending the message
+        :param room: the room
+        :param client_message: the message to publish
+        """
+        EpollChatServer._publish(self, client_conn, room, client_message)
+        self._relay(room, client_message)
+
+    def _relay(self, room, client_message):
+        """
+        Sends a message to the other workers, prefixed with the room it was published to. Relayed messages
+        are never dropped: a worker which does not read them beyond the bus high-water mark is detached
+        instead, so that a stalled worker cannot make the others buffer without limit.
+
+        :param room: the room ('' for the messages broadcast to everyone)
+        :param client_message: the message to relay
+        """
+        frame = encode_frame(encode_frame(room) + client_message)
+        for peer in self.bus.values():
+            if peer.out_bytes + len(frame) > self.BUS_HIGH_WATER_MARK:
+                print "Worker on the bus socket %d is stalled: detached" % peer.fd
+                self._detach(peer)
+                continue
+            self._enqueue(peer, frame)
+
+    def _handle_event(self, fd, events):
+        """
+        Handles the events of the bus sockets: messages relayed by the other workers are either broadcast
+        to the local clients or published to the local subscribers of their room.
+
+        :param fd: the ready file descriptor
+        :param events: the bit mask of the ready events
+        """
+        peer = self.bus.get(fd)
+        if peer is None:
+            return  # Either the wakeup pipe or a client disconnected in this iteration
+        if events & _WRITE_EVENTS:
+            self._flush(peer)
+        if events & ~_WRITE_EVENTS and fd in self.bus:
+            messages = self._receive(peer)
+            if messages is None:
+                self._detach(peer)
+                return
+            for data in messages:
+                room_end = _ROOM_LEN + struct.unpack_from('>I', data)[0]
+                room, client_message = data[_ROOM_LEN:room_end], data[room_end:]
+                if room:
+                    EpollChatServer._publish(self, None, room, client_message)
+                else:
+                    self._fan_out(None, encode_frame(client_message))
+
+    def _disconnect(self, conn):
+        """
+        Removes either a client or a broken bus socket.
+
+        :param conn: the _Connection to remove
+        """
+        if conn.fd in self.bus:
+            self._detach(conn)
+        else:
+            EpollChatServer._disconnect(self, conn)
+
+    def _detach(self, peer):
+        """
+        Removes the bus socket of a worker which has stopped.
+
+        :param peer: the _Connection of the stopped worker
+        """
+        del self.bus[peer.fd]
+        self._pending.discard(peer)
+        self.poller.unregister(peer.fd)
+        peer.sock.close()
+
+
+class ChatCluster(object):
+    """
+    Defines the launcher of the chat cluster: it forks the workers, connects each pair of them through
+    a Unix socket and waits for them.
+    """
+
+    ANNOUNCE_PRESENCE = True  # tells whether clients entering and leaving the chat room should be announced
+    COLLECT_STATS = False  # tells whether each worker should collect its statistics
+    STATS_INTERVAL = 10  # defines the interval (in seconds) between two dumps of the statistics (0 for never)
+
+    def __init__(self, host, port, workers=None):
+        """
+        Initializes a new ChatCluster.
+
+        :param host: the host on which the workers are bounded
+        :param port: the port on which the workers are bounded
+        :param workers: the number of workers (default: the number of cores)
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers or multiprocessing.cpu_count()
+        self.processes = []
+
+    def _connect_bus(self):
+        """
+        Connects each pair of workers through a Unix socket.
+
+        :return: the list of the bus sockets of each worker
+        """
+        bus = [[] for _ in xrange(self.workers)]
+        for i in xrange(self.workers):
+            for j in xrange(i + 1, self.workers):
+                sock_i, sock_j = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+                bus[i].append(sock_i)
+                bus[j].append(sock_j)
+        return bus
+
+    def _run_worker(self, bus, index):
+        """
+        Runs a worker into the current (forked) process.
+
+        :param bus: the list of the bus sockets of each worker
+        :param index: the index of the worker
+        """
+        for i, sockets in enumerate(bus):
+            if i != index:
+                for sock in sockets:
+                    sock.close()  # Keeps only the sockets of this worker
+        server = ClusterChatServer(self.host, self.port, bus[index])
+        server.ANNOUNCE_PRESENCE = self.ANNOUNCE_PRESENCE
+        server.COLLECT_STATS = self.COLLECT_STATS
+        server.STATS_INTERVAL = self.STATS_INTERVAL
+        signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+        server.run()
+
+    def run(self):
+        """
+        Forks the workers and waits for them.
+        """
+        bus = self._connect_bus()
+        for index in xrange(self.workers):
+            process = multiprocessing.Process(target=self._run_worker, args=(bus, index))
+            process.start()
+            self.processes.append(process)
+        for sockets in bus:
+            for sock in sockets:
+                sock.close()  # The sockets now belong to the workers
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        for process in self.processes:
+            process.join()
+
+    def stop(self):
+        """
+        Stops all the workers.
+        """
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+
+
+def main():
+    """
+    The main function of the program. It creates and runs a new ChatCluster.
+    """
+    parser = argparse.ArgumentParser(description='Runs a ChatServer spread over many worker processes.')
+    parser.add_argument('-workers', help='the number of worker processes (default: the number of cores)', type=int)
+    parser.add_argument('-stats', help='dumps the statistics of each worker on the standard error every given seconds',
+                        type=float, metavar='SECONDS')
+    args = parser.parse_args()
+    chat_cluster = ChatCluster(_HOST, _PORT, args.workers)
+    if args.stats:
+        chat_cluster.COLLECT_STATS = True
+        chat_cluster.STATS_INTERVAL = args.stats
+    chat_cluster.run()
+
+
+if __name__ == '__main__':
+    """The entry point of the program. It simply calls the main function.
+    """
+    main()
@@ -0,0 +1,125 @@
+"""
+Created on 17/10/2026
+
+@author: gioia
+
+This script provides the framing shared by the ChatServer and the ChatClient. Each message travels on the
+socket prefixed by a 4-byte (big-endian) length.
+
+The code is organized as follows:
+- the encode_frame function prefixes a message with its length;
+- the FrameError exception signals a message longer than the receiver accepts;
+- the FrameDecoder class incrementally extracts the messages from the bytes received on a socket.
+
+The programming language used is Python 2.7 and it is assumed you have it installed into your PC.
+The operating system of reference is Linux.
+
+
+Enjoy!
+"""
+import struct
+
+_HEADER = struct.Struct('>I')  # defines the 4-byte length placed at the beginning of the messages
+
+
+def encode_frame(msg):
+    """
+    Prefixes a message with its 4-byte length. The result can be shared by all the receivers of the message.
+
+    :param msg: the message
+    :return: the packed message
+    """
+    return _HEADER.pack(len(msg)) + msg
+
+
+class FrameError(ValueError):
+    """
+    Signals that a peer has declared a message longer than the max size accepted by the FrameDecoder,
+    i.e. a protocol error after which the connection should be closed.
+    """
+
+
+class FrameDecoder(object):
+    """
+    Incrementally decodes the length-prefixed messages received on a socket. The received bytes are read with
+    recv_into into a reusable buffer, so each read returns zero or more whole messages and never blocks
+    waiting for the rest of a message: the incomplete bytes are simply kept until the next read.
+    The buffer grows to hold the messages longer than its initial size, and it is released once
+    they have been decoded, so that a single long message does not pin a big buffer for good.
+    """
+
+    __slots__ = ('buffer_size', 'max_frame_size', '_buffer', '_view', '_start', '_end')
+
+    def __init__(self, buffer_size=4096, max_frame_size=None):
+        """
+        Initializes a new FrameDecoder. The buffer is allocated on the first read, so that idle
+        connections do not hold it.
+
+        :param buffer_size: the initial size (in bytes) of the receiving buffer
+        :param max_frame_size: the max size (in bytes) of the messages accepted (None for no limit)
+        """
+        self.buffer_size = buffer_size
+        self.max_frame_size = max_frame_size
+        self._buffer = None
+        self._view = None
+        self._start = 0  # the offset of the first byte not yet decoded
+        self._end = 0    # the offset of the first free byte
+
+    def _make_room(self):
+        """
+        Makes room at the end of the buffer, either by moving the bytes not yet decoded to its beginning
+        or, when the buffer is full of them, by doubling its size.
+        """
+        pending = self._end - self._start
+        if self._buffer is None:
+            self._buffer = bytearray(self.buffer_size)
+        elif self._start > 0:
+            self._view[:pending] = self._view[self._start:self._end]
+        else:
+            self._view = None  # Releases the buffer, which cannot be resized while exported
+            self._buffer.extend(bytearray(len(self._buffer)))
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        self._end = pending
+
+    def recv_from(self, sock):
+        """
+        Reads the bytes available on the socket with a single call and decodes the whole messages received.
+        The socket errors (e.g. a non-blocking socket not ready) are left to the caller.
+
+        :param sock: the incoming socket
+        :return: the list of the unpacked messages, or None if the connection was closed
+        :raise FrameError: if a message longer than the max frame size is declared
+        """
+        if self._buffer is None or self._end == len(self._buffer):
+            self._make_room()
+        received = sock.recv_into(self._view[self._end:])
+        if not received:
+            return None
+        self._end += received
+        return self._decode()
+
+    def _decode(self):
+        """
+        Extracts the messages whose 4 leading bytes and content have been completely received.
+
+        :return: the list of the unpacked messages
+        :raise FrameError: if a message longer than the max frame size is declared
+        """
+        messages = []
+        buf, start, end = self._buffer, self._start, self._end
+        while end - start >= _HEADER.size:
+            msg_len = _HEADER.unpack_from(buf, start)[0]
+            if self.max_frame_size is not None and msg_len > self.max_frame_size:
+                raise FrameError('A message of %d bytes was declared (at most %d)' % (msg_len, self.max_frame_size))
+            msg_end = start + _HEADER.size + msg_len
+            if msg_end > end:
+                break
+            messages.append(self._view[start + _HEADER.size:msg_end].tobytes())
+            start = msg_end
+        if start == end:
+            start = end = 0  # Everything has been decoded: the buffer is reused from its beginning...
+            if len(buf) > self.buffer_size:
+                self._buffer = self._view = None  # ... unless it has grown, so it is allocated again
+        self._start, self._end = start, end
+        return messages
@@ -0,0 +1,298 @@
+"""
+Created on 17/10/2026
+
+@author: gioia
+
+This script load-tests the ChatServer backends with many simulated clients.
+
+For each backend, the script runs the server into a child process and spreads the simulated clients among many
+load processes. Each load process drives its clients through an epoll loop: some of them (the senders) send
+timestamped messages at a fixed rate, while all of them receive the broadcast messages. The script measures:
+- the connection rate;
+- the memory used by the server for each connection;
+- the messages per second sent and delivered;
+- the fan-out latency (from the sending of a message to its delivery) at p50, p99 and p999;
+- the clients disconnected by the server.
+
+The results are written as JSON, so that they can be compared among backends and releases.
+
+The programming language used is Python 2.7 and it is assumed you have it installed into your PC.
+The operating system of reference is Linux. There are two basic ways to execute this script in Linux:
+1 - launching it by the command shell through the python command;
+2 - making it executable first and then launching it by the command shell.
+
+
+Enjoy!
+"""
+import sys
+import json
+import time
+import errno
+import Queue
+import select
+import socket
+import platform
+import argparse
+import multiprocessing
+
+from chat_stats import Histogram
+from chat_framing import FrameDecoder, encode_frame
+from chat_benchmark import _BACKENDS, _serve, _get_rss, _raise_fd_limit, _connect_client
+
+_PORT = 10200          # defines the first port used by the load-tested servers
+_DRAIN_TIME = 1.0      # defines the time (in seconds) given to the last messages for being delivered
+_REPORT_TIMEOUT = 60.0  # defines the max time (in seconds) waited for the reports of the load processes beyond
+                        # the expected one
+_STAMP = '> T'         # defines the marker preceding the timestamp into the broadcast messages
+_WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK)  # defines the errors raised by a non-blocking socket not ready
+
+
+class _SimulatedClient(object):
+    """
+    Holds the state of a simulated client.
+    """
+
+    __slots__ = ('sock', 'decoder', 'out_buffer', 'connected')
+
+    def __init__(self, sock):
+        """
+        Initializes a new _SimulatedClient.
+
+        :param sock: the non-blocking client socket
+        """
+        self.sock = sock
+        self.decoder = FrameDecoder()
+        self.out_buffer = bytearray()  # collects the bytes the socket was not ready to send
+        self.connected = True  # tells whether the client is still connected to the server
+
+
+def _disconnect(client, poller):
+    """
+    Stops watching a client disconnected by the server.
+
+    :param client: the _SimulatedClient
+    :param poller: the epoll object watching the client
+    """
+    poller.unregister(client.sock.fileno())
+    client.connected = False
+    del client.out_buffer[:]
+
+
+def _flush(client, poller):
+    """
+    Sends as many buffered bytes as the socket accepts.
+
+    :param client: the _SimulatedClient
+    :param poller: the epoll object watching the client
+    :return: the number of bytes still waiting
+    """
+    try:
+        sent = client.sock.send(client.out_buffer)
+    except socket.error as e:
+        if e.errno not in _WOULD_BLOCK:
+            _disconnect(client, poller)
+            return 0
+        sent = 0
+    del client.out_buffer[:sent]
+    events = select.EPOLLIN | select.EPOLLOUT if client.out_buffer else select.EPOLLIN
+    poller.modify(client.sock.fileno(), events)
+    return len(client.out_buffer)
+
+
+def _run_load(port, clients, senders, rate, duration, start_event, results):
+    """
+    Drives some simulated clients into the current process and reports what has been measured. The clients
+    disconnected by the server are left out, and a report is put on the queue even if the process fails.
+
+    :param port: the port on which the server is bounded
+    :param clients: the number of simulated clients
+    :param senders: the number of simulated clients sending messages
+    :param rate: the number of messages sent by each sender every second
+    :param duration: the duration (in seconds) of the load
+    :param start_event: the event starting the load once all the clients are connected
+    :param results: the queue on which the measures are reported
+    """
+    _raise_fd_limit()
+    try:
+        by_fd = {}
+        for _ in xrange(clients):
+            client = _SimulatedClient(_connect_client(port))
+            by_fd[client.sock.fileno()] = client
+    except socket.error as e:
+        results.put({'error': str(e)})
+        return
+    results.put({'connected': clients})
+    report = {'error': 'A load process has failed'}
+    try:
+        start_event.wait()
+        poller = select.epoll()
+        for fd in by_fd:
+            poller.register(fd, select.EPOLLIN)
+        sending = [client for client in by_fd.values()[:senders]]
+        interval = 1.0 / (rate * len(sending)) if sending else None  # the time between two messages of this process
+        latency = Histogram()
+        sent = received = turn = 0
+        start = time.time()
+        next_send = start
+        stop_sending = start + duration
+        stop = stop_sending + _DRAIN_TIME
+        now = start
+        while now < stop:
+            if interval is not None and now >= next_send and now < stop_sending:
+                # Sends a timestamped message from the next sender, unless it has been disconnected
+                client = sending[turn % len(sending)]
+                turn += 1
+                if client.connected:
+                    client.out_buffer += encode_frame('T%.6f\n' % now)
+                    _flush(client, poller)
+                    sent += 1
+                next_send += interval
+            timeout = max(0.0, min(next_send, stop) - now) if now < stop_sending else stop - now
+            for fd, events in poller.poll(timeout):
+                client = by_fd[fd]
+                if events & select.EPOLLOUT:
+                    _flush(client, poller)
+                if client.connected and events & (select.EPOLLIN | select.EPOLLERR | select.EPOLLHUP):
+                    try:
+                        messages = client.decoder.recv_from(client.sock)
+                    except socket.error as e:
+                        if e.errno in _WOULD_BLOCK:
+                            continue
+                        messages = None
+                    if messages is None:
+                        _disconnect(client, poller)  # Disconnected by the server
+                        continue
+                    now = time.time()
+                    for data in messages:
+                        stamp = data.find(_STAMP)
+                        if stamp >= 0:
+                            latency.add(now - float(data[stamp + len(_STAMP):]))
+                            received += 1
+            now = time.time()
+        report = {'sent': sent, 'received': received, 'latency': latency,
+                  'disconnected': sum(1 for client in by_fd.itervalues() if not client.connected)}
+    finally:
+        for client in by_fd.values():
+            client.sock.close()
+        results.put(report)
+
+
+def _get_report(results, loads, timeout):
+    """
+    Gets the next report of the load processes.
+
+    :param results: the queue on which the measures are reported
+    :param loads: the list of the load processes
+    :param timeout: the max waiting time (in seconds)
+    :return: the dictionary of the reported values
+    :raise RuntimeError: if a load process has died without reporting or if the report is late
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return results.get(timeout=1)
+        except Queue.Empty:
+            for load in loads:
+                if load.exitcode not in (None, 0):
+                    raise RuntimeError('A load process has exited with code %d' % load.exitcode)
+            if time.time() >= deadline:
+                raise RuntimeError('The load processes have not reported in time')
+
+
+def _run_test(backend, port, args):
+    """
+    Load-tests a backend.
+
+    :param backend: the name of the backend
+    :param port: the port on which the server is bounded
+    :param args: the parsed command line arguments
+    :return: the dictionary of the measured values
+    """
+    result = {'backend': backend, 'clients': args.clients, 'senders': args.senders, 'rate': args.rate,
+              'duration': args.duration, 'processes': args.processes}
+    server = multiprocessing.Process(target=_serve, args=(_BACKENDS[backend], port))
+    server.start()
+    loads = []
+    try:
+        _connect_client(port, retry=True).close()  # Waits for the server to be ready
+        time.sleep(0.1)  # Gives the server the time for releasing the probe connection
+        rss_before = _get_rss(server.pid)
+
+        start_event = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        start = time.time()
+        for i in xrange(args.processes):
+            clients = args.clients // args.processes + (1 if i < args.clients % args.processes else 0)
+            senders = args.senders // args.processes + (1 if i < args.senders % args.processes else 0)
+            load = multiprocessing.Process(target=_run_load, args=(port, clients, senders, args.rate,
+                                                                    args.duration, start_event, results))
+            load.start()
+            loads.append(load)
+        for _ in loads:
+            report = _get_report(results, loads, _REPORT_TIMEOUT)
+            if 'error' in report:
+                raise RuntimeError(report['error'])
+        result['connect_per_sec'] = args.clients / (time.time() - start)
+        time.sleep(0.5)  # Gives the server the time for accepting the last connections
+        result['server_rss_kb_per_conn'] = (_get_rss(server.pid) - rss_before) / float(args.clients)
+
+        start_event.set()
+        sent = received = disconnected = 0
+        latency = Histogram()
+        for _ in loads:
+            report = _get_report(results, loads, args.duration + _DRAIN_TIME + _REPORT_TIMEOUT)
+            if 'error' in report:
+                raise RuntimeError(report['error'])
+            sent += report['sent']
+            disconnected += report['disconnected']
+            received += report['received']
+            latency.merge(report['latency'])
+        result['sent_per_sec'] = sent / float(args.duration)
+        result['delivered_per_sec'] = received / float(args.duration)
+        result['expected_deliveries'] = sent * (args.clients - 1)
+        result['deliveries'] = received
+        result['disconnected_clients'] = disconnected
+        result['fan_out_latency'] = latency.to_dict()
+    except (socket.error, RuntimeError) as e:
+        result['error'] = str(e) or e.__class__.__name__
+    finally:
+        for load in loads:
+            load.terminate()
+            load.join()
+        server.terminate()
+        server.join()
+    return result
+
+
+def main():
+    """
+    The main function of the program. It load-tests each backend and writes the results as JSON.
+    """
+    parser = argparse.ArgumentParser(description='Load-tests the ChatServer backends with many simulated clients.')
+    parser.add_argument('-backends', help='the load-tested backends', nargs='+', choices=sorted(_BACKENDS),
+                        default=['epoll'])
+    parser.add_argument('-clients', help='the number of simulated clients', type=int, default=1000)
+    parser.add_argument('-senders', help='the number of simulated clients sending messages', type=int, default=10)
+    parser.add_argument('-rate', help='the messages sent by each sender every second', type=float, default=10)
+    parser.add_argument('-duration', help='the duration (in seconds) of the load', type=float, default=10)
+    parser.add_argument('-processes', help='the number of load processes', type=int,
+                        default=multiprocessing.cpu_count())
+    parser.add_argument('-output', help='the JSON file of the results (default: the standard output)')
+    args = parser.parse_args()
+    _raise_fd_limit()
+    results = {'python': platform.python_version(), 'platform': platform.platform(),
+               'cpus': multiprocessing.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': []}
+    for i, backend in enumerate(args.backends):
+        results['results'].append(_run_test(backend, _PORT + i, args))
+    if args.output:
+        with open(args.output, 'w') as outfile:
+            json.dump(results, outfile, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print
+
+
+if __name__ == '__main__':
+    """The entry point of the program. It simply calls the main function.
+    """
+    main()
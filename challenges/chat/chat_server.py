@@ -7,8 +7,29 @@ This script runs a simple ChatServer built with sockets.
 
 The code is organized as follows:
 - the ChatServer class defines the behaviour of the server;
+- the EpollChatServer class defines a server driven by an epoll event loop over non-blocking sockets;
 - the main module function simply executes the server.
 
+Besides broadcasting every message to everyone, the EpollChatServer lets the clients talk in rooms by sending
+the following commands:
+- "/join <room>" subscribes the client to the room;
+- "/leave <room>" unsubscribes the client from the room;
+- "/pub <room> <message>" publishes the message to the clients subscribed to the room;
+- "/history <room> [<sequence>]" replays the messages published to the room starting from the given sequence
+  number, followed by the sequence number of the next message of the room; the history is replayed as the client
+  reads it, so that it is never held back by the high-water mark.
+
+The last HISTORY_SIZE messages published to each of the last HISTORY_ROOMS rooms published to are kept, so that
+a client which has lost its connection can catch up from the sequence number following the last message it received
+(sequence numbers start from 0).
+
+Under heavy load, the EpollChatServer may also coalesce its writes (COALESCE_WINDOW): the messages queued for
+a client during an iteration of the event loop, or during the given window, are sent together by a single write.
+
+Both servers optionally collect their statistics (COLLECT_STATS): frames and bytes received and sent, fan-out
+and event loop times, queue depths and dropped clients. They are readable through the "stats" attribute and
+are periodically dumped as JSON lines on the standard error (STATS_INTERVAL).
+
 The programming language used is Python 2.7 and it is assumed you have it installed into your PC.
 The operating system of reference is Linux. There are two basic ways to execute this script in Linux:
 1 - launching it by the command shell through the python command;
@@ -17,15 +38,30 @@ The operating system of reference is Linux. There are two basic ways to execute
 
 Enjoy!
 """
-import math
-import struct
+import os
+import sys
+import time
+import errno
 import socket
 import select
+import argparse
+import itertools
 import threading
+import collections
+
+from chat_stats import ServerStats
+from chat_framing import FrameDecoder, FrameError, encode_frame
 
 _HOST = '127.0.0.1'  # defines the host as "localhost"
 _PORT = 10000        # defines the port as "10000"
 
+_READ_EVENTS = select.POLLIN | select.POLLPRI  # defines the events signalling a readable socket
+_WRITE_EVENTS = select.POLLOUT                 # defines the events signalling a writable socket
+_ERROR_EVENTS = select.POLLERR | select.POLLHUP  # defines the events signalling a broken socket
+_WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK)  # defines the errors raised by a non-blocking socket not ready
+_SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', 15)  # not exposed by the socket module of Python 2.7 (15 on Linux)
+_HISTORY_END = "\nHistory of the room %s replayed up to #%d\n"  # defines the message ending a replayed history
+
 class ChatServer(threading.Thread):
     """
     Defines the chat server as a Thread.
@@ -33,7 +69,11 @@ class ChatServer(threading.Thread):
 
     MAX_WAITING_CONNECTIONS = 10  # defines the max number of accepted waiting connections before the rejection
     RECV_BUFFER = 4096  # defines the size (in bytes) of the receiving buffer
+    MAX_FRAME_SIZE = 1 << 20  # defines the max size (in bytes) of a message: a client declaring more is disconnected
     RECV_MSG_LEN = 4  # defines the size (in bytes) of the placeholder contained at the beginning of the messages
+    ANNOUNCE_PRESENCE = True  # tells whether clients entering and leaving the chat room should be announced
+    COLLECT_STATS = False  # tells whether the server should collect its statistics
+    STATS_INTERVAL = 10  # defines the interval (in seconds) between two dumps of the statistics (0 for never)
 
     def __init__(self, host, port):
         """
@@ -46,7 +86,11 @@ class ChatServer(threading.Thread):
         self.host = host
         self.port = port
         self.connections = []  # collects all the incoming connections
+        self.peers = {}  # maps each client socket to the (address, FrameDecoder) pair of the client
         self.running = True  # tells whether the server should run
+        self._wakeup_r, self._wakeup_w = os.pipe()  # lets stop() wake the server loop up
+        self.stats = None  # the ServerStats, if collected
+        self._next_dump = None  # the time of the next dump of the statistics
 
     def _bind_socket(self):
         """
@@ -58,46 +102,73 @@ class ChatServer(threading.Thread):
         self.server_socket.listen(self.MAX_WAITING_CONNECTIONS)
         self.connections.append(self.server_socket)
 
-    def _send(self, sock, msg):
+    def _send(self, sock, frame):
         """
-        Prefixes each message with a 4-byte length before sending.
+        Sends a message already prefixed with its 4-byte length.
 
-        :param sock: the incoming socket
-        :param msg: the message to send
+        :param sock: the receiving socket
+        :param frame: the packed message to send
         """
-        # Packs the message with 4 leading bytes representing the message length
-        msg = struct.pack('>I', len(msg)) + msg
-        # Sends the packed message
-        sock.send(msg)
+        sock.sendall(frame)
+        if self.stats is not None:
+            self.stats.frames_out += 1
+            self.stats.bytes_out += len(frame)
 
     def _receive(self, sock):
         """
-        Receives an incoming message from the client and unpacks it.
+        Receives the bytes available on a client socket and unpacks the whole messages received.
+        A single read is performed, so that a slow client cannot block the server.
 
         :param sock: the incoming socket
-        :return: the unpacked message
-        """
-        data = None
-        # Retrieves the first 4 bytes from the message
-        msg_len = sock.recv(self.RECV_MSG_LEN)
-        # If the message has the 4 bytes representing the length...
-        if msg_len:
-            data = ''
-            # Unpacks the message and gets the message length
-            msg_len = struct.unpack('>I', msg_len)[0]
-            # Computes the number of expected chunks of RECV_BUFFER size
-            chunks = int(math.ceil(msg_len / float(self.RECV_BUFFER)))
-            for _ in xrange(chunks):
-                # Retrieves the chunk i-th chunk of RECV_BUFFER size
-                chunk = sock.recv(self.RECV_BUFFER)
-                # If there isn't the expected chunk...
-                if not chunk:
-                    data = None
-                    break # ... Simply breaks the loop
-                else:
-                    # Merges the chunks content
-                    data += chunk
-        return data
+        :return: the list of the unpacked messages, or None if the client has disconnected
+        """
+        messages = self.peers[sock][1].recv_from(sock)
+        if self.stats is not None and messages:
+            self._count_received(messages)
+        return messages
+
+    def _count_received(self, messages):
+        """
+        Counts the messages received from a client into the statistics.
+
+        :param messages: the list of the unpacked messages
+        """
+        self.stats.frames_in += len(messages)
+        self.stats.bytes_in += sum(len(data) for data in messages) + self.RECV_MSG_LEN * len(messages)
+
+    def _poll_timeout(self, timeout):
+        """
+        Gets the max waiting time of an iteration of the server loop, shortened when the statistics
+        should be dumped before.
+
+        :param timeout: the max waiting time (in seconds) when no dump is due
+        :return: the max waiting time (in seconds)
+        """
+        if self._next_dump is None:
+            return timeout
+        return max(0, min(timeout, self._next_dump - time.time()))
+
+    def _queue_depths(self):
+        """
+        Gets the number of bytes queued for each client. Messages are sent straight away by this server,
+        so nothing is ever queued.
+
+        :return: the iterable of the number of queued bytes
+        """
+        return ()
+
+    def _update_stats(self, loop_start):
+        """
+        Records the time spent in an iteration of the server loop and dumps the statistics when due.
+
+        :param loop_start: the time at which the iteration has started handling its events
+        """
+        now = time.time()
+        self.stats.loop.add(now - loop_start)
+        if self._next_dump is not None and now >= self._next_dump:
+            self.stats.sample_queues(self._queue_depths())
+            self.stats.dump(sys.stderr)
+            self._next_dump = now + self.STATS_INTERVAL
 
     def _broadcast(self, client_socket, client_message):
         """
@@ -107,16 +178,25 @@ class ChatServer(threading.Thread):
         :param client_socket: the socket of the client sending the message
         :param client_message: the message to broadcast
         """
+        # Packs the message with 4 leading bytes representing the message length, once for all the clients
+        frame = encode_frame(client_message)
+        start = time.time() if self.stats is not None else None
         for sock in self.connections:
             is_not_the_server = sock != self.server_socket
             is_not_the_client_sending = sock != client_socket
             if is_not_the_server and is_not_the_client_sending:
                 try :
-                    self._send(sock, client_message)
+                    self._send(sock, frame)
                 except socket.error:
                     # Handles a possible disconnection of the client "sock" by...
                     sock.close()  # closing the socket connection
                     self.connections.remove(sock)  # removing the socket from the active connections list
+                    self.peers.pop(sock, None)
+                    if self.stats is not None:
+                        self.stats.dropped_clients += 1
+                        self.stats.disconnections += 1
+        if start is not None:
+            self.stats.fan_out.add(time.time() - start)
 
     def _run(self):
         """
@@ -124,12 +204,14 @@ class ChatServer(threading.Thread):
         """
         while self.running:
             # Gets the list of sockets which are ready to be read through select non-blocking calls
-            # The select has a timeout of 60 seconds
+            # The select has a timeout of 60 seconds (shorter when the statistics should be dumped before)
             try:
-                ready_to_read, ready_to_write, in_error = select.select(self.connections, [], [], 60)
+                ready_to_read, ready_to_write, in_error = select.select(self.connections + [self._wakeup_r], [], [],
+                                                                        self._poll_timeout(60))
             except socket.error:
                 continue
             else:
+                loop_start = time.time() if self.stats is not None else None
                 for sock in ready_to_read:
                     # If the socket instance is the server socket...
                     if sock == self.server_socket:
@@ -140,47 +222,705 @@ class ChatServer(threading.Thread):
                             break
                         else:
                             self.connections.append(client_socket)
+                            self.peers[client_socket] = (client_address,
+                                                         FrameDecoder(self.RECV_BUFFER, self.MAX_FRAME_SIZE))
                             print "Client (%s, %s) connected" % client_address
+                            if self.stats is not None:
+                                self.stats.connections += 1
 
                             # Notifies all the connected clients a new one has entered
-                            self._broadcast(client_socket, "\n[%s:%s] entered the chat room\n" % client_address)
-                    # ...else is an incoming client socket connection
-                    else:
+                            if self.ANNOUNCE_PRESENCE:
+                                self._broadcast(client_socket, "\n[%s:%s] entered the chat room\n" % client_address)
+                    # ...else is an incoming client socket connection (not dropped meanwhile)
+                    elif sock in self.peers:
                         try:
-                            data = self._receive(sock) # Gets the client message...
-                            if data:
-                                # ... and broadcasts it to all the connected clients
-                                self._broadcast(sock, "\r" + '<' + str(sock.getpeername()) + '> ' + data)
-                        except socket.error:
+                            messages = self._receive(sock) # Gets the client messages...
+                        except (socket.error, FrameError):
+                            messages = None
+                        if messages is not None:
+                            for data in messages:
+                                # ... and broadcasts them to all the connected clients
+                                self._broadcast(sock, "\r" + '<' + str(self.peers[sock][0]) + '> ' + data)
+                        else:
+                            client_address = self.peers.pop(sock)[0]
                             # Broadcasts all the connected clients that a clients has left
-                            self._broadcast(sock, "\nClient (%s, %s) is offline\n" % client_address)
+                            if self.ANNOUNCE_PRESENCE:
+                                self._broadcast(sock, "\nClient (%s, %s) is offline\n" % client_address)
                             print "Client (%s, %s) is offline" % client_address
                             sock.close()
                             self.connections.remove(sock)
-                            continue
+                            if self.stats is not None:
+                                self.stats.disconnections += 1
+                if loop_start is not None:
+                    self._update_stats(loop_start)
         # Clears the socket connection
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
         self.stop()
 
     def run(self):
         """Given a host and a port, binds the socket and runs the server.
         """
+        if self.COLLECT_STATS:
+            self.stats = ServerStats()
+            if self.STATS_INTERVAL:
+                self._next_dump = time.time() + self.STATS_INTERVAL
         self._bind_socket()
         self._run()
 
     def stop(self):
         """
-        Stops the server by setting the "running" flag to close before closing
-        the socket connection.
+        Stops the server by setting the "running" flag to close and waking the server loop up
+        before closing the socket connection.
         """
-        self.running = False
+        if self.running:
+            os.write(self._wakeup_w, 'x')
+            self.running = False
         self.server_socket.close()
 
 
+class _Poller(object):
+    """
+    Wraps an epoll object where available (Linux) and a poll object otherwise, so that the
+    event loop does not depend on the platform. Both have a cost proportional to the number of
+    ready sockets, instead of the number of watched ones, and have no FD_SETSIZE limit.
+    """
+
+    def __init__(self):
+        """
+        Initializes a new _Poller.
+        """
+        if hasattr(select, 'epoll'):
+            self._poller = select.epoll()
+            self._timeout_scale = 1  # epoll expects the timeout in seconds...
+        else:
+            self._poller = select.poll()
+            self._timeout_scale = 1000  # ... while poll expects it in milliseconds
+
+    def register(self, fd, events):
+        """
+        Starts watching the given file descriptor for the given events.
+
+        :param fd: the file descriptor to watch
+        :param events: the bit mask of the events to watch
+        """
+        self._poller.register(fd, events)
+
+    def modify(self, fd, events):
+        """
+        Changes the events watched for the given file descriptor.
+
+        :param fd: the watched file descriptor
+        :param events: the new bit mask of the events to watch
+        """
+        self._poller.modify(fd, events)
+
+    def unregister(self, fd):
+        """
+        Stops watching the given file descriptor.
+
+        :param fd: the watched file descriptor
+        """
+        self._poller.unregister(fd)
+
+    def poll(self, timeout):
+        """
+        Waits for the watched file descriptors to become ready.
+
+        :param timeout: the max waiting time (in seconds)
+        :return: the list of (fd, events) pairs which are ready
+        """
+        return self._poller.poll(timeout * self._timeout_scale)
+
+    def close(self):
+        """
+        Releases the resources held by the poller.
+        """
+        if hasattr(self._poller, 'close'):
+            self._poller.close()
+
+
+class _History(object):
+    """
+    Holds the last packed messages published to a room into a preallocated ring, indexed by their sequence number.
+    """
+
+    __slots__ = ('frames', 'next_seq')
+
+    def __init__(self, size):
+        """
+        Initializes a new, empty, _History.
+
+        :param size: the max number of messages kept
+        """
+        self.frames = [None] * size
+        self.next_seq = 0  # the sequence number of the next message
+
+    def append(self, frame):
+        """
+        Adds a packed message, overwriting the oldest one when the ring is full.
+
+        :param frame: the packed message
+        """
+        self.frames[self.next_seq % len(self.frames)] = frame
+        self.next_seq += 1
+
+    def first_seq(self):
+        """
+        Gets the sequence number of the oldest message kept.
+
+        :return: the sequence number of the oldest message
+        """
+        return max(self.next_seq - len(self.frames), 0)
+
+
+class _Connection(object):
+    """
+    Holds the state of a client connection handled by the EpollChatServer.
+    """
+
+    __slots__ = ('sock', 'fd', 'address', 'name', 'decoder', 'out_queue', 'out_offset', 'out_bytes', 'writing',
+                 'rooms', 'replays')
+
+    def __init__(self, sock, address, buffer_size, max_frame_size=None):
+        """
+        Initializes a new _Connection.
+
+        :param sock: the non-blocking client socket
+        :param address: the (host, port) pair of the client
+        :param buffer_size: the initial size (in bytes) of the receiving buffer
+        :param max_frame_size: the max size (in bytes) of the received messages (None for no limit)
+        """
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.address = address
+        self.name = str(address)   # the client name used when broadcasting its messages
+        self.decoder = FrameDecoder(buffer_size, max_frame_size)  # reassembles the received messages
+        self.out_queue = collections.deque()  # collects the packed messages the socket was not ready to send
+        self.out_offset = 0  # the number of bytes of the first queued message already sent
+        self.out_bytes = 0   # the number of queued bytes still to send
+        self.writing = False  # tells whether the socket is watched for writability
+        self.rooms = set()  # collects the rooms the client is subscribed to
+        self.replays = collections.deque()  # collects the [history, room, sequence, end] of the histories waiting
+                                            # to be replayed, from the one being replayed
+
+
+class EpollChatServer(ChatServer):
+    """
+    Defines a chat server driven by an epoll event loop. Sockets are non-blocking and the state of
+    each client is kept into a _Connection object, so that tens of thousands of idle clients cost
+    nothing on each wakeup of the loop.
+    """
+
+    MAX_WAITING_CONNECTIONS = 1024  # defines the max number of accepted waiting connections before the rejection
+    POLL_TIMEOUT = 60  # defines the max waiting time (in seconds) of each iteration of the event loop
+    SEND_BATCH = 65536  # defines the max size (in bytes) of the queued messages merged into a single send
+    HIGH_WATER_MARK = 1 << 20  # defines the max number of bytes queued for a client which does not read
+    LAGGARD_POLICY = 'drop'  # tells whether the messages beyond the high-water mark are 'drop'-ped or the client
+                             # is 'disconnect'-ed
+    REUSE_PORT = False  # tells whether many servers may accept connections on the same port (SO_REUSEPORT)
+    COALESCE_WINDOW = None  # defines the max delay (in microseconds) of the coalesced writes: None sends each
+                            # message straight away, 0 coalesces the messages of a single iteration of the loop
+    HISTORY_SIZE = 256  # defines the number of messages kept for each room (0 for no history)
+    HISTORY_ROOMS = 1024  # defines the max number of rooms whose history is kept (the least recently published
+                          # one is forgotten beyond it)
+    MAX_REPLAYS = 1024  # defines the max number of histories waiting to be replayed to a client (the further
+                        # requests are handled as the messages beyond the high-water mark)
+
+    def __init__(self, host, port):
+        """
+        Initializes a new EpollChatServer.
+
+        :param host: the host on which the server is bounded
+        :param port: the port on which the server is bounded
+        """
+        ChatServer.__init__(self, host, port)
+        self.clients = {}  # maps the file descriptor of each client socket to its _Connection
+        self.rooms = {}  # maps each room to the set of the _Connection of its subscribers
+        self.histories = collections.OrderedDict()  # maps each room to the _History of its messages, from the
+                                                    # least recently published one
+        self.poller = None
+        self._pending = set()  # collects the _Connection whose coalesced messages are waiting to be sent
+        self._pending_deadline = None  # the time by which the coalesced messages have to be sent
+        self._offline = collections.deque()  # collects the _Connection of the clients left, still to be announced
+        self._announcing = False  # tells whether the clients left are being announced
+
+    def _bind_socket(self):
+        """
+        Creates the non-blocking server socket, binds it to the given host and port and
+        registers it into the poller.
+        """
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.REUSE_PORT:
+            self.server_socket.setsockopt(socket.SOL_SOCKET, _SO_REUSEPORT, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(self.MAX_WAITING_CONNECTIONS)
+        self.server_socket.setblocking(0)
+        self.poller = _Poller()
+        self.poller.register(self.server_socket.fileno(), _READ_EVENTS)
+        self.poller.register(self._wakeup_r, _READ_EVENTS)
+
+    def _accept(self):
+        """
+        Accepts all the pending client connections.
+        """
+        while True:
+            try:
+                client_socket, client_address = self.server_socket.accept()
+            except socket.error as e:
+                if e.errno == errno.EINTR:
+                    continue
+                break  # No more pending connections (or the server socket has been closed)
+            client_socket.setblocking(0)
+            conn = _Connection(client_socket, client_address, self.RECV_BUFFER, self.MAX_FRAME_SIZE)
+            self.clients[conn.fd] = conn
+            self.poller.register(conn.fd, _READ_EVENTS)
+            print "Client (%s, %s) connected" % client_address
+            if self.stats is not None:
+                self.stats.connections += 1
+
+            # Notifies all the connected clients a new one has entered
+            if self.ANNOUNCE_PRESENCE:
+                self._broadcast(conn, "\n[%s:%s] entered the chat room\n" % client_address)
+
+    def _send(self, conn, frame):
+        """
+        Queues a message already prefixed with its 4-byte length and sends it without blocking. The same
+        packed message is shared by reference among the queues of all its receivers. The queue of a client
+        which does not read is bounded by the high-water mark: once the bytes already queued are beyond it,
+        either the message is dropped or the client is disconnected, so that a laggard cannot stall the other
+        clients. A message longer than the mark is still delivered to a client whose queue is empty.
+
+        :param conn: the _Connection of the receiving client
+        :param frame: the packed message to send
+        """
+        if self.clients.get(conn.fd) is not conn:
+            return  # The client has been disconnected while sending the message to the others
+        if conn.out_bytes > self.HIGH_WATER_MARK:
+            self._reject(conn)
+            return
+        self._enqueue(conn, frame)
+
+    def _reject(self, conn):
+        """
+        Applies the laggard policy to a client: either the message is dropped or the client is disconnected.
+
+        :param conn: the _Connection of the laggard client
+        """
+        if self.LAGGARD_POLICY == 'disconnect':
+            if self.stats is not None:
+                self.stats.dropped_clients += 1
+            self._disconnect(conn)
+        elif self.stats is not None:
+            self.stats.dropped_frames += 1
+
+    def _enqueue(self, conn, frame):
+        """
+        Queues a packed message, whatever the number of bytes already queued, and sends it without blocking.
+
+        :param conn: the receiving _Connection
+        :param frame: the packed message to send
+        """
+        conn.out_queue.append(frame)
+        conn.out_bytes += len(frame)
+        self._schedule(conn)
+
+    def _schedule(self, conn):
+        """
+        Sends the messages queued for a client without blocking, unless they are already waiting.
+
+        :param conn: the receiving _Connection
+        """
+        if not conn.writing:  # If nothing was already waiting...
+            if self.COALESCE_WINDOW is None:
+                self._flush(conn)  # ... tries to send the message straight away
+            else:
+                if not self._pending:
+                    self._pending_deadline = time.time() + self.COALESCE_WINDOW / 1e6
+                self._pending.add(conn)  # ... or lets it wait for the other messages of the window
+
+    def _flush_pending(self):
+        """
+        Sends the coalesced messages: all the messages queued for a client are merged into a single send.
+        """
+        pending, self._pending = self._pending, set()
+        for conn in pending:
+            if not conn.writing:  # Otherwise the socket is already watched for writability
+                self._flush(conn)
+
+    def _poll_timeout(self, timeout):
+        """
+        Gets the max waiting time of an iteration of the event loop, shortened when either some coalesced
+        messages or the statistics are due before.
+
+        :param timeout: the max waiting time (in seconds) when nothing is due
+        :return: the max waiting time (in seconds)
+        """
+        timeout = ChatServer._poll_timeout(self, timeout)
+        if self._pending:
+            return max(0, min(timeout, self._pending_deadline - time.time()))
+        return timeout
+
+    def _flush(self, conn):
+        """
+        Sends as many queued bytes as the socket accepts, then watches the socket for writability
+        only if some bytes are still waiting. Small queued messages are merged into a single send.
+
+        :param conn: the _Connection to flush
+        """
+        queue = conn.out_queue
+        try:
+            if conn.replays:
+                self._fill_replays(conn)
+            while queue:
+                head = queue[0]
+                if len(queue) == 1 or len(head) - conn.out_offset >= self.SEND_BATCH:
+                    data = buffer(head, conn.out_offset)  # Sends the first message without copying it
+                else:
+                    data = self._gather(conn)
+                self._consume(conn, conn.sock.send(data))
+                if conn.replays:
+                    self._fill_replays(conn)  # Goes on replaying the histories as the client reads
+        except socket.error as e:
+            if e.errno not in _WOULD_BLOCK:
+                if self.stats is not None:
+                    self.stats.dropped_clients += 1
+                self._disconnect(conn)
+                return
+        writing = bool(queue)
+        if writing != conn.writing:  # Changes the watched events only when needed
+            conn.writing = writing
+            self.poller.modify(conn.fd, _READ_EVENTS | _WRITE_EVENTS if writing else _READ_EVENTS)
+
+    def _gather(self, conn):
+        """
+        Merges the first queued messages, up to SEND_BATCH bytes, so that they can be sent at once.
+
+        :param conn: the _Connection to flush
+        :return: the merged bytes
+        """
+        chunks = [conn.out_queue[0][conn.out_offset:]]
+        size = len(chunks[0])
+        for frame in itertools.islice(conn.out_queue, 1, None):
+            if size + len(frame) > self.SEND_BATCH:
+                break
+            chunks.append(frame)
+            size += len(frame)
+        return ''.join(chunks)
+
+    def _consume(self, conn, sent):
+        """
+        Removes the sent bytes from the queue of a client.
+
+        :param conn: the _Connection flushed
+        :param sent: the number of bytes sent
+        """
+        conn.out_bytes -= sent
+        if self.stats is not None:
+            self.stats.bytes_out += sent
+        queue = conn.out_queue
+        sent += conn.out_offset
+        while queue and sent >= len(queue[0]):
+            sent -= len(queue.popleft())
+            if self.stats is not None:
+                self.stats.frames_out += 1
+        conn.out_offset = sent
+
+    def _receive(self, conn):
+        """
+        Reads the bytes available on the client socket and unpacks all the whole messages received.
+
+        :param conn: the _Connection of the sending client
+        :return: the list of the unpacked messages, or None if the client has disconnected or has broken the framing
+        """
+        try:
+            messages = conn.decoder.recv_from(conn.sock)
+        except socket.error as e:
+            if e.errno in _WOULD_BLOCK or e.errno == errno.EINTR:
+                return []
+            return None
+        except FrameError as e:
+            print "Client (%s, %s) broke the protocol: %s" % (conn.address + (e,))
+            return None
+        if self.stats is not None and messages:
+            self._count_received(messages)
+        return messages
+
+    def _broadcast(self, client_conn, client_message):
+        """
+        Broadcasts a message to all the clients different from the client sending the message.
+
+        :param client_conn: the _Connection of the client sending the message
+        :param client_message: the message to broadcast
+        """
+        # Packs the message with 4 leading bytes representing the message length, once for all the clients
+        self._fan_out(client_conn, encode_frame(client_message))
+
+    def _fan_out(self, client_conn, frame):
+        """
+        Sends a packed message to all the clients different from the client sending the message.
+
+        :param client_conn: the _Connection of the client sending the message (None for no client)
+        :param frame: the packed message to send
+        """
+        start = time.time() if self.stats is not None else None
+        for conn in self.clients.values():
+            if conn is not client_conn:
+                self._send(conn, frame)
+        if start is not None:
+            self.stats.fan_out.add(time.time() - start)
+
+    def _join(self, conn, room):
+        """
+        Subscribes a client to a room.
+
+        :param conn: the _Connection of the client
+        :param room: the room
+        """
+        self.rooms.setdefault(room, set()).add(conn)
+        conn.rooms.add(room)
+
+    def _leave(self, conn, room):
+        """
+        Unsubscribes a client from a room. Rooms without subscribers are removed.
+
+        :param conn: the _Connection of the client
+        :param room: the room
+        """
+        members = self.rooms.get(room)
+        if members is not None:
+            members.discard(conn)
+            if not members:
+                del self.rooms[room]
+        conn.rooms.discard(room)
+
+    def _publish(self, client_conn, room, client_message):
+        """
+        Sends a message to the subscribers of a room different from the client sending the message.
+        Only the subscribers are visited, whatever the number of connected clients.
+
+        :param client_conn: the _Connection of the client sending the message (None for no client)
+        :param room: the room
+        :param client_message: the message to publish
+        """
+        # Packs the message with 4 leading bytes representing the message length, once for all the subscribers
+        frame = encode_frame(client_message)
+        if self.HISTORY_SIZE:
+            history = self.histories.pop(room, None)
+            if history is None:
+                if len(self.histories) >= self.HISTORY_ROOMS:
+                    self.histories.popitem(last=False)  # Forgets the least recently published room
+                history = _History(self.HISTORY_SIZE)
+            self.histories[room] = history  # Moves the room to the most recently published end
+            history.append(frame)
+        members = self.rooms.get(room)
+        if members:
+            start = time.time() if self.stats is not None else None
+            for conn in list(members):
+                if conn is not client_conn:
+                    self._send(conn, frame)
+            if start is not None:
+                self.stats.fan_out.add(time.time() - start)
+
+    def _replay(self, conn, room, seq):
+        """
+        Sends a client the messages published to a room starting from a sequence number, followed by the
+        sequence number of the next message of the room when requested. The messages are queued one by one,
+        only while the bytes queued for the client are within the high-water mark, and the rest of the history
+        is queued as the client reads: a long history is neither dropped nor a reason for disconnecting the
+        client, while the queue stays bounded. The messages published meanwhile are sent as usual.
+
+        :param conn: the _Connection of the client
+        :param room: the room
+        :param seq: the sequence number of the first message (None for no message)
+        """
+        if len(conn.replays) >= self.MAX_REPLAYS:
+            self._reject(conn)  # The client keeps asking without reading
+            return
+        history = self.histories.get(room)
+        end = history.next_seq if history is not None else 0
+        conn.replays.append([history, room, end if seq is None else seq, end])
+        self._schedule(conn)
+
+    def _fill_replays(self, conn):
+        """
+        Queues the messages of the histories waiting to be replayed to a client, each history followed by the
+        sequence number of the next message of its room, until the bytes queued are beyond the high-water mark.
+
+        :param conn: the _Connection of the client
+        """
+        replays = conn.replays
+        while replays and conn.out_bytes <= self.HIGH_WATER_MARK:
+            replay = replays[0]
+            history, room, seq, end = replay
+            if history is not None:
+                seq = max(seq, history.first_seq())  # Skips the messages already overwritten
+            if seq < end:
+                frame = history.frames[seq % len(history.frames)]
+                replay[2] = seq + 1
+            else:
+                replays.popleft()
+                frame = encode_frame(_HISTORY_END % (room, end))
+            conn.out_queue.append(frame)
+            conn.out_bytes += len(frame)
+
+    def _handle_message(self, conn, data):
+        """
+        Handles a message received from a client: either a room command or a message to broadcast.
+
+        :param conn: the _Connection of the sending client
+        :param data: the unpacked message
+        """
+        if data.startswith('/'):
+            command, _, args = data.partition(' ')
+            room, _, msg = args.partition(' ')
+            room = room.strip()
+            if room and command == '/pub':
+                self._publish(conn, room, "\r" + '[' + room + '] <' + conn.name + '> ' + msg)
+                return
+            if room and command == '/join':
+                self._join(conn, room)
+                self._send(conn, encode_frame("\nYou joined the room %s\n" % room))
+                return
+            if room and command == '/leave':
+                self._leave(conn, room)
+                self._send(conn, encode_frame("\nYou left the room %s\n" % room))
+                return
+            if room and command == '/history':
+                msg = msg.strip()
+                self._replay(conn, room, int(msg) if msg.isdigit() else None)
+                return
+        # Any other message is broadcast to all the connected clients
+        self._broadcast(conn, "\r" + '<' + conn.name + '> ' + data)
+
+    def _disconnect(self, conn):
+        """
+        Removes a client from the active connections and from its rooms, then announces it has left.
+        The clients disconnected while announcing (e.g. the laggards beyond the high-water mark) are
+        announced afterwards by the same loop, so that the announcements never nest.
+
+        :param conn: the _Connection of the leaving client
+        """
+        if self.clients.pop(conn.fd, None) is None:
+            return  # The client has already been removed
+        for room in list(conn.rooms):
+            self._leave(conn, room)
+        self._pending.discard(conn)
+        self.poller.unregister(conn.fd)
+        conn.sock.close()
+        print "Client (%s, %s) is offline" % conn.address
+        if self.stats is not None:
+            self.stats.disconnections += 1
+        if self.ANNOUNCE_PRESENCE:
+            self._offline.append(conn)
+            if not self._announcing:
+                self._announce_offline()
+
+    def _announce_offline(self):
+        """
+        Broadcasts all the connected clients that the queued clients have left.
+        """
+        self._announcing = True
+        try:
+            while self._offline:
+                conn = self._offline.popleft()
+                self._broadcast(conn, "\nClient (%s, %s) is offline\n" % conn.address)
+        finally:
+            self._announcing = False
+
+    def _queue_depths(self):
+        """
+        Gets the number of bytes queued for each client.
+
+        :return: the iterable of the number of queued bytes
+        """
+        return (conn.out_bytes for conn in self.clients.itervalues())
+
+    def _handle_event(self, fd, events):
+        """
+        Handles the events of a file descriptor which is neither the server socket nor a connected client,
+        i.e. the wakeup pipe or a client disconnected in the current iteration. Subclasses watching other
+        file descriptors handle them here.
+
+        :param fd: the ready file descriptor
+        :param events: the bit mask of the ready events
+        """
+        pass
+
+    def _run(self):
+        """
+        Actually runs the server.
+        """
+        server_fd = self.server_socket.fileno()
+        while self.running:
+            # Gets the list of sockets which are ready through the poller
+            try:
+                ready = self.poller.poll(self._poll_timeout(self.POLL_TIMEOUT))
+            except (IOError, select.error):
+                continue  # Interrupted by a signal
+            loop_start = time.time() if self.stats is not None else None
+            for fd, events in ready:
+                # If the socket instance is the server socket...
+                if fd == server_fd:
+                    self._accept()
+                    continue
+                conn = self.clients.get(fd)
+                if conn is None:
+                    self._handle_event(fd, events)  # Neither the server socket nor a client
+                    continue
+                # If the client socket is broken...
+                if events & _ERROR_EVENTS and not events & _READ_EVENTS:
+                    self._disconnect(conn)
+                    continue
+                # ...else, if the client sent something...
+                if events & _READ_EVENTS:
+                    messages = self._receive(conn)  # Gets the client messages...
+                    if messages is None:
+                        self._disconnect(conn)
+                        continue
+                    for data in messages:
+                        if self.clients.get(fd) is not conn:
+                            break  # The client has been disconnected while handling its previous messages
+                        # ... and either broadcasts them or publishes them to a room
+                        self._handle_message(conn, data)
+                # ...and if the client socket can accept the waiting bytes
+                if events & _WRITE_EVENTS and fd in self.clients:
+                    self._flush(conn)
+            if self._pending and (not self.COALESCE_WINDOW or time.time() >= self._pending_deadline):
+                self._flush_pending()
+            if loop_start is not None:
+                self._update_stats(loop_start)
+        # Clears the socket connections
+        for conn in self.clients.values():
+            conn.sock.close()
+        self.clients.clear()
+        self.poller.close()
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+        self.stop()
+
+
+_BACKENDS = {'select': ChatServer, 'epoll': EpollChatServer}  # maps each server mode to its class
+
+
 def main():
     """
     The main function of the program. It creates and runs a new ChatServer.
     """
-    chat_server = ChatServer(_HOST, _PORT)
+    parser = argparse.ArgumentParser(description='Runs a simple ChatServer.')
+    parser.add_argument('-backend', help='the event loop used by the server (default: select)',
+                        choices=sorted(_BACKENDS), default='select')
+    parser.add_argument('-coalesce', help='coalesces the writes of the epoll backend within the given window',
+                        type=int, metavar='MICROSECONDS')
+    parser.add_argument('-stats', help='dumps the statistics of the server on the standard error every given seconds',
+                        type=float, metavar='SECONDS')
+    args = parser.parse_args()
+    chat_server = _BACKENDS[args.backend](_HOST, _PORT)
+    chat_server.COALESCE_WINDOW = args.coalesce
+    if args.stats:
+        chat_server.COLLECT_STATS = True
+        chat_server.STATS_INTERVAL = args.stats
     chat_server.start()
 
 
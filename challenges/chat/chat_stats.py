@@ -0,0 +1,164 @@
+"""
+Created on 17/10/2026
+
+@author: gioia
+
+This script provides the statistics collected while measuring the chat application.
+
+The code is organized as follows:
+- the Histogram class summarizes a distribution of durations by counting them into logarithmic buckets;
+- the ServerStats class collects the counters and histograms of a running ChatServer.
+
+The programming language used is Python 2.7 and it is assumed you have it installed into your PC.
+The operating system of reference is Linux.
+
+
+Enjoy!
+"""
+import os
+import json
+import math
+import time
+
+_PRECISION = 0.01  # defines the relative width of the buckets of the histograms
+_LOG_BASE = math.log(1 + _PRECISION)
+
+
+class Histogram(object):
+    """
+    Summarizes a distribution of durations. Each duration is counted into a logarithmic bucket (1% wide),
+    so that the memory used does not depend on the number of durations and the histograms collected by
+    many processes can be merged.
+    """
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        """
+        Initializes a new, empty, Histogram.
+        """
+        self.counts = {}  # maps the index of each bucket to the number of durations it holds
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        """
+        Counts a duration. A negative duration, measured across a step back of the clock, is counted as zero.
+
+        :param value: the duration (in seconds)
+        """
+        value = max(0.0, value)
+        bucket = int(math.log(1 + value * 1e6) / _LOG_BASE)  # Buckets are computed on microseconds
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """
+        Adds the durations counted by another histogram.
+
+        :param other: the other Histogram
+        """
+        for bucket, count in other.counts.iteritems():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """
+        Gets the duration below which the given percentage of durations falls.
+
+        :param percent: the percentage (from 0 to 100)
+        :return: the duration (in seconds), with the precision of the buckets
+        """
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * percent / 100.0)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                # Returns the upper bound of the bucket, without exceeding the max duration
+                return min((math.exp((bucket + 1) * _LOG_BASE) - 1) / 1e6, self.max)
+        return self.max
+
+    def to_dict(self):
+        """
+        Summarizes the histogram.
+
+        :return: the dictionary of the count, mean, percentiles and max of the durations (in milliseconds)
+        """
+        return {'count': self.count,
+                'mean_ms': self.total / self.count * 1000 if self.count else 0.0,
+                'p50_ms': self.percentile(50) * 1000,
+                'p99_ms': self.percentile(99) * 1000,
+                'p999_ms': self.percentile(99.9) * 1000,
+                'max_ms': self.max * 1000}
+
+
+class ServerStats(object):
+    """
+    Collects the counters and histograms of a running ChatServer. The server only updates them when
+    its statistics are enabled, so that a disabled instrumentation costs a single test on each event.
+    """
+
+    __slots__ = ('started', 'frames_in', 'frames_out', 'bytes_in', 'bytes_out', 'connections', 'disconnections',
+                 'dropped_frames', 'dropped_clients', 'fan_out', 'loop', 'queued_bytes', 'max_queued_bytes',
+                 'writing_clients')
+
+    def __init__(self):
+        """
+        Initializes a new ServerStats, with all the counters set to zero.
+        """
+        self.started = time.time()
+        self.frames_in = 0  # the number of messages received from the clients
+        self.frames_out = 0  # the number of messages completely sent to the clients
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.connections = 0  # the number of accepted clients
+        self.disconnections = 0  # the number of clients which have left (or have been disconnected)
+        self.dropped_frames = 0  # the number of messages dropped for a client beyond its high-water mark
+        self.dropped_clients = 0  # the number of clients disconnected by the server
+        self.fan_out = Histogram()  # the time needed to send (or queue) a message to all its receivers
+        self.loop = Histogram()  # the time needed to handle the events of an iteration of the event loop
+        self.queued_bytes = 0  # the bytes waiting into the queues of all the clients, at the last sampling
+        self.max_queued_bytes = 0  # the longest queue of a client (in bytes), at the last sampling
+        self.writing_clients = 0  # the number of clients with waiting bytes, at the last sampling
+
+    def sample_queues(self, depths):
+        """
+        Samples the depths of the queues of the clients.
+
+        :param depths: the iterable of the number of bytes queued for each client
+        """
+        self.queued_bytes = self.max_queued_bytes = self.writing_clients = 0
+        for depth in depths:
+            if depth:
+                self.queued_bytes += depth
+                self.writing_clients += 1
+                if depth > self.max_queued_bytes:
+                    self.max_queued_bytes = depth
+
+    def to_dict(self):
+        """
+        Summarizes the statistics collected since the server has started.
+
+        :return: the dictionary of the counters and of the summarized histograms
+        """
+        result = {name: getattr(self, name) for name in self.__slots__ if name not in ('fan_out', 'loop')}
+        result.update(pid=os.getpid(), uptime=time.time() - self.started, fan_out=self.fan_out.to_dict(),
+                      loop=self.loop.to_dict())
+        return result
+
+    def dump(self, outfile):
+        """
+        Writes the statistics as a single JSON line.
+
+        :param outfile: the file on which the statistics are written
+        """
+        outfile.write(json.dumps(self.to_dict(), sort_keys=True) + '\n')
+        outfile.flush()
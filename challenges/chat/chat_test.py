@@ -7,7 +7,16 @@ This script provides test cases for the socket-implementation of a simple chat s
 
 The code is organized as follows:
 - the ChatServerTest class tests the ChatServer (defined in the chat_server module);
-- the ChatClientTest class tests the ChatClient (defined in the chat_client module).
+- the EpollChatServerTest class runs the same tests against the EpollChatServer (defined in the chat_server module);
+- the CoalescingChatServerTest class runs the same tests against an EpollChatServer coalescing its writes;
+- the ChatClusterTest class tests the ChatCluster (defined in the chat_cluster module);
+- the ClusterChatServerTest class tests how a ClusterChatServer relays messages to the other workers;
+- the LaggardsChatServerTest class tests how an EpollChatServer disconnects many laggards at once;
+- the ChatClientTest class tests the ChatClient (defined in the chat_client module);
+- the PollChatClientTest class runs the same tests against the PollChatClient (defined in the chat_client module);
+- the ChatClientRoomsTest class tests how the ChatClient keeps track of its rooms;
+- the FrameDecoderTest class tests the FrameDecoder (defined in the chat_framing module);
+- the HistogramTest class tests the Histogram (defined in the chat_stats module).
 
 The programming language used is Python 2.7 and it is assumed you have it installed into your PC.
 The operating system of reference is Linux. There are two basic ways to execute this script in Linux:
@@ -24,9 +33,13 @@ import struct
 import socket
 import unittest
 import threading
+import multiprocessing
 
-from chat_server import ChatServer
-from chat_client import ChatClient
+from chat_server import ChatServer, EpollChatServer, _Connection, _READ_EVENTS
+from chat_client import ChatClient, PollChatClient
+from chat_framing import FrameDecoder, FrameError
+from chat_stats import Histogram, ServerStats
+from chat_cluster import ChatCluster, ClusterChatServer
 
 _HOST = '127.0.0.1'  # defines the host as "localhost"
 _PORT = 10000        # defines the port as "10000"
@@ -42,12 +55,13 @@ class ChatServerTest(unittest.TestCase):
     PORT = _PORT
     RECV_BUFFER = _RECV_BUFFER
     RECV_MSG_LEN = _RECV_MSG_LEN
+    SERVER_CLASS = ChatServer
 
     def setUp(self):
         """
         Sets up the test environment by running a new ChatServer thread.
         """
-        self.chat_server = ChatServer(self.HOST, self.PORT)
+        self.chat_server = self.SERVER_CLASS(self.HOST, self.PORT)
         self.chat_server.start()
 
         time.sleep(1)  # Gives the client the time for connecting to the server
@@ -100,6 +114,38 @@ class ChatServerTest(unittest.TestCase):
         """
         return struct.pack('>I', len(msg))
 
+    def _recv_message(self, client):
+        """
+        Receives a whole message sent by the server.
+
+        :param client: the receiving client
+        :return: the unpacked message
+        """
+        msg_len = struct.unpack('>I', client.recv(self.RECV_MSG_LEN))[0]
+        msg = ''
+        while len(msg) < msg_len:
+            msg += client.recv(msg_len - len(msg))
+        return msg
+
+    def _send_message(self, client, msg):
+        """
+        Sends a message to the server.
+
+        :param client: the sending client
+        :param msg: the message to send
+        """
+        client.sendall(self._get_packed_length(msg) + msg)
+
+    def _assert_nothing_received(self, client):
+        """
+        Asserts the server has nothing more to send to a client.
+
+        :param client: the client
+        """
+        client.settimeout(0.5)
+        self.assertRaises(socket.timeout, client.recv, self.RECV_BUFFER)
+        client.settimeout(1)
+
     def test_broadcast(self):
         """
         Tests the message broadcasting performed by the server.
@@ -162,12 +208,490 @@ class ChatServerTest(unittest.TestCase):
         fc1.close()
         fc2.close()
 
+    def test_oversized_message(self):
+        """
+        Tests that a client declaring a message longer than the max frame size is disconnected
+        before the server buffers it.
+        """
+        fc1 = self._get_fake_client()  # The first client connects
+        fc1.sendall(struct.pack('>I', 0xFFFFFFFF) + 'x' * 1000)  # The client declares a 4 GiB message...
+        self.assertEqual(fc1.recv(self.RECV_BUFFER), '')  # ... and it is disconnected
+        fc1.close()
+
+    def test_stats(self):
+        """
+        Tests the statistics collected by the server.
+        """
+        self.chat_server.stats = ServerStats()  # Statistics are collected from now on, but never dumped
+        fc1 = self._get_fake_client()  # The first client connects
+
+        fc2 = self._get_fake_client()  # The second client connects
+        self._recv_message(fc1)  # Receives the announcement of the second client
+
+        self._send_message(fc2, 'Hello')  # The second client sends a message
+        self._recv_message(fc1)
+        time.sleep(0.1)  # Gives the server the time for completing the iteration of its loop
+        stats = self.chat_server.stats
+        self.assertEqual(stats.connections, 2)
+        self.assertEqual(stats.frames_in, 1)
+        self.assertEqual(stats.bytes_in, self.RECV_MSG_LEN + len('Hello'))
+        self.assertEqual(stats.frames_out, 2)  # The announcement and the broadcast message
+        self.assertEqual(stats.fan_out.count, 3)  # The two announcements and the broadcast message
+        self.assertGreater(stats.loop.count, 0)
+
+        fc1.close()
+        fc2.close()
+
     def tearDown(self):
         """
         Clears the test environment by stopping the server.
         """
         time.sleep(1)  # Gives the client the time for disconnecting from the server
         self.chat_server.stop()
+        self.chat_server.join()  # Waits for the server to release its socket
+
+
+class EpollChatServerTest(ChatServerTest):
+    """
+    Provides tests for the EpollChatServer application.
+    """
+
+    PORT = _PORT + 1
+    SERVER_CLASS = EpollChatServer
+
+    def test_pipelined_messages(self):
+        """
+        Tests the message broadcasting performed by the server when many messages
+        are sent at once.
+        """
+        fc1 = self._get_fake_client()  # The first client connects
+
+        fc2 = self._get_fake_client()  # The second client connects
+        fc2_enter_msg = self._get_enter_message(fc2.getsockname())
+        self.assertEqual(fc1.recv(self.RECV_MSG_LEN), self._get_packed_length(fc2_enter_msg))
+        self.assertEqual(fc1.recv(self.RECV_BUFFER), fc2_enter_msg)
+
+        fc2_orig_msgs = ['Hello', 'World']
+        fc2.send(''.join(self._get_packed_length(msg) + msg for msg in fc2_orig_msgs))  # Sends two messages at once
+        expected = ''
+        for msg in fc2_orig_msgs:
+            fc2_broadcast_msg = self._get_broadcast_message(fc2.getsockname(), msg)
+            expected += self._get_packed_length(fc2_broadcast_msg) + fc2_broadcast_msg
+        received = ''
+        while len(received) < len(expected):
+            received += fc1.recv(self.RECV_BUFFER)
+        self.assertEqual(received, expected)
+
+        fc1.close()
+        fc2.close()
+
+    def test_rooms(self):
+        """
+        Tests that the messages published to a room only reach its subscribers.
+        """
+        fc1 = self._get_fake_client()  # The first client connects
+        fc2 = self._get_fake_client()  # The second client connects
+        fc3 = self._get_fake_client()  # The third client connects
+        self.assertEqual(self._recv_message(fc1), self._get_enter_message(fc2.getsockname()))
+        self.assertEqual(self._recv_message(fc1), self._get_enter_message(fc3.getsockname()))
+        self.assertEqual(self._recv_message(fc2), self._get_enter_message(fc3.getsockname()))
+
+        self._send_message(fc1, '/join news\n')  # The first and the second clients join the room
+        self.assertEqual(self._recv_message(fc1), '\nYou joined the room news\n')
+        self._send_message(fc2, '/join news\n')
+        self.assertEqual(self._recv_message(fc2), '\nYou joined the room news\n')
+
+        self._send_message(fc1, '/pub news Hello\n')  # The first client publishes a message to the room
+        self.assertEqual(self._recv_message(fc2), "\r[news] <%s> Hello\n" % (fc1.getsockname(),))
+        self._assert_nothing_received(fc3)  # ... which does not reach the third client
+
+        self._send_message(fc2, '/leave news\n')  # The second client leaves the room
+        self.assertEqual(self._recv_message(fc2), '\nYou left the room news\n')
+        self._send_message(fc1, '/pub news Bye\n')
+        self._assert_nothing_received(fc2)
+
+        fc1.close()
+        fc2.close()
+        fc3.close()
+
+    def test_history(self):
+        """
+        Tests that the messages published to a room are replayed starting from the requested sequence number.
+        """
+        self.chat_server.HISTORY_SIZE = 3
+        fc1 = self._get_fake_client()  # The first client connects
+        self._send_message(fc1, '/history news\n')  # Asks for the position of a room without messages
+        self.assertEqual(self._recv_message(fc1), "\nHistory of the room news replayed up to #0\n")
+
+        published = []
+        for i in xrange(5):  # The first client publishes more messages than the history can hold
+            self._send_message(fc1, '/pub news Hello %d\n' % i)
+            published.append("\r[news] <%s> Hello %d\n" % (fc1.getsockname(), i))
+
+        self._send_message(fc1, '/history news 3\n')  # Asks for the last two messages
+        self.assertEqual([self._recv_message(fc1) for _ in xrange(3)],
+                         published[3:] + ["\nHistory of the room news replayed up to #5\n"])
+        self._send_message(fc1, '/history news 0\n')  # Asks for messages already overwritten
+        self.assertEqual([self._recv_message(fc1) for _ in xrange(4)],
+                         published[2:] + ["\nHistory of the room news replayed up to #5\n"])
+
+        fc1.close()
+
+    def test_history_rooms(self):
+        """
+        Tests that the history of the least recently published room is forgotten beyond the max number of rooms.
+        """
+        self.chat_server.HISTORY_ROOMS = 2
+        fc1 = self._get_fake_client()  # The first client connects
+        for room in ['news', 'sport', 'news', 'music']:  # The history of sport is the least recently published
+            self._send_message(fc1, '/pub %s Hello\n' % room)
+        for room, next_seq in [('news', 2), ('sport', 0), ('music', 1)]:
+            self._send_message(fc1, '/history %s\n' % room)
+            self.assertEqual(self._recv_message(fc1), "\nHistory of the room %s replayed up to #%d\n" % (room, next_seq))
+        fc1.close()
+
+    def test_history_laggard(self):
+        """
+        Tests that the histories replayed to a client which does not read are queued within the high-water mark,
+        and that they are then wholly delivered, whatever the laggard policy.
+        """
+        self.chat_server.HISTORY_SIZE = 3
+        self.chat_server.HIGH_WATER_MARK = 200000
+        msg = 'x' * 100000
+        for policy in ('drop', 'disconnect'):
+            self.chat_server.LAGGARD_POLICY = policy
+            fc1 = self._get_fake_client()  # The first client connects but does not read
+            fc1.settimeout(None)
+            for _ in xrange(3):  # The room of each policy has its own history
+                self._send_message(fc1, '/pub %s %s\n' % (policy, msg))
+            for _ in xrange(30):  # Asks for much more than the socket buffers and the high-water mark can hold
+                self._send_message(fc1, '/history %s 0\n' % policy)
+            time.sleep(1)  # Gives the server the time for replaying the histories
+            conn = self.chat_server.clients.values()[0]
+            self.assertLessEqual(conn.out_bytes, self.chat_server.HIGH_WATER_MARK + len(msg) + 100)
+            history = ["\r[%s] <%s> %s\n" % (policy, fc1.getsockname(), msg)] * 3
+            fc1.settimeout(5)
+            for _ in xrange(30):  # Then the client reads every history, followed by its end
+                self.assertEqual([self._recv_message(fc1) for _ in xrange(4)],
+                                 history + ["\nHistory of the room %s replayed up to #3\n" % policy])
+            fc1.close()
+            time.sleep(0.1)  # Gives the server the time for handling the disconnection
+
+    def test_history_requests(self):
+        """
+        Tests that the histories requested beyond the max number of replays waiting are handled as the messages
+        beyond the high-water mark.
+        """
+        self.chat_server.HISTORY_SIZE = 3
+        self.chat_server.HIGH_WATER_MARK = 200000
+        self.chat_server.MAX_REPLAYS = 5
+        self.chat_server.LAGGARD_POLICY = 'disconnect'
+        fc1 = self._get_fake_client()  # The first client connects but does not read
+        fc1.settimeout(None)
+        for _ in xrange(3):
+            self._send_message(fc1, '/pub news %s\n' % ('x' * 100000))
+        for _ in xrange(100):  # Keeps asking without reading
+            self._send_message(fc1, '/history news 0\n')
+        time.sleep(1)  # Gives the server the time for replaying the histories
+        self.assertEqual(self.chat_server.clients, {})
+        fc1.close()
+
+    def test_pipelined_messages_after_disconnection(self):
+        """
+        Tests that the messages following the one which got a client disconnected are not handled.
+        """
+        self.chat_server.LAGGARD_POLICY = 'disconnect'
+        self.chat_server.HIGH_WATER_MARK = -1  # Even an empty queue is beyond the mark
+        fc1 = self._get_fake_client()  # The first client connects
+        fc1.send(''.join(self._get_packed_length(msg) + msg for msg in ['/join news\n', '/join sport\n']))
+        self.assertEqual(fc1.recv(self.RECV_BUFFER), '')  # The first acknowledgement disconnects the client...
+        time.sleep(0.1)
+        self.assertEqual(self.chat_server.rooms, {})  # ... which has not joined the second room meanwhile
+        fc1.close()
+
+    def test_message_beyond_mark(self):
+        """
+        Tests that a message longer than the high-water mark is delivered to a client which reads,
+        whatever the laggard policy.
+        """
+        self.chat_server.HIGH_WATER_MARK = 1000
+        msg = 'x' * 5000
+        for policy in ('drop', 'disconnect'):
+            self.chat_server.LAGGARD_POLICY = policy
+            fc1 = self._get_fake_client()  # The first client connects
+            fc2 = self._get_fake_client()  # The second client connects
+            self._recv_message(fc1)  # Receives the announcement of the second client
+            self._send_message(fc2, msg)  # The second client sends a message longer than the mark
+            self.assertEqual(self._recv_message(fc1), self._get_broadcast_message(fc2.getsockname(), msg))
+            fc1.close()
+            fc2.close()
+            time.sleep(0.1)  # Gives the server the time for handling the disconnections
+
+    def _flood_laggard(self):
+        """
+        Connects a client which never reads and floods it through a second client.
+
+        :return: the pair (laggard, sender) of connected clients
+        """
+        laggard = self._get_fake_client()  # The first client connects but never reads
+        sender = self._get_fake_client()  # The second client connects
+        sender.settimeout(None)
+        msg = 'x' * 100000
+        for _ in xrange(100):  # Sends much more than the socket buffers and the high-water mark can hold
+            sender.sendall(self._get_packed_length(msg) + msg)
+        time.sleep(1)  # Gives the server the time for broadcasting the messages
+        return laggard, sender
+
+    def test_laggard_disconnection(self):
+        """
+        Tests that a client which does not read is disconnected beyond the high-water mark.
+        """
+        self.chat_server.LAGGARD_POLICY = 'disconnect'
+        laggard, sender = self._flood_laggard()
+        received = None
+        while received != '':  # The server closes the connection after the last message queued
+            received = laggard.recv(self.RECV_BUFFER * 16)
+        laggard.close()
+        sender.close()
+
+    def test_laggard_drop(self):
+        """
+        Tests that the messages beyond the high-water mark are dropped, while the other messages
+        still arrive whole.
+        """
+        laggard, sender = self._flood_laggard()
+        sender_enter_msg = self._get_enter_message(sender.getsockname())
+        self.assertEqual(laggard.recv(self.RECV_MSG_LEN), self._get_packed_length(sender_enter_msg))
+        self.assertEqual(laggard.recv(len(sender_enter_msg)), sender_enter_msg)
+        broadcast_msg = self._get_broadcast_message(sender.getsockname(), 'x' * 100000)
+        frame = self._get_packed_length(broadcast_msg) + broadcast_msg
+        received = ''
+        try:
+            while True:
+                received += laggard.recv(self.RECV_BUFFER * 16)
+        except socket.timeout:
+            pass
+        self.assertTrue(0 < len(received) < 100 * len(frame))  # Some messages have been dropped...
+        self.assertEqual(received, frame * (len(received) // len(frame)))  # ... but none has been truncated
+        laggard.close()
+        sender.close()
+
+
+class CoalescingChatServerTest(EpollChatServerTest):
+    """
+    Provides tests for the EpollChatServer application when its writes are coalesced.
+    """
+
+    PORT = _PORT + 4
+
+    def setUp(self):
+        """
+        Sets up the test environment by running a new EpollChatServer thread which coalesces its writes.
+        """
+        EpollChatServerTest.setUp(self)
+        self.chat_server.COALESCE_WINDOW = 1000  # The server loop has started, but no message has been sent yet
+
+    def test_coalesced_writes(self):
+        """
+        Tests that the messages queued for a client within the window are sent by a single write.
+        """
+        fc1 = self._get_fake_client()  # The first client connects
+        fc2 = self._get_fake_client()  # The second client connects
+        self._recv_message(fc1)  # Receives the announcement of the second client
+
+        conn = [conn for conn in self.chat_server.clients.values() if conn.address == fc1.getsockname()][0]
+        sent = []
+        send = conn.sock.send
+        def counting_send(data):
+            sent.append(len(data))
+            return send(data)
+        conn.sock.send = counting_send  # Counts the writes to the first client
+
+        fc2_orig_msgs = ['Hello', 'World', '!']
+        fc2.send(''.join(self._get_packed_length(msg) + msg for msg in fc2_orig_msgs))  # Sends three messages at once
+        for msg in fc2_orig_msgs:
+            self.assertEqual(self._recv_message(fc1), self._get_broadcast_message(fc2.getsockname(), msg))
+        self.assertEqual(len(sent), 1)  # The three messages have been sent together
+
+        fc1.close()
+        fc2.close()
+
+
+class ChatClusterTest(ChatServerTest):
+    """
+    Provides tests for the ChatCluster application.
+    """
+
+    PORT = _PORT + 3
+    WORKERS = 3
+
+    def setUp(self):
+        """
+        Sets up the test environment by running a new ChatCluster process.
+        """
+        chat_cluster = ChatCluster(self.HOST, self.PORT, self.WORKERS)
+        chat_cluster.ANNOUNCE_PRESENCE = False  # Announcements from different workers are not ordered
+        self.chat_cluster = multiprocessing.Process(target=chat_cluster.run)
+        self.chat_cluster.start()
+
+        time.sleep(1)  # Gives the workers the time for binding the socket
+
+    def test_broadcast(self):
+        """
+        Tests that a message is broadcast to the clients of all the workers.
+        """
+        clients = [self._get_fake_client() for _ in xrange(12)]  # The kernel spreads the clients among the workers
+        time.sleep(1)  # Gives the workers the time for accepting the clients
+
+        orig_msg = 'Hello'
+        clients[0].send(self._get_packed_length(orig_msg) + orig_msg)  # The first client sends a message
+        broadcast_msg = self._get_broadcast_message(clients[0].getsockname(), orig_msg)
+        for client in clients[1:]:
+            self.assertEqual(client.recv(self.RECV_MSG_LEN), self._get_packed_length(broadcast_msg))
+            self.assertEqual(client.recv(self.RECV_BUFFER), broadcast_msg)
+
+        for client in clients:
+            client.close()
+
+    def test_heavy_broadcast(self):
+        """
+        Tests that a big message is relayed whole to the clients of all the workers.
+        """
+        clients = [self._get_fake_client() for _ in xrange(12)]  # The kernel spreads the clients among the workers
+        time.sleep(1)  # Gives the workers the time for accepting the clients
+
+        orig_msg = os.urandom(100000)  # Creates a message of 100000 bytes
+        clients[0].send(self._get_packed_length(orig_msg) + orig_msg)  # The first client sends an heavy message
+        broadcast_msg = self._get_broadcast_message(clients[0].getsockname(), orig_msg)
+        for client in clients[1:]:
+            self.assertEqual(client.recv(self.RECV_MSG_LEN), self._get_packed_length(broadcast_msg))
+            received = ''
+            while len(received) < len(broadcast_msg):
+                received += client.recv(self.RECV_BUFFER)
+            self.assertEqual(received, broadcast_msg)
+
+        for client in clients:
+            client.close()
+
+    def test_rooms(self):
+        """
+        Tests that the messages published to a room reach its subscribers connected to all the workers.
+        """
+        clients = [self._get_fake_client() for _ in xrange(12)]  # The kernel spreads the clients among the workers
+        for client in clients[::2]:  # Half of the clients join the room
+            self._send_message(client, '/join news\n')
+            self.assertEqual(self._recv_message(client), '\nYou joined the room news\n')
+
+        self._send_message(clients[0], '/pub news Hello\n')  # The first client publishes a message to the room
+        for client in clients[2::2]:
+            self.assertEqual(self._recv_message(client), "\r[news] <%s> Hello\n" % (clients[0].getsockname(),))
+        for client in clients[1::2]:
+            self._assert_nothing_received(client)
+
+        for client in clients:
+            client.close()
+
+    def test_stats(self):
+        """
+        Statistics are collected by each worker into its own process, so they cannot be read by the test.
+        """
+        self.skipTest('statistics are collected by each worker process')
+
+    def tearDown(self):
+        """
+        Clears the test environment by stopping the workers.
+        """
+        self.chat_cluster.terminate()
+        self.chat_cluster.join()
+
+
+class ClusterChatServerTest(unittest.TestCase):
+    """
+    Provides tests for the relaying of the ClusterChatServer.
+    """
+
+    def setUp(self):
+        """
+        Sets up the test environment by binding a ClusterChatServer connected to a socket playing another worker.
+        """
+        sock, self.worker = socket.socketpair()
+        self.chat_server = ClusterChatServer(_HOST, _PORT + 5, [sock])
+        self.chat_server._bind_socket()  # The loop is not run, so the relayed messages are only queued
+
+    def test_stalled_worker(self):
+        """
+        Tests that a worker which does not read the relayed messages is detached beyond the bus high-water mark.
+        """
+        self.chat_server.BUS_HIGH_WATER_MARK = 1 << 20
+        peer = self.chat_server.bus.values()[0]
+        msg = 'x' * 100000
+        while self.chat_server.bus:  # Relays much more than the socket buffers and the high-water mark can hold
+            self.assertLessEqual(peer.out_bytes, self.chat_server.BUS_HIGH_WATER_MARK)
+            self.chat_server._relay('', msg)
+        self.worker.settimeout(1)
+        received = None
+        while received != '':  # The connection is closed after the messages already sent
+            received = self.worker.recv(_RECV_BUFFER * 16)
+
+    def tearDown(self):
+        """
+        Clears the test environment by closing the sockets.
+        """
+        self.chat_server.server_socket.close()
+        self.chat_server.poller.close()
+        os.close(self.chat_server._wakeup_r)
+        os.close(self.chat_server._wakeup_w)
+        self.worker.close()
+
+
+class LaggardsChatServerTest(unittest.TestCase):
+    """
+    Provides tests for the EpollChatServer disconnecting many laggards at once.
+    """
+
+    LAGGARDS = 400  # defines the number of clients beyond the high-water mark
+
+    def setUp(self):
+        """
+        Sets up the test environment by binding an EpollChatServer whose clients are all beyond the high-water mark.
+        """
+        self.chat_server = EpollChatServer(_HOST, _PORT + 6)
+        self.chat_server.LAGGARD_POLICY = 'disconnect'
+        self.chat_server._bind_socket()  # The loop is not run, so the messages are only queued
+        self.peers = []
+        for port in xrange(self.LAGGARDS):
+            sock, peer = socket.socketpair()
+            sock.setblocking(0)
+            conn = _Connection(sock, (_HOST, port), _RECV_BUFFER)
+            conn.out_queue.append('x' * (self.chat_server.HIGH_WATER_MARK + 1))  # Nothing of it has been sent
+            conn.out_bytes = self.chat_server.HIGH_WATER_MARK + 1
+            conn.writing = True
+            self.chat_server.clients[conn.fd] = conn
+            self.chat_server.poller.register(conn.fd, _READ_EVENTS)
+            self.peers.append(peer)
+
+    def test_laggards_disconnection(self):
+        """
+        Tests that a message disconnecting many laggards does not nest their announcements.
+        """
+        self.chat_server._broadcast(None, 'Hello')
+        self.assertEqual(self.chat_server.clients, {})
+        for peer in self.peers:
+            peer.settimeout(1)
+            self.assertEqual(peer.recv(_RECV_BUFFER), '')  # Every laggard has been disconnected
+
+    def tearDown(self):
+        """
+        Clears the test environment by closing the sockets.
+        """
+        for conn in self.chat_server.clients.values():
+            conn.sock.close()
+        self.chat_server.server_socket.close()
+        self.chat_server.poller.close()
+        os.close(self.chat_server._wakeup_r)
+        os.close(self.chat_server._wakeup_w)
+        for peer in self.peers:
+            peer.close()
 
 
 class ChatClientTest(unittest.TestCase):
@@ -178,6 +702,7 @@ class ChatClientTest(unittest.TestCase):
     HOST = _HOST
     PORT = _PORT
     RECV_BUFFER = _RECV_BUFFER
+    CLIENT_CLASS = ChatClient
 
     def _fake_server(self):
         """
@@ -187,6 +712,7 @@ class ChatClientTest(unittest.TestCase):
         server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Making the address reusable
         server_sock.bind((self.HOST, self.PORT))
         server_sock.listen(0)
+        self.server_ready.set()  # Lets the client connect
         server_sock.accept()
         server_sock.close()
 
@@ -194,14 +720,16 @@ class ChatClientTest(unittest.TestCase):
         """
         Sets up the test environment by running a fake server in a background thread.
         """
+        self.server_ready = threading.Event()
         self.server_thread = threading.Thread(target=self._fake_server)
         self.server_thread.start()
+        self.server_ready.wait()
 
     def test_connection(self):
         """
         Tests the client-server connection.
         """
-        chat_client = ChatClient(self.HOST, self.PORT)
+        chat_client = self.CLIENT_CLASS(self.HOST, self.PORT)
         chat_client.start()
         time.sleep(1)
         chat_client.stop()
@@ -213,6 +741,186 @@ class ChatClientTest(unittest.TestCase):
         self.server_thread.join()
 
 
+class PollChatClientTest(ChatClientTest):
+    """
+    Provides tests for the PollChatClient application.
+    """
+
+    PORT = _PORT + 2
+    CLIENT_CLASS = PollChatClient
+
+
+class ChatClientRoomsTest(unittest.TestCase):
+    """
+    Provides tests for the tracking of the rooms performed by the ChatClient.
+    """
+
+    def setUp(self):
+        """
+        Sets up the test environment by connecting a ChatClient to a socket playing the server.
+        """
+        self.chat_client = ChatClient(_HOST, _PORT)
+        self.chat_client.client_socket, self.server = socket.socketpair()
+        self.decoder = FrameDecoder()
+
+    def _recv_messages(self, count):
+        """
+        Receives the given number of messages sent by the client.
+
+        :param count: the number of messages
+        :return: the list of the unpacked messages
+        """
+        messages = []
+        while len(messages) < count:
+            messages.extend(self.decoder.recv_from(self.server))
+        return messages
+
+    def test_sequence_numbers(self):
+        """
+        Tests that the client counts the messages of its rooms and resumes them from the next message.
+        """
+        self.chat_client._handle_input('/join news\n')
+        self.assertEqual(self._recv_messages(2), ['/join news\n', '/history news\n'])
+        self.chat_client._handle_message("\nHistory of the room news replayed up to #5\n")
+        self.assertEqual(self.chat_client.rooms, {'news': 5})
+
+        self.chat_client._handle_message("\r[news] <('127.0.0.1', 1234)> Hello\n")  # Another client publishes
+        self.chat_client._handle_input('/pub news World\n')  # The client publishes
+        self.chat_client._handle_message("\r[sport] <('127.0.0.1', 1234)> Hello\n")  # Not a room of the client
+        self.assertEqual(self._recv_messages(1), ['/pub news World\n'])
+        self.assertEqual(self.chat_client.rooms, {'news': 7})
+
+        self.chat_client._resume_rooms()
+        self.assertEqual(self._recv_messages(2), ['/join news\n', '/history news 7\n'])
+
+    def tearDown(self):
+        """
+        Clears the test environment by closing the sockets.
+        """
+        self.chat_client.client_socket.close()
+        self.server.close()
+
+
+class FrameDecoderTest(unittest.TestCase):
+    """
+    Provides tests for the FrameDecoder.
+    """
+
+    def setUp(self):
+        """
+        Sets up the test environment by creating a pair of connected sockets.
+        """
+        self.sender, self.receiver = socket.socketpair()
+
+    def _pack(self, msg):
+        """
+        Given a message, returns it prefixed by its packed length.
+
+        :param msg: the message
+        :return: the packed message
+        """
+        return struct.pack('>I', len(msg)) + msg
+
+    def test_pipelined_messages(self):
+        """
+        Tests that many messages received by a single read are all decoded.
+        """
+        decoder = FrameDecoder()
+        self.sender.send(self._pack('Hello') + self._pack('') + self._pack('World'))
+        self.assertEqual(decoder.recv_from(self.receiver), ['Hello', '', 'World'])
+
+    def test_split_messages(self):
+        """
+        Tests that messages split among many reads are decoded once they are complete.
+        """
+        decoder = FrameDecoder(8)  # A small buffer, which has to be reused and grown
+        msgs = [os.urandom(10000), 'Hello', os.urandom(3)]
+        data = ''.join(self._pack(msg) for msg in msgs)
+        decoded = []
+        for i in xrange(0, len(data), 3):
+            self.sender.send(data[i:i + 3])
+            decoded.extend(decoder.recv_from(self.receiver))
+        self.assertEqual(decoded, msgs)
+
+    def test_oversized_messages(self):
+        """
+        Tests that a message longer than the max frame size is rejected as soon as its length is received.
+        """
+        decoder = FrameDecoder(max_frame_size=100)
+        self.sender.send(self._pack('x' * 100))
+        self.assertEqual(decoder.recv_from(self.receiver), ['x' * 100])
+        self.sender.send(struct.pack('>I', 0xFFFFFFFF) + 'x')
+        self.assertRaises(FrameError, decoder.recv_from, self.receiver)
+
+    def test_buffer_release(self):
+        """
+        Tests that the buffer grown for a long message is released once the message has been decoded.
+        """
+        decoder = FrameDecoder(8)
+        msg = os.urandom(10000)
+        self.sender.sendall(self._pack(msg))
+        decoded = []
+        while not decoded:
+            decoded.extend(decoder.recv_from(self.receiver))
+        self.assertEqual(decoded, [msg])
+        self.sender.send(self._pack('Hi'))
+        self.assertEqual(decoder.recv_from(self.receiver), ['Hi'])
+        self.assertEqual(len(decoder._buffer), 8)  # The buffer is back to its initial size
+
+    def test_disconnection(self):
+        """
+        Tests that a closed connection is reported.
+        """
+        self.sender.close()
+        self.assertIsNone(FrameDecoder().recv_from(self.receiver))
+
+    def tearDown(self):
+        """
+        Clears the test environment by closing the sockets.
+        """
+        self.sender.close()
+        self.receiver.close()
+
+
+class HistogramTest(unittest.TestCase):
+    """
+    Provides tests for the Histogram.
+    """
+
+    def test_percentiles(self):
+        """
+        Tests that the percentiles are computed with the precision of the buckets.
+        """
+        histogram = Histogram()
+        for i in xrange(1, 1001):
+            histogram.add(i / 1e6)  # From 1 to 1000 microseconds
+        for percent in (50, 99, 99.9):
+            self.assertAlmostEqual(histogram.percentile(percent), percent * 10 / 1e6, delta=percent * 10 / 1e8 + 1e-6)
+        self.assertEqual(histogram.percentile(100), 1000 / 1e6)
+
+    def test_merge(self):
+        """
+        Tests that merging two histograms is the same as counting all the durations into a single one.
+        """
+        first, second, both = Histogram(), Histogram(), Histogram()
+        for i in xrange(100):
+            (first if i % 2 else second).add(i / 1e3)
+            both.add(i / 1e3)
+        first.merge(second)
+        self.assertEqual(first.to_dict(), both.to_dict())
+
+    def test_negative_durations(self):
+        """
+        Tests that the negative durations (e.g. across a step back of the clock) are counted as zero.
+        """
+        histogram = Histogram()
+        histogram.add(-0.5)
+        histogram.add(0.001)
+        self.assertEqual(histogram.count, 2)
+        self.assertEqual(histogram.total, 0.001)
+        self.assertAlmostEqual(histogram.percentile(50), 0.0, delta=1e-6)  # The first bucket
+
+
 if __name__ == '__main__':
     """The entry point of the program. It simply runs the test cases.
     """
@@ -25,84 +25,312 @@ Output:
 * The system provides the probability a person has measles given either a subset or all the diagnostics observed.
   It is possible to define a custom set of diagnostic directly in the model.csv file.
 
-The programming language used is Python and it is assumed you have it installed into your pc. The operating system
-of reference is Linux. There are two basic ways to execute this script:
+The model is kept as a NumPy array with one axis for each feature, so that the features which are not observed are
+marginalized out by summing along their axes. Many patients may also be diagnosed in one run through the -batch
+option: the patients observing the same features share the same marginal model and are computed together. Finally,
+the -serve option runs a local server answering queries through a Unix socket, with the model loaded once and
+reloaded as soon as the model.csv file changes (see the _DiagnosisServer class).
+
+Big models may be converted once by the -convert option into a binary file of packed float64 values (see the
+_save_binary_model function), which can then be given to the -model option in place of the model.csv file: it is mapped
+into memory instead of being parsed, so the loading is nearly instant and the memory is shared among the processes.
+
+The programming language used is Python and it is assumed you have it installed into your pc together with NumPy
+(http://www.numpy.org/). The operating system of reference is Linux. There are two basic ways to execute this script:
 1 - launching it by the command shell through the python command: python path_to_the_script args
 2 - making it executable first and then launching by the command shell as: ./file_name args
    (assuming we are into the folder containing the file)
 
 Enjoy!
 """
-import sys, csv
+import os, sys, csv
+import stat
+import errno
+import struct
 import argparse
 import itertools
+import threading
+import collections
+import SocketServer
+import numpy as np
 
+_BATCH_SIZE = 10000  # Defines how many patients of a batch are read and computed together
+_PRIOR_COLUMN = 'prior'  # Defines the optional column holding the prior probability of each patient of a batch
+_MARGINALS_CACHE_SIZE = 128  # Defines how many marginal models are kept by a cache of marginals
+_BINARY_MAGIC = 'MDX1'  # Defines the first bytes of the binary models
+_BINARY_HEADER = struct.Struct('<4sII')  # Defines the magic number, the number of features and the size of their names
+_BINARY_ALIGNMENT = 8  # Defines the alignment of the probability values into the binary models
 
 def _get_model_info(model_csv):
     """Given a csv file containing the model information, this methods returns the following as output:
        - a list of the features of the model
-       - a dictionary representing the model
-       Admitted feature values are concatenated in order to form the key of the model dictionary. To each key, 
-       (i.e. combination of feature values), the corresponding probability value is assigned.
+       - a NumPy array representing the model
+       The array has one axis of length 2 for each feature, so that each combination of (binary) feature values is
+       the index of the corresponding probability value. The combinations missing from the file get a probability
+       equal to zero. A binary model (see _save_binary_model) is also accepted in place of the csv file.
     """
-    model_as_dict = dict()       
+    with open(model_csv, 'rb') as model_file:
+        is_binary = model_file.read(len(_BINARY_MAGIC)) == _BINARY_MAGIC
+    if is_binary:
+        return _load_binary_model(model_csv)
     with open(model_csv, 'r') as csvfile:
-        dict_file = csv.DictReader(csvfile)
-        features = [field.lower().strip() for field in dict_file.fieldnames[:-1]]
-        for row in dict_file:
-            dict_row = {key.lower().strip(): value.strip() for (key, value) in row.iteritems()}
-            dict_key = ''.join(dict_row[field] for field in features)
-            dict_value = float(dict_row['probability'])
-            model_as_dict[dict_key] = dict_value
-    return features, model_as_dict
-
-def _compute_tmp_keys(features, args):
-    """This function computes the keys used to retrieve the probabilities from the model dictionary. It handles the case in which some
-       variables are not observed by generating all the possible 'labels' with the missing characters. The base assumption is that a 
-       character may be set to a binary value only (0, 1).
+        csv_file = csv.reader(csvfile)
+        fieldnames = [field.lower().strip() for field in next(csv_file)]
+        features = fieldnames[:-1]
+        prob_idx = fieldnames.index('probability')
+        model = np.zeros((2,) * len(features))
+        for row in csv_file:
+            if row:  # Skips the empty lines, as the csv.DictReader does
+                model[tuple(int(row[idx]) for idx in xrange(len(features)))] = float(row[prob_idx])
+    return features, model
+
+def _save_binary_model(features, model, model_bin):
+    """This function writes the model into a binary file, which loads in constant time. The file is made of:
+       - a header holding the magic number 'MDX1', the number of features and the size of their names (little-endian
+         uint32 values)
+       - the names of the features, separated by newlines and padded to a multiple of 8 bytes
+       - the probability values as packed little-endian float64 values, where the value of each combination of
+         feature values lies at the index given by the bit pattern of the combination ("measles" being the most
+         significant bit)
+       The file is written aside and then renamed, so that a process reading the previous file is not disturbed.
+    """
+    names = '\n'.join(features)
+    padding = -(_BINARY_HEADER.size + len(names)) % _BINARY_ALIGNMENT
+    tmp_path = model_bin + '.tmp'
+    with open(tmp_path, 'wb') as binfile:
+        binfile.write(_BINARY_HEADER.pack(_BINARY_MAGIC, len(features), len(names)) + names + '\0' * padding)
+        np.ascontiguousarray(model, dtype='<f8').tofile(binfile)
+    os.rename(tmp_path, model_bin)
+
+def _load_binary_model(model_bin):
+    """This function loads a binary model (see _save_binary_model) by mapping its probability values into memory rather
+       than reading them, so that the loading is nearly instant whatever the size of the model and the memory pages are
+       shared among all the processes using the same model. It returns the same output of _get_model_info.
+       A ValueError is raised when the file is not a binary model or its size does not match its header (e.g. it has
+       been truncated).
+    """
+    with open(model_bin, 'rb') as binfile:
+        header = binfile.read(_BINARY_HEADER.size)
+        if len(header) != _BINARY_HEADER.size or not header.startswith(_BINARY_MAGIC):
+            raise ValueError('invalid binary model')
+        magic, count, size = _BINARY_HEADER.unpack(header)
+        names = binfile.read(size)
+        file_size = os.fstat(binfile.fileno()).st_size
+    features = names.split('\n') if count else []
+    offset = _BINARY_HEADER.size + size + (-(_BINARY_HEADER.size + size) % _BINARY_ALIGNMENT)
+    if len(names) != size or len(features) != count or count >= 64 or file_size != offset + (8 << count):
+        raise ValueError('invalid binary model')
+    model = np.memmap(model_bin, dtype='<f8', mode='r', offset=offset, shape=(2,) * count)
+    return features, model
+
+def _get_marginal(model, observed, marginals=None):
+    """This function marginalizes the unobserved features out of the model, by summing the model along their axes.
+       The first axis of the result still refers to "measles", while the next ones refer to the observed features only,
+       in their original order.
+       The marginals argument is an optional cache (an OrderedDict) of the marginal models already computed for the
+       given model, keyed by the observed tuple: the least recently used one is evicted once the cache holds more than
+       _MARGINALS_CACHE_SIZE of them.
     """
-    tmp_key = ''
-    tmp_keys = []
-    placeholder = '%s'
-    for idx in range(1, len(features)): # Assuming "measles" is always the first feature/column into the csv file
-        f = features[idx]
-        if f not in args or args[f] is None:
-            tmp_key = tmp_key + placeholder # A temp placeholder for the absent features
-        else:
-            tmp_key = tmp_key + args[f]
-    ph_count = tmp_key.count(placeholder)
-    if ph_count > 0:
-        permutations = [tuple(''.join(seq)) for seq in itertools.product("01", repeat=ph_count)]
-        for perm in permutations:
-            tmp_keys.append(tmp_key % perm)
-    else:
-        tmp_keys.append(tmp_key)
-    return tmp_keys
-
-def _compute_posterior_prob(features, model_as_dict, prior, **args):
-    """This function is devoted to do the actual computation of the posterior probability. It computes:
-       1. the set of keys used to compute the probability that a 'c'-ondition happens given the person has the measles (p_c_m_keys)
-       2. the set of keys used to compute the probability that a 'c'-ondition happens given the person doesn't have the measles (p_c_nm_keys)
-       3. the probability that a 'c'-ondition happens given the person has the measles (p_c_m) as the sum of the retrieved probability for all 
-          the p_c_m_keys
-       4. the probability that a 'c'-ondition happens given the person doesn't have the measles (p_c_m) as the sum of the retrieved probability 
-          for all the p_c_nm_keys
-       5. the probability that the person has the 'm'-easles given that a certain 'c'-ondition happened (p_m_c), by means of the Bayes Theorem
+    if marginals is not None:
+        marginal = marginals.pop(observed, None)
+        if marginal is not None:
+            marginals[observed] = marginal  # Moves the marginal model to the most recently used end
+            return marginal
+    unobserved_axes = tuple(idx + 1 for idx, is_observed in enumerate(observed) if not is_observed)
+    marginal = model.sum(axis=unobserved_axes) if unobserved_axes else model
+    if marginals is not None:
+        marginals[observed] = marginal
+        if len(marginals) > _MARGINALS_CACHE_SIZE:
+            marginals.popitem(last=False)
+    return marginal
+
+def _compute_posterior_prob(features, model, prior, args, marginals=None):
+    """This function is devoted to do the actual computation of the posterior probability of the observed features,
+       given as a dictionary mapping each of them to its value (None or missing if not observed). It computes:
+       1. the marginal model over the observed 'c'-onditions, by summing out the unobserved ones
+       2. the probability that a 'c'-ondition happens given the person has the measles (p_c_m) and the probability
+          that a 'c'-ondition happens given the person doesn't have the measles (p_c_nm), as the two entries of the
+          marginal model indexed by the observed values (the marginal model is taken from the optional marginals
+          cache when the same features were already observed, see _get_marginal)
+       3. the probability that the person has the 'm'-easles given that a certain 'c'-ondition happened (p_m_c), by means of the Bayes Theorem
           and the Total Probability Theorem.
+       A ValueError is raised when the prior probability is not between 0 and 1, when an observed value is neither 0
+       nor 1, or when the observed 'c'-ondition has a zero probability (p_c), since the posterior probability is not
+       defined then.
     """
-    tmp_keys = _compute_tmp_keys(features, args)
-    p_c_m_keys = ['1' + key for key in tmp_keys]  # Assuming "measles" is always the first feature/column into the csv file
-    p_c_nm_keys = ['0' + key for key in tmp_keys] # Assuming "measles" is always the first feature/column into the csv file
-    p_c_m = 0.0
-    p_c_nm = 0.0
-    for p_c_m_key in p_c_m_keys:
-        p_c_m = p_c_m + model_as_dict[p_c_m_key]
-    for p_c_nm_key in p_c_nm_keys:
-        p_c_nm = p_c_nm + model_as_dict[p_c_nm_key]
+    if not 0 <= prior <= 1:
+        raise ValueError('the prior probability should be between 0 and 1, not %s' % prior)
+    # Assuming "measles" is always the first feature/column into the csv file
+    observed = tuple(f in args and args[f] is not None for f in features[1:])
+    values = tuple(int(args[f]) for f, is_observed in itertools.izip(features[1:], observed) if is_observed)
+    for f, value in itertools.izip([f for f in features[1:] if args.get(f) is not None], values):
+        if value not in (0, 1):
+            raise ValueError('the value of %s should be either 0 or 1, not %d' % (f, value))
+    marginal = _get_marginal(model, observed, marginals)
+    p_c_nm, p_c_m = marginal[(slice(None),) + values].tolist()
     p_c = p_c_m * prior + p_c_nm * (1.0 - prior)  # Total probability theorem
+    if p_c == 0:
+        raise ValueError('the observed features have a zero probability')
     p_m_c = p_c_m * prior / p_c                   # Bayes theorem
     return p_m_c
 
+def _compute_posterior_probs(features, model, observations, priors, marginals=None):
+    """This function computes the posterior probabilities of many patients at once. The patients are grouped by the set
+       of features they observed: the model is marginalized once for each group, then the probabilities of all the
+       patients of the group are gathered from the marginal model by a single array indexing. It takes:
+       - observations: the list of the dictionaries mapping the features of each patient to their values (None or
+         missing if not observed), as for _compute_posterior_prob
+       - priors: the prior probability of each patient (or a single prior probability for all of them)
+       - marginals: the optional cache of the marginal models, see _get_marginal
+       It returns a NumPy array with the posterior probability of each patient, in the given order. As for
+       _compute_posterior_prob, a ValueError is raised when a prior probability is not between 0 and 1, when an observed
+       value is neither 0 nor 1, or when the observed features of a patient have a zero probability.
+    """
+    priors = np.asarray(priors, dtype=float)
+    invalid = np.flatnonzero(~((priors >= 0) & (priors <= 1)))  # NaN is invalid as well
+    if len(invalid):
+        raise ValueError('the prior probability should be between 0 and 1, not %s' % priors.flat[invalid[0]])
+    groups = collections.defaultdict(list)
+    for idx, args in enumerate(observations):
+        groups[tuple(f in args and args[f] is not None for f in features[1:])].append(idx)
+    p_c_m = np.empty(len(observations))
+    p_c_nm = np.empty(len(observations))
+    for observed, rows in groups.iteritems():
+        observed_features = [f for f, is_observed in itertools.izip(features[1:], observed) if is_observed]
+        values = np.array([[int(observations[row][f]) for f in observed_features] for row in rows], dtype=int)
+        invalid = np.argwhere((values < 0) | (values > 1))
+        if len(invalid):
+            row, col = invalid[0]
+            raise ValueError('the value of %s should be either 0 or 1, not %d' % (observed_features[col], values[row, col]))
+        marginal = _get_marginal(model, observed, marginals)
+        p_c_nm[rows], p_c_m[rows] = marginal[(slice(None),) + tuple(values.reshape(len(rows), -1).T)]
+    p_c = p_c_m * priors + p_c_nm * (1.0 - priors)  # Total probability theorem
+    if not p_c.all():
+        args = observations[np.flatnonzero(p_c == 0)[0]]
+        raise ValueError('the observed features of a patient (%s) have a zero probability'
+                         % ' '.join('%s=%s' % (f, args[f]) for f in features[1:] if args.get(f) is not None))
+    p_m_c = p_c_m * priors / p_c                    # Bayes theorem
+    return p_m_c
+
+def _read_batches(batch_file, prior=None):
+    """This function reads the observations of many patients from a csv file, one patient for each row. The header names
+       the observed features, an empty value meaning that the feature was not observed, and it may also name a 'prior'
+       column holding the prior probability of each patient. The rows are read lazily, so that the file may also be a
+       stream, and they are yielded in chunks of _BATCH_SIZE patients as (observations, priors) pairs.
+    """
+    csv_file = csv.reader(batch_file)
+    fieldnames = [field.lower().strip() for field in next(csv_file)]
+    observations, priors = [], []
+    for row in csv_file:
+        if not row:
+            continue  # Skips the empty lines, as the csv.DictReader does
+        args = {key: value.strip() or None for (key, value) in itertools.izip(fieldnames, row)}
+        row_prior = args.pop(_PRIOR_COLUMN, None)
+        if row_prior is None and prior is None:
+            sys.exit('ERROR: The prior probability of a patient is missing from the batch and no -prior was given!')
+        observations.append(args)
+        priors.append(prior if row_prior is None else float(row_prior))
+        if len(observations) == _BATCH_SIZE:
+            yield observations, priors
+            observations, priors = [], []
+    if observations:
+        yield observations, priors
+
+def _remove_socket(socket_path):
+    """This function removes the Unix socket file found at the given path, if any. Any other kind of file is kept and an
+       OSError is raised instead, so that a mistyped path never deletes a regular file.
+    """
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            return
+        raise
+    if not stat.S_ISSOCK(mode):
+        raise OSError(errno.EEXIST, 'The path exists and it is not a socket', socket_path)
+    os.unlink(socket_path)
+
+class _DiagnosisServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """This class is a local server keeping the model in memory, so that each query costs only the computation of the
+       posterior probability. The clients connect to the Unix socket and send one query for each line, made of the
+       observed features as feature=value pairs separated by whitespaces (e.g. "fever=1 spots=0"), optionally
+       together with a prior=value pair overriding the prior probability given to the server. The server answers each
+       query with a line holding either the posterior probability or an error message starting with "ERROR:".
+       The model is loaded again as soon as its file is modified, i.e. its modification time changes.
+       Each connection is served by its own thread, while the reloads and the computations are serialized by a lock,
+       since the loaded model and its cache of marginals are shared among all the threads.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path, model_csv, prior=None):
+        """Loads the model and binds the server to the given Unix socket, replacing any stale socket file. An OSError is
+           raised if the path exists and it is not a socket.
+        """
+        self.model_csv = model_csv
+        self.prior = prior
+        self.model_mtime = None
+        self.state = None  # The (features, model, marginals) triple of the loaded model
+        self.lock = threading.Lock()  # Guards the state, above all the cache of marginals
+        self._reload_model()
+        _remove_socket(socket_path)
+        SocketServer.UnixStreamServer.__init__(self, socket_path, _DiagnosisHandler)
+
+    def _reload_model(self):
+        """Loads the model whenever its file has been modified since the last load. If the new file cannot be parsed
+           (e.g. it is still being written), the previous model is kept until the file is modified again. It should be
+           called holding the lock, except by the constructor.
+        """
+        mtime = os.stat(self.model_csv).st_mtime
+        if mtime == self.model_mtime:
+            return
+        self.model_mtime = mtime
+        try:
+            features, model = _get_model_info(self.model_csv)
+        except (IOError, ValueError, IndexError, StopIteration) as e:
+            if self.state is None:
+                raise
+            sys.stderr.write('ERROR: The model could not be reloaded (%s), the previous one is kept.\n' % e)
+            return
+        self.state = (features, model, collections.OrderedDict())
+
+    def answer(self, query):
+        """Computes the answer to a query line.
+        """
+        try:
+            args = dict(token.split('=', 1) for token in query.split())
+            args = {key.lower().strip(): value for (key, value) in args.iteritems()}
+            prior = float(args.pop('prior')) if 'prior' in args else self.prior
+            if prior is None:
+                return 'ERROR: The prior probability is missing!'
+            with self.lock:
+                self._reload_model()
+                features, model, marginals = self.state
+                return '%s' % _compute_posterior_prob(features, model, prior, args, marginals)
+        except Exception as e:  # Whatever the query, the connection goes on
+            return 'ERROR: Invalid query (%s).' % e
+
+    def server_close(self):
+        """Closes the server and removes its socket file, unless the path has been replaced by another kind of file.
+        """
+        SocketServer.UnixStreamServer.server_close(self)
+        try:
+            _remove_socket(self.server_address)
+        except OSError as e:
+            sys.stderr.write('ERROR: The socket file could not be removed (%s).\n' % e)
+
+class _DiagnosisHandler(SocketServer.StreamRequestHandler):
+    """This class answers the queries sent through a connection to the _DiagnosisServer, until the client disconnects.
+    """
+
+    def handle(self):
+        """Reads the queries one line at a time and writes the answers.
+        """
+        while True:
+            query = self.rfile.readline()
+            if not query:
+                break
+            self.wfile.write(self.server.answer(query) + '\n')
+
 
 def main():
     """The main function of the program. It is devoted to parse command line arguments, to compute the right input arguments and it
@@ -114,13 +342,50 @@ def main():
                                                       is Linux. Script usage: python path_to_the_script prg_args''')
     main_group = parser.add_argument_group('Mandatory arguments')
     main_group.add_argument('-model', help='the full path where the model.csv file is stored into the system (mandatory)', required=True)
-    main_group.add_argument('-prior', help='the prior probability that someone has measles (mandatory)', required=True, type=float)
+    main_group.add_argument('-prior', help='the prior probability that someone has measles (mandatory, unless each row of the '
+                                           'batch file has its own prior)', type=float)
     
     opt_group = parser.add_argument_group('Optional arguments')
     opt_group.add_argument('-fever', help='the presence/absence of fever among the symptoms')
     opt_group.add_argument('-spots', help='the presence/absence of spots among the symptoms')
     opt_group.add_argument('-other_features', help='a dictionary of other symptoms (use python syntax)', type=str)
+    opt_group.add_argument('-batch', help='the csv file of the symptoms of many patients, one for each row, whose posterior '
+                                          'probabilities are printed in the same order (use - for the standard input)')
+    opt_group.add_argument('-convert', help='the path of a binary model written from the model.csv file, which may then be '
+                                            'given to -model in its place for an instant loading', metavar='MODEL_BIN')
+    opt_group.add_argument('-serve', help='the path of a Unix socket on which a server answers the queries, keeping the model '
+                                          'loaded and reloading it whenever the model.csv file is modified', metavar='SOCKET')
     args = parser.parse_args()
+    if args.convert is not None:
+        _save_binary_model(*_get_model_info(args.model), model_bin=args.convert)
+        return
+    if args.serve is not None:
+        try:
+            server = _DiagnosisServer(args.serve, args.model, args.prior)
+        except OSError as e:
+            sys.exit('ERROR: The server could not be started (%s)!' % e)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+    if args.batch is not None:
+        given_features, model = _get_model_info(args.model)
+        batch_file = sys.stdin if args.batch == '-' else open(args.batch, 'r')
+        marginals = collections.OrderedDict()  # Shares the marginal models among the chunks of the batch
+        try:
+            for observations, priors in _read_batches(batch_file, args.prior):
+                post_ps = _compute_posterior_probs(given_features, model, observations, priors, marginals)
+                sys.stdout.write(''.join('%s\n' % post_p for post_p in post_ps.tolist()))
+        except ValueError as e:
+            sys.exit('ERROR: Invalid batch (%s)!' % e)
+        finally:
+            batch_file.close()
+        return
+    if args.prior is None:
+        parser.error('argument -prior is required')
     # Building the dictionary of the input arguments
     input_features = dict()
     input_features['fever'] = args.fever
@@ -132,13 +397,16 @@ def main():
             input_features.update(args.other_features)
         except: 
             sys.stderr('Invalid syntax for the dictionary of the other features.')
-    given_features, model_as_dict = _get_model_info(args.model)
+    given_features, model = _get_model_info(args.model)
     if (args.fever is None) and (args.spots is None) and not args.other_features:
         parser.print_help()
         print
         sys.exit('ERROR: Almost one optional argument, taken from (fever, spots, ..) should be given as input!')
     # Computing the posterior probability
-    post_p = _compute_posterior_prob(given_features, model_as_dict, args.prior, **input_features)
+    try:
+        post_p = _compute_posterior_prob(given_features, model, args.prior, input_features)
+    except ValueError as e:
+        sys.exit('ERROR: Invalid arguments (%s)!' % e)
     print 'The posterior probability is...', post_p
     
     
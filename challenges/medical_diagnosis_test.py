@@ -0,0 +1,315 @@
+"""
+Created on 17/10/2026
+
+@author: gioia
+
+This script provides test cases for the medical diagnosis utility.
+
+The code is organized as follows:
+- the PosteriorProbTest class tests the posterior probabilities computed for a single patient and for a batch of
+  patients, together with the cache of the marginal models they share and the binary models (defined in the
+  medical_diagnosis module);
+- the DiagnosisServerTest class tests the _DiagnosisServer (defined in the medical_diagnosis module) answering
+  many clients at once and managing its socket file.
+
+The programming language used is Python 2.7 and it is assumed you have it installed into your PC together with
+NumPy (http://www.numpy.org/). The operating system of reference is Linux. There are two basic ways to execute this
+script in Linux:
+1 - launching it by the command shell through the python command;
+2 - making it executable first and then launching it by the command shell.
+
+
+Enjoy!
+"""
+import os
+import sys
+import random
+import socket
+import itertools
+import collections
+import shutil
+import tempfile
+import unittest
+import threading
+
+from medical_diagnosis import (_MARGINALS_CACHE_SIZE, _get_model_info, _save_binary_model, _load_binary_model,
+                               _get_marginal, _compute_posterior_prob, _compute_posterior_probs, _DiagnosisServer, np)
+
+_MODEL = '''Measles,Spots,Fever,Probability
+1,1,1,0.6
+1,0,1,0.25
+1,1,0,0.1
+1,0,0,0.05
+0,1,1,0
+0,0,1,0.2
+0,1,0,0.35
+0,0,0,0.4
+'''  # Defines the model of the tests: spots and fever together never happen without measles
+
+
+class PosteriorProbTest(unittest.TestCase):
+    """
+    Provides tests for the posterior probabilities.
+    """
+
+    def setUp(self):
+        """
+        Sets up the test environment by loading the model from a temporary directory.
+        """
+        self.directory = tempfile.mkdtemp()
+        model_csv = os.path.join(self.directory, 'model.csv')
+        with open(model_csv, 'w') as model_file:
+            model_file.write(_MODEL)
+        self.features, self.model = _get_model_info(model_csv)
+
+    def tearDown(self):
+        """
+        Removes the temporary directory.
+        """
+        shutil.rmtree(self.directory)
+
+    def test_posterior_prob(self):
+        """
+        Tests the posterior probabilities of a single patient and of a batch of patients.
+        """
+        self.assertAlmostEqual(_compute_posterior_prob(self.features, self.model, 0.2, {'fever': '1'}),
+                               0.85 * 0.2 / (0.85 * 0.2 + 0.2 * 0.8))
+        self.assertAlmostEqual(_compute_posterior_prob(self.features, self.model, 0.2, {'fever': '0', 'spots': '1'}),
+                               0.1 * 0.2 / (0.1 * 0.2 + 0.35 * 0.8))
+        post_ps = _compute_posterior_probs(self.features, self.model, [{'fever': '1'}, {'fever': '0', 'spots': '1'}],
+                                           0.2)
+        self.assertAlmostEqual(post_ps[0], _compute_posterior_prob(self.features, self.model, 0.2, {'fever': '1'}))
+        self.assertAlmostEqual(post_ps[1], _compute_posterior_prob(self.features, self.model, 0.2,
+                                                                   {'fever': '0', 'spots': '1'}))
+
+    def test_invalid_values(self):
+        """
+        Tests that the values other than 0 and 1 raise ValueError, rather than wrapping around the model.
+        """
+        for value in ('-1', '2', 'x'):
+            self.assertRaises(ValueError, _compute_posterior_prob, self.features, self.model, 0.2, {'fever': value})
+            self.assertRaises(ValueError, _compute_posterior_probs, self.features, self.model,
+                              [{'fever': '1'}, {'fever': value}], 0.2)
+
+    def test_invalid_priors(self):
+        """
+        Tests that the prior probabilities out of [0, 1] raise ValueError, rather than giving a meaningless result.
+        """
+        for prior in (-0.1, 1.5, float('nan')):
+            self.assertRaises(ValueError, _compute_posterior_prob, self.features, self.model, prior, {'fever': '1'})
+            self.assertRaises(ValueError, _compute_posterior_probs, self.features, self.model,
+                              [{'fever': '1'}, {'fever': '0'}], [0.2, prior])
+            self.assertRaises(ValueError, _compute_posterior_probs, self.features, self.model,
+                              [{'fever': '1'}, {'fever': '0'}], prior)
+        self.assertAlmostEqual(_compute_posterior_prob(self.features, self.model, 1.0, {'fever': '1'}), 1.0)
+
+    def test_zero_evidence(self):
+        """
+        Tests that observing features which have a zero probability raises ValueError, rather than giving NaN.
+        """
+        self.assertRaises(ValueError, _compute_posterior_prob, self.features, self.model, 0.0,
+                          {'fever': '1', 'spots': '1'})
+        self.assertRaises(ValueError, _compute_posterior_probs, self.features, self.model,
+                          [{'fever': '1'}, {'fever': '1', 'spots': '1'}], [0.2, 0.0])
+        self.assertAlmostEqual(_compute_posterior_prob(self.features, self.model, 0.2, {'fever': '1', 'spots': '1'}),
+                               1.0)
+
+    def test_binary_model(self):
+        """
+        Tests that the binary model gives the same features and the same posterior probabilities as the csv file.
+        """
+        model_bin = os.path.join(self.directory, 'model.bin')
+        _save_binary_model(self.features, self.model, model_bin)
+        features, model = _get_model_info(model_bin)
+        self.assertEqual(features, self.features)
+        observations = [{'fever': '1'}, {'spots': '0'}, {'fever': '0', 'spots': '1'}, {'fever': '1', 'spots': '1'}]
+        for args in observations:
+            self.assertEqual(_compute_posterior_prob(features, model, 0.2, args),
+                             _compute_posterior_prob(self.features, self.model, 0.2, args))
+        self.assertEqual(_compute_posterior_probs(features, model, observations, 0.2).tolist(),
+                         _compute_posterior_probs(self.features, self.model, observations, 0.2).tolist())
+
+    def test_invalid_binary_models(self):
+        """
+        Tests that the truncated, extended or foreign binary models raise ValueError.
+        """
+        model_bin = os.path.join(self.directory, 'model.bin')
+        _save_binary_model(self.features, self.model, model_bin)
+        with open(model_bin, 'rb') as binfile:
+            data = binfile.read()
+        for invalid in (data[:6], data[:20], data[:-1], data + '\0' * 8, 'RPN1' + data[4:]):
+            with open(model_bin, 'wb') as binfile:
+                binfile.write(invalid)
+            self.assertRaises(ValueError, _load_binary_model, model_bin)
+            if invalid.startswith('MDX1'):  # Otherwise the file is read as a csv file
+                self.assertRaises(ValueError, _get_model_info, model_bin)
+
+    def test_marginals_cache(self):
+        """
+        Tests that the cache of marginals evicts the least recently used marginal model once it is full, while the
+        marginal models recently used are kept.
+        """
+        model = np.random.random((2,) * 9)  # 8 features besides measles, i.e. 256 sets of observed features
+        observed = list(itertools.product((False, True), repeat=8))[:_MARGINALS_CACHE_SIZE + 1]
+        marginals = collections.OrderedDict()
+        for key in observed[:_MARGINALS_CACHE_SIZE]:
+            _get_marginal(model, key, marginals)
+        first = marginals[observed[0]]
+        self.assertIs(_get_marginal(model, observed[0], marginals), first)  # The first marginal model is used again
+        _get_marginal(model, observed[-1], marginals)  # The cache is full
+        self.assertEqual(len(marginals), _MARGINALS_CACHE_SIZE)
+        self.assertNotIn(observed[1], marginals)  # The least recently used marginal model is evicted...
+        self.assertIs(marginals[observed[0]], first)  # ... while the one used again is kept
+        self.assertIn(observed[-1], marginals)
+        self.assertTrue(np.allclose(_get_marginal(model, observed[1], marginals),
+                                    model.sum(axis=tuple(idx + 1 for idx, value in enumerate(observed[1])
+                                                         if not value))))
+
+
+class DiagnosisServerTest(unittest.TestCase):
+    """
+    Provides tests for the _DiagnosisServer.
+    """
+
+    FEATURES = 10  # defines the number of features of the model, so that it has many more marginals than the cache
+    CLIENTS = 8  # defines the number of clients querying the server at once
+    QUERIES = 200  # defines the number of queries sent by each client
+
+    def setUp(self):
+        """
+        Sets up the test environment by writing a random model into a temporary directory and
+        by running the server on a socket of the same directory.
+        """
+        self.directory = tempfile.mkdtemp()
+        self.model_csv = os.path.join(self.directory, 'model.csv')
+        self.socket_path = os.path.join(self.directory, 'server.sock')
+        self._write_model()
+        self.server = _DiagnosisServer(self.socket_path, self.model_csv, 0.2)
+        self.check_interval = sys.getcheckinterval()
+        sys.setcheckinterval(1)  # Switches among the threads as often as possible, so that any race shows up
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+
+    def tearDown(self):
+        """
+        Stops the server and removes the temporary directory.
+        """
+        sys.setcheckinterval(self.check_interval)
+        self.server.shutdown()
+        self.server_thread.join()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def _write_model(self):
+        """
+        Writes a random model with the given number of features into the model file.
+        """
+        header = 'Measles,%s,Probability' % ','.join('F%d' % f for f in xrange(1, self.FEATURES))
+        rows = ['%s,%s' % (','.join(bin(value)[2:].zfill(self.FEATURES)), random.random())
+                for value in xrange(2 ** self.FEATURES)]
+        with open(self.model_csv, 'w') as model_file:
+            model_file.write('\n'.join([header] + rows) + '\n')
+
+    def _query(self, queries, answers):
+        """
+        Sends some queries through a new connection to the server and collects the answers.
+
+        :param queries: the list of the query lines
+        :param answers: the list where the answers are appended
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket_path)
+        sock_file = sock.makefile('rw', 0)
+        try:
+            for query in queries:
+                sock_file.write(query + '\n')
+                answers.append(sock_file.readline().strip())
+        finally:
+            sock_file.close()
+            sock.close()
+
+    def test_concurrent_queries(self):
+        """
+        Tests that many clients querying many different sets of features at once all get the right answers,
+        while the cache of marginals keeps its size.
+        """
+        features, model = _get_model_info(self.model_csv)
+        queries = []
+        for _ in xrange(self.CLIENTS):
+            queries.append([])
+            for _ in xrange(self.QUERIES):
+                args = dict((f, random.choice([None, '0', '1'])) for f in features[1:])
+                queries[-1].append(' '.join('%s=%s' % (f, value) for f, value in args.iteritems() if value) or 'f1=1')
+        answers = [[] for _ in xrange(self.CLIENTS)]
+        clients = [threading.Thread(target=self._query, args=(queries[i], answers[i])) for i in xrange(self.CLIENTS)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        for client_queries, client_answers in zip(queries, answers):
+            self.assertEqual(len(client_answers), len(client_queries))
+            for query, answer in zip(client_queries, client_answers):
+                args = dict(token.split('=') for token in query.split())
+                self.assertAlmostEqual(float(answer), _compute_posterior_prob(features, model, 0.2, args))
+        marginals = self.server.state[2]
+        self.assertLessEqual(len(marginals), _MARGINALS_CACHE_SIZE)
+        self.assertEqual(len(list(marginals.iterkeys())), len(marginals))  # The linked list holds every entry
+
+    def test_invalid_queries(self):
+        """
+        Tests that the invalid queries, including the ones naming the parameters of the computation, are answered
+        with an error or ignored, while the connection goes on.
+        """
+        features, model = _get_model_info(self.model_csv)
+        answers = []
+        self._query(['features=1 f1=1', 'model=0 f1=1', 'marginals=1 f1=1', 'f1', 'f1=2', 'f1=1 prior=2',
+                     'f1=1'], answers)
+        expected = _compute_posterior_prob(features, model, 0.2, {'f1': '1'})
+        for answer in answers[:3]:  # The unknown features are not observed
+            self.assertAlmostEqual(float(answer), expected)
+        for answer in answers[3:6]:
+            self.assertTrue(answer.startswith('ERROR: Invalid query'))
+        self.assertAlmostEqual(float(answers[6]), expected)
+
+    def test_model_reload(self):
+        """
+        Tests that the model is loaded again as soon as its file is modified.
+        """
+        answers = []
+        self._query(['f1=1'], answers)
+        mtime = os.stat(self.model_csv).st_mtime
+        self._write_model()
+        os.utime(self.model_csv, (mtime + 10, mtime + 10))  # Whatever the resolution of the modification times
+        features, model = _get_model_info(self.model_csv)
+        self._query(['f1=1'], answers)
+        self.assertAlmostEqual(float(answers[1]), _compute_posterior_prob(features, model, 0.2, {'f1': '1'}))
+        self.assertNotAlmostEqual(float(answers[0]), float(answers[1]))
+
+    def test_socket_file(self):
+        """
+        Tests that a stale socket file is replaced, while any other kind of file is never removed.
+        """
+        self.server.shutdown()
+        self.server_thread.join()
+        self.server.server_close()
+        self.assertFalse(os.path.exists(self.socket_path))
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(self.socket_path)  # Leaves a socket file behind, as a crashed server does
+        stale.close()
+        self.server = _DiagnosisServer(self.socket_path, self.model_csv, 0.2)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.start()
+        self._query(['f1=1'], [])
+        regular_path = os.path.join(self.directory, 'regular.txt')
+        with open(regular_path, 'w') as regular_file:
+            regular_file.write('data')
+        self.assertRaises(OSError, _DiagnosisServer, regular_path, self.model_csv, 0.2)
+        self.assertRaises(OSError, _DiagnosisServer, self.directory, self.model_csv, 0.2)
+        with open(regular_path) as regular_file:
+            self.assertEqual(regular_file.read(), 'data')
+
+
+if __name__ == '__main__':
+    """The entry point of the program. It simply runs the test cases.
+    """
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+Created on 17/10/2026
+
+@author: gioia
+
+The script benchmarks the rate solvers of the repayment calculator: the previous solver, i.e. a call of
+scipy.optimize.newton for each quote, against the vectorized Newton-Raphson solver running on all the quotes at once.
+
+For each requested size, the script generates a random market and as many random quotes on it, then it measures:
+* the time needed by the scalar solver, i.e. scipy.optimize.newton called on nr_input_f for each quote;
+* the time needed by the vectorized solver, i.e. _solve_rates called on the arrays of all the quotes.
+The rounded rates given by the two solvers are also checked to be the same.
+
+The programming language used is Python 2.7 and it is assumed you have it installed into your PC together with
+NumPy (http://www.numpy.org/) and SciPy (http://www.scipy.org/). The operating system of reference is Unix-based
+(Linux/Max OS-X). There are two basic ways to execute this script in Unix:
+1 - launching it by the command shell through the python command
+2 - making it executable first and then launching it by the command shell
+
+Enjoy!
+"""
+import time
+import random
+import argparse
+import numpy as np
+import scipy.optimize as opt
+
+import repayment_calculator as rc
+
+_LENDERS = 1000  # Defines the number of lenders of the generated markets
+
+
+def _generate(quotes):
+    """
+    Generates a random market and some random valid quotes on it.
+
+    :param quotes: the number of quotes
+    :return: the pair (order_book, loan_amounts) as a tuple
+    """
+    rates_cache = {}
+    for _ in xrange(_LENDERS):
+        rate = random.randint(40, 120) / 1000.0
+        rates_cache[rate] = rates_cache.get(rate, 0) + random.randint(1, 100) * 10
+    loan_amounts = [random.randint(rc._MIN_LOAN_AMOUNT // rc._LOAN_INCREMENT,
+                                   rc._MAX_LOAN_AMOUNT // rc._LOAN_INCREMENT) * rc._LOAN_INCREMENT
+                    for _ in xrange(quotes)]
+    return rc._get_order_book(rates_cache), loan_amounts
+
+def _timed(function, *args):
+    """
+    Calls a function and measures the time it needs.
+
+    :param function: the function at issue
+    :param args: the arguments of the function
+    :return: the pair (result, elapsed time in seconds) as a tuple
+    """
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+def _solve_scalar(loans, monthly_repays, initial_rates):
+    """
+    Solves the rates one quote at a time, as the previous solver did.
+
+    :param loans: the array of the requested loan amounts
+    :param monthly_repays: the array of the computed monthly repayments
+    :param initial_rates: the array of the rates used as initial points of the method
+    :return: the array of the solved rates
+    """
+    return np.array([opt.newton(rc.nr_input_f, initial_rate, args=(loan, monthly_repay))
+                     for loan, monthly_repay, initial_rate in zip(loans, monthly_repays, initial_rates)])
+
+def main():
+    """
+    The main function of the program. It benchmarks both the solvers for each size.
+    """
+    parser = argparse.ArgumentParser(description='Benchmarks the scalar and vectorized rate solvers.')
+    parser.add_argument('-quotes', help='the numbers of quotes', nargs='+', type=int, default=[10000, 100000])
+    parser.add_argument('-seed', help='the seed of the random markets and quotes', type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    print '{:>8} {:>10} {:>14} {:>14} {:>17} {:>8}'.format('quotes', 'scalar s', 'scalar us/q', 'vectorized s',
+                                                           'vectorized us/q', 'speedup')
+    for quotes in args.quotes:
+        order_book, loan_amounts = _generate(quotes)
+        # Computes the inputs of the solvers as _get_batch_repayments does
+        loans = np.asarray(loan_amounts, dtype=float)
+        rates_idx = np.searchsorted(order_book.cum_amounts, loans, side='left')
+        cum_amounts = np.concatenate(([0.0], order_book.cum_amounts))
+        cum_monthly_repays = np.concatenate(([0.0], order_book.cum_monthly_repays))
+        monthly_repays = cum_monthly_repays[rates_idx] + rc._get_monthly_repay(
+            np.asarray(order_book.rates)[rates_idx], loans - cum_amounts[rates_idx])
+        avg_rates = np.asarray(order_book.cum_rates)[rates_idx] / (rates_idx + 1.0)
+        scalar, scalar_time = _timed(_solve_scalar, loans, monthly_repays, avg_rates)
+        vectorized, vectorized_time = _timed(rc._solve_rates, loans, monthly_repays, avg_rates)
+        if ['%.1f' % rate for rate in scalar * 100] != ['%.1f' % rate for rate in vectorized * 100]:
+            raise RuntimeError('The rounded rates do not match')
+        print '{:>8} {:>10.3f} {:>14.2f} {:>14.4f} {:>17.3f} {:>7.1f}x'.format(
+            quotes, scalar_time, scalar_time / quotes * 1e6, vectorized_time, vectorized_time / quotes * 1e6,
+            scalar_time / vectorized_time)
+
+
+if __name__ == '__main__':
+    """The entry point of the program. It simply calls the main function.
+    """
+    main()
@@ -18,8 +18,11 @@ Output:
 * the monthly repayment amount
 * the total repayment amount
 
+Many loan amounts may also be quoted at once against the same market file through the -batch option: the amounts are
+read from a file (or from the standard input) and a csv row with the quote of each amount is written in the same order.
+
 The programming language used is Python 2.7 and it is assumed you have it installed into your PC together with
-SciPy (http://www.scipy.org/). The operating system of reference is Unix-based (Linux/Max OS-X). There are two basic
+NumPy (http://www.numpy.org/). The operating system of reference is Unix-based (Linux/Max OS-X). There are two basic
 ways to execute this script in Unix:
 1 - launching it by the command shell through the python command
 2 - making it executable first and then launching it by the command shell
@@ -27,10 +30,13 @@ ways to execute this script in Unix:
 Enjoy!
 """
 import csv
-import math
+import sys
+import bisect
 import locale
 import argparse
-import scipy.optimize as opt
+import itertools
+import collections
+import numpy as np
 
 _CSV_DELIMITER = ','                # Defines the expected delimiter of the input market file
 _YEARS = 3                          # Defines the years of duration of the loan
@@ -39,23 +45,36 @@ _LOAD_DURATION = _MONTHS * _YEARS   # Defines the loan duration
 _MIN_LOAN_AMOUNT = 1000             # Defines the minimum accepted loan amount
 _MAX_LOAN_AMOUNT = 15000            # Defines the maximum accepted loan amount
 _LOAN_INCREMENT = 100               # Defines the accepted loan increment
+_BATCH_SIZE = 10000                 # Defines how many loan amounts of a batch are read and quoted together
+_NEWTON_TOL = 1.48e-8               # Defines the tolerance of the rates solved by the Newton-Raphson method
+_NEWTON_MAX_ITER = 50               # Defines the maximum number of iterations of the Newton-Raphson method
+
+# Defines the order book of the lenders: the available rates sorted in ascending order and, for each of them, the
+# cumulative sums (up to the rate included) of the available amounts, of their monthly repayments and of the rates
+OrderBook = collections.namedtuple('OrderBook', ['rates', 'cum_amounts', 'cum_monthly_repays', 'cum_rates'])
 
 
 def _get_input():
     """
     Gets the input parameters.
 
-    :return: the pair (market_file, loan_about) as a tuple
+    :return: the triple (market_file, loan_amount, batch_file) as a tuple
     """
     parser = argparse.ArgumentParser(description='The rate calculation system allows borrowers to obtain a quote.')
     parser.add_argument('market_file', metavar='market_file', type=str, help='the full path to the market csv file')
-    parser.add_argument('loan_amount', metavar='loan_amount', type=float, help='the requested loan amount')
+    parser.add_argument('loan_amount', metavar='loan_amount', type=float, nargs='?',
+                        help='the requested loan amount (mandatory, unless a batch file is given)')
+    parser.add_argument('-batch', metavar='batch_file', type=str,
+                        help='the file of many requested loan amounts, separated by whitespaces, quoted at once '
+                             '(use - for the standard input)')
     args = parser.parse_args()
-    return args.market_file, args.loan_amount
+    if (args.loan_amount is None) == (args.batch is None):
+        parser.error('either a loan amount or a batch file should be given')
+    return args.market_file, args.loan_amount, args.batch
 
 def _is_loan_request_valid(loan_amount):
     """
-    Checks whether the input loan is valid.
+    Checks whether the input loan is valid. The check also works element-wise on a NumPy array of loans.
 
     :param loan_amount: the requested loan amount
     :return: True if the input loan is valid, False otherwise
@@ -65,7 +84,7 @@ def _is_loan_request_valid(loan_amount):
     is_lesser_than_max = loan_amount <= _MAX_LOAN_AMOUNT
     # Checks if the loan amount has an "accepted increment"
     is_a_multiple = loan_amount % 100 == 0
-    return is_greater_than_min and is_lesser_than_max and is_a_multiple
+    return is_greater_than_min & is_lesser_than_max & is_a_multiple
 
 def _get_rates_cache(market_file):
     """
@@ -86,75 +105,208 @@ def _get_rates_cache(market_file):
             rates_cache[rate] = rates_cache.get(rate, 0) + lent_amount
     return rates_cache
 
-def _can_be_quoted(loan_amount, lent_amounts):
+def _get_order_book(rates_cache):
+    """
+    Builds the order book of the lenders once, so that any number of quotes can then be computed on it
+    without sorting nor scanning the rates again.
+
+    :param rates_cache: the computed hash map of (rate, amount) pairs
+    :return: the OrderBook of the available rates
+    """
+    order_book = OrderBook([], [], [], [])
+    cum_amount = cum_monthly_repay = cum_rate = 0.0
+    for rate in sorted(rates_cache):
+        lent_amount = rates_cache[rate]
+        cum_amount += lent_amount
+        cum_monthly_repay += _get_monthly_repay(rate, lent_amount)
+        cum_rate += rate
+        order_book.rates.append(rate)
+        order_book.cum_amounts.append(cum_amount)
+        order_book.cum_monthly_repays.append(cum_monthly_repay)
+        order_book.cum_rates.append(cum_rate)
+    return order_book
+
+def _can_be_quoted(loan_amount, order_book):
     """
     Checks if the borrower can obtain a quote. To this aim, the loan amount should be less than or
-    equal to the total amounts given by lenders.
+    equal to the total amounts given by lenders. The check also works element-wise on a NumPy array of loans.
 
     :param loan_amount: the requested loan amount
-    :param lent_amounts: the sum of the amounts given by lenders
+    :param order_book: the OrderBook of the available rates
     :return: True if the borrower can get a quote, False otherwise
     """
-    return sum(lent_amounts) - loan_amount >= 0;
+    return bool(order_book.cum_amounts) and order_book.cum_amounts[-1] - loan_amount >= 0
 
 def _get_monthly_repay(rate, loan):
     """
-    Gets the monthly repayment by computing the compound interest.
+    Gets the monthly repayment by computing the compound interest. The repayment is also computed element-wise
+    on NumPy arrays of rates and loans.
 
     :param rate: the nominal rate
     :param loan: the loan that should be returned
     :return: the monthly repayment for the given rate and loan
     """
-    monthly_rate = math.pow(1 + rate, 1 / float(_MONTHS)) - 1
-    return (loan * monthly_rate) / (1 - (1 / float(math.pow(1 + monthly_rate, _LOAD_DURATION))))
+    monthly_rate = (1 + rate) ** (1 / float(_MONTHS)) - 1
+    return (loan * monthly_rate) / (1 - (1 / ((1 + monthly_rate) ** float(_LOAD_DURATION))))
 
 def nr_input_f(rate, loan, monthly_rate):
     """
     Function used to compute the interest from the monthly rate using the Newton-Raphson method.
 
-    :param rate: the rate that should be used as initial point of the secant method
+    :param rate: the rate that should be used as initial point of the Newton-Raphson method
     :param loan: the requested loan amount
     :param monthly_rate: the computed monthly rate
-    :return: the input equation of the secant method
+    :return: the input equation of the Newton-Raphson method
     """
     return monthly_rate - _get_monthly_repay(rate, loan)
 
-def _get_repayments(loan_amount, rates_cache):
+def _get_monthly_repay_derivative(rate, loan):
+    """
+    Gets the derivative of the monthly repayment with respect to the nominal rate, i.e. the derivative of
+    _get_monthly_repay computed analytically by the chain rule through the monthly rate. The derivative is
+    also computed element-wise on NumPy arrays of rates and loans.
+
+    :param rate: the nominal rate
+    :param loan: the loan that should be returned
+    :return: the derivative of the monthly repayment for the given rate and loan
+    """
+    monthly_rate = (1 + rate) ** (1 / float(_MONTHS)) - 1
+    d_monthly_rate = (1 + rate) ** (1 / float(_MONTHS) - 1) / _MONTHS
+    discount = 1 - (1 + monthly_rate) ** -float(_LOAD_DURATION)
+    d_discount = _LOAD_DURATION * (1 + monthly_rate) ** (-float(_LOAD_DURATION) - 1)
+    return loan * (discount - monthly_rate * d_discount) / (discount * discount) * d_monthly_rate
+
+def _solve_rates(loans, monthly_repays, initial_rates):
+    """
+    Solves the rates of many quotes at once by the Newton-Raphson method, i.e. finds for each quote the
+    rate at which the loan has the given monthly repayment (the root of nr_input_f). The iterations run
+    on NumPy arrays and stop for each quote as soon as its step is within _NEWTON_TOL.
+
+    :param loans: the array of the requested loan amounts
+    :param monthly_repays: the array of the computed monthly repayments
+    :param initial_rates: the array of the rates used as initial points of the method
+    :return: the array of the solved rates
+    """
+    loans = np.asarray(loans, dtype=float)
+    monthly_repays = np.asarray(monthly_repays, dtype=float)
+    rates = np.array(initial_rates, dtype=float)
+    active = np.arange(len(rates))  # The indexes of the quotes not converged yet
+    for _ in xrange(_NEWTON_MAX_ITER):
+        if not len(active):
+            return rates
+        active_rates, active_loans = rates[active], loans[active]
+        steps = (nr_input_f(active_rates, active_loans, monthly_repays[active]) /
+                 _get_monthly_repay_derivative(active_rates, active_loans))
+        rates[active] = active_rates + steps
+        active = active[~(np.abs(steps) <= _NEWTON_TOL)]  # Keeps iterating on the diverging (NaN) steps too
+    raise RuntimeError('Failed to converge after %d iterations' % _NEWTON_MAX_ITER)
+
+def _get_repayments(loan_amount, order_book):
     """
     Gets the repayment information by computing the compound interest for the loan. Following a greedy approach,
-    the available rates are first ordered. Then, the monthly rate is computed starting from the more convenient
-    rates till the less convenient ones.
+    the loan is borrowed starting from the more convenient rates till the less convenient ones: the last rate
+    needed is found by a binary search over the cumulative amounts of the order book, so that the whole amounts
+    lent at the previous rates are repaid by their cumulative monthly repayment and only the remaining part of
+    the loan is computed at the last rate.
 
     :param loan_amount: the requested loan amount
-    :param rates_cache: the computed hash map of (rate, amount) pairs
+    :param order_book: the OrderBook of the available rates
     :return: the repayment information as a tuple (rate, monthly_repay, total_repay)
     """
-    rates = rates_cache.keys()
-    rates.sort()  # Sorts the collected rates
-
-    rates_idx = 0
-    sum_rates = 0.0
-    total_repay = 0.0
-    monthly_repay = 0.0
-    to_borrow = loan_amount
-    while (to_borrow > 0) and (rates_idx < len(rates)):
-        rate = rates[rates_idx]
-        lent_amount = rates_cache[rate]
-        if to_borrow >= lent_amount:  # if the current lent amount is less then the amount needed...
-            to_borrow -= lent_amount
-            monthly_repay += _get_monthly_repay(rate, lent_amount)
-        else:  # ...else
-            monthly_repay += _get_monthly_repay(rate, to_borrow)
-            to_borrow = 0
-        sum_rates += rate
-        rates_idx += 1
+    rates_idx = bisect.bisect_left(order_book.cum_amounts, loan_amount)  # The index of the last rate needed
+    if rates_idx > 0:
+        to_borrow = loan_amount - order_book.cum_amounts[rates_idx - 1]
+        monthly_repay = order_book.cum_monthly_repays[rates_idx - 1]
+    else:
+        to_borrow = loan_amount
+        monthly_repay = 0.0
+    monthly_repay += _get_monthly_repay(order_book.rates[rates_idx], to_borrow)
     # Computes the total repayment from the monthly repayment
-    total_repay += monthly_repay * _LOAD_DURATION
-    # Computes the average rate to feed it as initial point of the secant method
-    avg_rate = sum_rates / float(rates_idx)
-    rate = opt.newton(nr_input_f, avg_rate, args=(loan_amount, monthly_repay)) * 100
+    total_repay = monthly_repay * _LOAD_DURATION
+    # Computes the average rate to feed it as initial point of the Newton-Raphson method
+    avg_rate = order_book.cum_rates[rates_idx] / float(rates_idx + 1)
+    rate = float(_solve_rates([loan_amount], [monthly_repay], [avg_rate])[0]) * 100
     return rate, monthly_repay, total_repay
 
+def _get_batch_repayments(loan_amounts, order_book):
+    """
+    Gets the repayment information of many loans at once, sharing the same order book. The loans are
+    validated and quoted as NumPy arrays: the last rate needed by each loan is found by a single sorted
+    search over the cumulative amounts, then the monthly and total repayments are computed element-wise
+    as in _get_repayments. Finally, the rates of all the quotes are solved together by _solve_rates.
+
+    :param loan_amounts: the sequence of the requested loan amounts
+    :param order_book: the OrderBook of the available rates
+    :return: the repayment information as a tuple (valid, quoted, rates, monthly_repays, total_repays) of
+             arrays, where valid tells the valid requests, quoted tells the requests which got a quote and
+             the other arrays hold NaN for the requests which did not get one
+    """
+    loan_amounts = np.asarray(loan_amounts, dtype=float)
+    with np.errstate(invalid='ignore'):  # The amounts which are not numbers (NaN) are just invalid
+        valid = _is_loan_request_valid(loan_amounts)
+        quoted = valid & _can_be_quoted(loan_amounts, order_book)
+    rates, monthly_repays = np.full((2, len(loan_amounts)), np.nan)
+    loans = loan_amounts[quoted]
+    rates_idx = np.searchsorted(order_book.cum_amounts, loans, side='left')  # The indexes of the last rates needed
+    # Prepends the empty sums, i.e. the sums before the first rate
+    cum_amounts = np.concatenate(([0.0], order_book.cum_amounts))
+    cum_monthly_repays = np.concatenate(([0.0], order_book.cum_monthly_repays))
+    to_borrow = loans - cum_amounts[rates_idx]
+    monthly_repays[quoted] = cum_monthly_repays[rates_idx] + _get_monthly_repay(
+        np.asarray(order_book.rates)[rates_idx], to_borrow)
+    avg_rates = np.asarray(order_book.cum_rates)[rates_idx] / (rates_idx + 1.0)
+    rates[quoted] = _solve_rates(loans, monthly_repays[quoted], avg_rates) * 100
+    return valid, quoted, rates, monthly_repays, monthly_repays * _LOAD_DURATION
+
+def _parse_loan_amount(token):
+    """
+    Parses a loan amount of a batch.
+
+    :param token: the loan amount as a string
+    :return: the loan amount, or NaN if it is not a number, so that it is reported as an invalid request
+    """
+    try:
+        return float(token)
+    except ValueError:
+        return float('nan')
+
+def _read_loan_amounts(batch_file):
+    """
+    Reads the loan amounts of a batch lazily, so that the batch file may also be a stream.
+
+    :param batch_file: the file of the loan amounts, separated by whitespaces
+    :return: the generator of the lists of at most _BATCH_SIZE loan amounts
+    """
+    tokens = (token for line in batch_file for token in line.split())
+    loan_amounts = itertools.imap(_parse_loan_amount, tokens)
+    while True:
+        chunk = list(itertools.islice(loan_amounts, _BATCH_SIZE))
+        if not chunk:
+            return
+        yield chunk
+
+def _display_batch_results(loan_amounts, valid, quoted, rates, monthly_repays, total_repays):
+    """
+    Displays the repayment results of a batch as csv rows, one for each loan amount, with the right rounding.
+    The status column tells whether the request was quoted (ok), was invalid (invalid) or could not be quoted
+    (unavailable).
+
+    :param loan_amounts: the requested loan amounts
+    :param valid: the array telling the valid requests
+    :param quoted: the array telling the requests which got a quote
+    :param rates: the array of the computed loan rates
+    :param monthly_repays: the array of the computed monthly repayments
+    :param total_repays: the array of the computed total repayments
+    """
+    rows = []
+    for row in itertools.izip(loan_amounts, valid, quoted, rates, monthly_repays, total_repays):
+        loan_amount, is_valid, is_quoted, rate, monthly_repay, total_repay = row
+        if is_quoted:
+            rows.append('{:.2f},ok,{:.1f},{:.2f},{:.2f}\n'.format(loan_amount, rate, monthly_repay, total_repay))
+        else:
+            rows.append('{:.2f},{},,,\n'.format(loan_amount, 'unavailable' if is_valid else 'invalid'))
+    sys.stdout.write(''.join(rows))
+
 def _display_results(loan_amount, rate, monthly_repay, total_repay):
     """
     Simply displays the repayment results with the right rounding.
@@ -174,14 +326,26 @@ def main():
     The main function of the program. First, the input parameters are collected and validated.
     Then the repayments information are computed and returned.
     """
+    market_file, loan_amount, batch_file = _get_input()  # Collects the inputs
+    if batch_file is not None:  # Quotes all the loans of the batch against the same order book
+        order_book = _get_order_book(_get_rates_cache(market_file))
+        infile = sys.stdin if batch_file == '-' else open(batch_file, 'r')
+        try:
+            print 'amount,status,rate,monthly_repayment,total_repayment'
+            for loan_amounts in _read_loan_amounts(infile):
+                results = _get_batch_repayments(loan_amounts, order_book)
+                _display_batch_results(loan_amounts, *results)
+        finally:
+            infile.close()
+        return
     locale.setlocale(locale.LC_ALL, 'en_gb') # Changes the locale settings to deal with pounds
-    market_file, loan_amount = _get_input()  # Collects the inputs
     valid_request = _is_loan_request_valid(loan_amount)  # Validates the loan amount
     if valid_request: # If the request is valid...
         rates_cache = _get_rates_cache(market_file)  # Computes the hash map of the available rates/amounts
-        quote_available = _can_be_quoted(loan_amount, rates_cache.values())  # Checks if a quote is available...
+        order_book = _get_order_book(rates_cache)  # Sorts the rates and computes their cumulative sums
+        quote_available = _can_be_quoted(loan_amount, order_book)  # Checks if a quote is available...
         if quote_available:  # If it is...
-            rate, monthly_repay, total_repay = _get_repayments(loan_amount, rates_cache)  # Gets repayments information
+            rate, monthly_repay, total_repay = _get_repayments(loan_amount, order_book)  # Gets repayments information
             _display_results(loan_amount, rate, monthly_repay, total_repay)  # Displays the results
         else:  # ... else returns an error message
             print 'We''re very sorry but it''s not possible to provide a quote at this time.'
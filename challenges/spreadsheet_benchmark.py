@@ -0,0 +1,120 @@
+"""
+Created on 17/10/2026
+
+@author: gioia
+
+The script benchmarks the scalar evaluation of the spreadsheet calculator against its vectorized (level by level)
+evaluation.
+
+For each requested size, the script generates a random spreadsheet whose cells refer to the previous ones through
+a few expression shapes, then it measures:
+* the time needed to compile the spreadsheet;
+* the time needed to sort the cells topologically and the time needed by the scalar evaluation, i.e. the stack
+  machine run on each cell in that order;
+* the time needed to group the cells by depth and shape and the time needed by the vectorized evaluation, i.e. the
+  array operations run on each group.
+The speedup compares the end-to-end times of the two evaluations, i.e. sorting plus scalar evaluation against
+grouping plus vectorized evaluation, as both are run by Spreadsheet.
+
+The programming language used is Python 2.7 and it is assumed you have it installed into your PC together with
+NumPy (http://www.numpy.org/). The operating system of reference is Linux. There are two basic ways to execute this
+script in Linux:
+1 - launching it by the command shell through the python command
+2 - making it executable first and then launching it by the command shell
+
+Enjoy!
+"""
+import time
+import random
+import argparse
+
+import spreadsheet_calculator as sc
+
+_SHAPES = ['%(c)s',
+           '%(r)s %(c)s +',
+           '%(r)s %(s)s + 2 /',
+           '%(r)s %(c)s * %(c)s /',
+           '%(r)s ++',
+           '%(c)s %(r)s - %(s)s +']  # Defines the (bounded) shapes of the generated cells
+_WINDOW = 1000  # Defines how far back a generated cell may refer
+
+
+def _generate(rows, columns):
+    """This function generates a random spreadsheet whose cells only refer to the previous ones.
+
+       Args:
+           rows: the number of rows.
+           columns: the number of columns.
+       Returns:
+           the dictionary mapping each cell to its expression (as a list of tokens).
+    """
+    keys = ['%s%d' % (sc._get_row_label(r), c + 1) for r in xrange(rows) for c in xrange(columns)]
+    cells = {}
+    for i, key in enumerate(keys):
+        shape = random.choice(_SHAPES) if i else _SHAPES[0]
+        cells[key] = (shape % {'c': random.randint(1, 9),
+                               'r': keys[random.randint(max(0, i - _WINDOW), i - 1)] if i else '',
+                               's': keys[random.randint(max(0, i - _WINDOW), i - 1)] if i else ''}).split()
+    return cells
+
+
+def _timed(function, *args):
+    """This function calls a function and measures the time it needs.
+
+       Args:
+           function: the function at issue.
+           args: the arguments of the function.
+       Returns:
+           the (result, elapsed time in seconds) pair.
+    """
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+
+def _evaluate_scalar(sheet, order):
+    """This function evaluates the cells of a spreadsheet one by one through the stack machine.
+
+       Args:
+           sheet: the compiled Spreadsheet.
+           order: the list of the slots sorted topologically.
+       Returns:
+           the list of the resulting stacks, indexed by slot.
+    """
+    values = [None] * len(sheet.keys)
+    for slot in order:
+        values[slot] = sc._evaluate(sheet.programs[slot], values)
+    return values
+
+
+def main():
+    """The main function of the program. It benchmarks both the evaluations for each size.
+    """
+    parser = argparse.ArgumentParser(description='Benchmarks the scalar and vectorized spreadsheet evaluations.')
+    parser.add_argument('-columns', help='the numbers of columns of the 26-row spreadsheets', nargs='+', type=int,
+                        default=[400, 4000, 20000])
+    parser.add_argument('-seed', help='the seed of the random spreadsheets', type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    print '{:>8} {:>10} {:>10} {:>9} {:>8} {:>11} {:>9} {:>13} {:>8} {:>8}'.format(
+        'cells', 'compile s', 'sorting s', 'scalar s', 'total s', 'grouping s', 'groups', 'vectorized s', 'total s',
+        'speedup')
+    for columns in args.columns:
+        cells = _generate(26, columns)
+        sheet, compile_time = _timed(sc.Spreadsheet, cells)
+        order, sort_time = _timed(sc._sort_cells, sheet.dependencies)
+        scalar, scalar_time = _timed(_evaluate_scalar, sheet, order)
+        plan, plan_time = _timed(sc._plan_levels, sheet.programs, sheet.dependencies)
+        vectorized, vectorized_time = _timed(sc._evaluate_levels, plan, len(sheet.keys))
+        if [stack[0] for stack in scalar] != vectorized.tolist():
+            raise RuntimeError('The evaluations do not match')
+        scalar_total, vectorized_total = sort_time + scalar_time, plan_time + vectorized_time
+        print '{:>8} {:>10.3f} {:>10.3f} {:>9.3f} {:>8.3f} {:>11.3f} {:>9} {:>13.3f} {:>8.3f} {:>7.1f}x'.format(
+            len(cells), compile_time, sort_time, scalar_time, scalar_total, plan_time, len(plan), vectorized_time,
+            vectorized_total, scalar_total / vectorized_total)
+
+
+if __name__ == '__main__':
+    """The entry point of the program. It simply calls the main function.
+    """
+    main()
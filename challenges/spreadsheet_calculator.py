@@ -8,12 +8,28 @@ The script provides my solution to the challenge about implementing a basic spre
 Input:
 * The first line should contain two integers: n, m - where n is width of the spreadsheet while m is its height.
 * The next n*m lines should contain the content of the related spreadsheet cell. This content is an RPN expression,
-  which may contain references to other spreadsheet cells.
+  which may contain references to other spreadsheet cells. Rows are labelled A, B, ..., Z, AA, AB, ... while columns
+  are numbered from 1.
 
 Output:
 * The first line of the input as it was provided.
 * The next n*m lines contain the computed value for every spreadsheet cell.
 
+Besides the command line program, the Spreadsheet class keeps an evaluated spreadsheet in memory: setting a cell
+recomputes only the cells depending on it. When NumPy (http://www.numpy.org/) is installed, big spreadsheets may also
+be evaluated level by level: the cells at the same depth of the dependency graph sharing the same expression shape
+are computed together by array operations. Spreadsheets made of many independent parts (i.e. groups of cells which
+do not refer to each other) may instead be evaluated in parallel by a pool of processes.
+
+The command line program accepts the following options:
+* -vectorized: evaluates the spreadsheet level by level through NumPy;
+* -processes N: evaluates the independent parts of the spreadsheet on N processes;
+* -save PATH: writes a binary snapshot of the evaluated spreadsheet (see the SpreadsheetSnapshot class);
+* -load PATH CELL...: prints the values of the given cells from a snapshot, without evaluating anything.
+
+A snapshot is mapped into memory rather than read, so the values of a big spreadsheet can be queried straight away,
+and Spreadsheet.load rebuilds from it a spreadsheet which can be edited again.
+
 The programming language used is Python 2.7 and it is assumed you have it installed into your PC. The operating system
 of reference is Linux. There are two basic ways to execute this script in Linux:
 1 - launching it by the command shell through the python command
@@ -24,10 +40,15 @@ Enjoy!
 Started: Feb 8, at 12:20 CET time
 Finished: Feb 8, at 15:40 CET time
 """
-import re, sys, operator
+import gc, os, re, sys, mmap, array, struct, argparse, operator, itertools, collections, multiprocessing
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # The vectorized evaluation is not available
 
-_IS_NUM_REGEXP = '^-?[0-9]+\.?[0-9]*$'
-_IS_CELL_REGEXP = '^[A-Z][1-9]+$'
+_IS_NUM_REGEXP = re.compile('^-?[0-9]+\.?[0-9]*$')
+_IS_CELL_REGEXP = re.compile('^[A-Z]+[1-9][0-9]*$')
  
 operators = {'+': operator.add,
              '-': operator.sub,
@@ -37,82 +58,790 @@ operators = {'+': operator.add,
              '--': operator.isub
              }
     
-def _calc_basic(expression):
-    """This function actually computes the floating point value associated to a
-       RPN expression in stack order.
-       
+_PUSH, _LOAD, _BINARY, _UNARY = range(4)  # Defines the instruction codes of the compiled expressions
+_VECTOR_OPERATORS = {operator.iadd: operator.add,
+                     operator.isub: operator.sub}  # Avoids the in-place operators on arrays
+_PARTITIONS_PER_PROCESS = 4  # Defines how many partitions each process is given, to balance the load
+
+_OPERATOR_TOKENS = ('+', '-', '*', '/', '++', '--')  # Defines the codes of the operators into the snapshots
+_OPERATOR_CODES = dict((operators[token], code) for code, token in enumerate(_OPERATOR_TOKENS))
+_SNAPSHOT_MAGIC = 'RPN1'  # Defines the first bytes of the snapshots
+_SNAPSHOT_HEADER = struct.Struct('<4sIIIII')  # Defines the magic number and the sizes of the sections
+
+_parallel_state = None  # The (programs, shared values) pair inherited by the forked processes
+
+def _compile(expression, slots, constants=None):
+    """This function parses an expression once into a compact program, so that evaluating it again costs
+       no regular expression nor string work: number literals are converted to floats, cell references
+       are resolved to the slots of the cells and operators are resolved to their functions.
+
        Args:
-           expression: the expression which has to be evaluated.
+           expression: the expression (as a list of tokens) which has to be compiled.
+           slots: the dictionary mapping each cell (whose label matches _IS_CELL_REGEXP) to its slot.
+           constants: the dictionary caching the instructions of the tokens already compiled, other
+                      than the cell references, when many expressions are compiled together.
        Returns:
-           the stack containing the resulting value of the expression.
+           the tuple of the (code, argument) instructions of the program.
     """
-    stack = []
+    if constants is None:
+        constants = {}
+    program = []
     for token in expression:
-        if re.match(_IS_NUM_REGEXP, str(token)):
-            stack.append(float(token))
-        elif operators.get(token, False):
-            if len(token) < 2:
-                a = stack.pop()
+        slot = slots.get(token)
+        if slot is not None:
+            program.append((_LOAD, slot))
+            continue
+        instruction = constants.get(token)
+        if instruction is None:
+            if token in operators:
+                instruction = (_BINARY if len(token) < 2 else _UNARY, operators[token])
+            elif _IS_NUM_REGEXP.match(token):
+                instruction = (_PUSH, float(token))
             else:
-                a = 1
-            b = stack.pop()
-            op = operators[token]
-            stack.append(op(b,a))
+                raise ValueError('An invalid operand was found within the expression! Please check your input.')
+            constants[token] = instruction
+        program.append(instruction)
+    return tuple(program)
+
+def _get_references(program):
+    """This function collects the slots of the cells a compiled expression refers to.
+
+       Args:
+           program: the compiled expression.
+       Returns:
+           the set of the slots the expression refers to.
+    """
+    return {arg for code, arg in program if code == _LOAD}
+
+def _evaluate(program, values):
+    """This function actually computes the floating point value associated to a compiled
+       RPN expression in stack order. Each reference pushes the resulting stack of the referred cell.
+
+       Args:
+           program: the compiled expression which has to be evaluated.
+           values: the list of the resulting stacks of the cells, indexed by slot.
+       Returns:
+           the stack containing the resulting value of the expression.
+    """
+    stack = []
+    for code, arg in program:
+        if code == _PUSH:
+            stack.append(arg)
+        elif code == _LOAD:
+            stack.extend(values[arg])
+        elif code == _BINARY:
+            a = stack.pop()
+            stack.append(arg(stack.pop(), a))
         else:
-            sys.exit('An invalid operand was found within the expression! Please check your input.')
+            stack.append(arg(stack.pop(), 1))
     return stack
-    
-def _calc_one(spreadsheet, callers, expression):
-    """This function is called on every spreadsheet cell. It recursively compute the value of a cell.
-       If the value of a cell contains itself a reference to another cell, the recursion is activated
-       until a final value is obtained. The argument "callers" is updated each time in order to detect
-       cyclic dependencies.
-       
+
+def _sort_cells(dependencies, cells=None):
+    """This function sorts the cells of the dependency graph topologically (Kahn's algorithm), so that
+       every cell comes after the cells it refers to. A cyclic dependence leaves some cells unsorted.
+
        Args:
-           spreadsheet: the spreadsheet at issue.
-           callers: the set of keys which refer the current expression.
-           expression: the expression which has to be evaluated.
+           dependencies: the list of the sets of the slots each cell refers to, indexed by slot.
+           cells: the set of the slots to sort (all the cells by default); the references to the other
+                  cells are ignored.
        Returns:
-           the value computed for the input expression.
+           the list of the sorted slots.
     """
-    new_expression = []
-    for token in expression:
-        if re.match(_IS_CELL_REGEXP, str(token)):
-            if token in callers:
-                sys.exit('A cyclic dependence was found! Please check your input.')
-            callers.extend(token)
-            new_expression.extend(_calc_one(spreadsheet, callers, spreadsheet[token]))
+    if cells is None:
+        pending = [len(references) for references in dependencies]
+        dependents = [[] for _ in dependencies]
+        for slot, references in enumerate(dependencies):
+            for reference in references:
+                dependents[reference].append(slot)
+    else:
+        pending = {}
+        dependents = collections.defaultdict(list)
+        for slot in cells:
+            references = [reference for reference in dependencies[slot] if reference in cells]
+            pending[slot] = len(references)
+            for reference in references:
+                dependents[reference].append(slot)
+    order = [slot for slot in (xrange(len(pending)) if cells is None else cells) if not pending[slot]]
+    for slot in order:  # The cells appended meanwhile are visited too
+        for dependent in dependents[slot]:
+            pending[dependent] -= 1
+            if not pending[dependent]:
+                order.append(dependent)
+    if len(order) < len(pending):
+        raise ValueError('A cyclic dependence was found! Please check your input.')
+    return order
+
+def _get_levels(dependencies):
+    """This function computes the depth of each cell into the dependency graph through array operations:
+       the cells which refer to nothing are at depth 0, the others one level below the deepest cell they
+       refer to. The cells are visited depth by depth, as Kahn's algorithm does, without sorting them.
+
+       Args:
+           dependencies: the list of the sets of the slots each cell refers to, indexed by slot.
+       Returns:
+           the array of the depths of the cells, indexed by slot.
+       Raises:
+           ValueError: if a cyclic dependence is found.
+    """
+    size = len(dependencies)
+    pending = np.fromiter(itertools.imap(len, dependencies), dtype=np.intp, count=size)
+    references = np.fromiter(itertools.chain.from_iterable(dependencies), dtype=np.intp, count=pending.sum())
+    edges = np.argsort(references, kind='mergesort')
+    dependents = np.repeat(np.arange(size, dtype=np.intp), pending)[edges]  # grouped by the referred cell
+    starts = np.zeros(size + 1, dtype=np.intp)
+    np.cumsum(np.bincount(references, minlength=size), out=starts[1:])
+    levels = np.zeros(size, dtype=np.intp)
+    level = visited = 0
+    frontier = np.flatnonzero(pending == 0)
+    while frontier.size:
+        levels[frontier] = level
+        visited += frontier.size
+        lengths = starts[frontier + 1] - starts[frontier]
+        ends = np.cumsum(lengths)
+        reached, counts = np.unique(dependents[np.repeat(starts[frontier] - ends + lengths, lengths) +
+                                               np.arange(ends[-1])], return_counts=True)
+        pending[reached] -= counts
+        frontier = reached[pending[reached] == 0]
+        level += 1
+    if visited < size:
+        raise ValueError('A cyclic dependence was found! Please check your input.')
+    return levels
+
+def _plan_levels(programs, dependencies):
+    """This function groups the cells by depth into the dependency graph and by expression shape (i.e. the
+       sequence of instruction codes and operators), then packs the operands of each group into arrays:
+       the constants as floats and the references as slot indexes. The vectorized evaluation requires
+       every expression to result in a single value. Each shape is checked once, while the depths and the
+       groups are computed through array operations, so no topological sort of the cells is needed.
+
+       Args:
+           programs: the list of the compiled expressions, indexed by slot.
+           dependencies: the list of the sets of the slots each cell refers to, indexed by slot.
+       Returns:
+           the list of the (slots, codes, operands) groups sorted by depth, or None if the spreadsheet
+           cannot be evaluated level by level.
+       Raises:
+           ValueError: if a cyclic dependence is found.
+    """
+    if np is None:
+        return None
+    kinds = {}  # maps each expression shape to its index
+    shapes = []
+    for program in programs:
+        shape = tuple([code if code < _BINARY else arg for code, arg in program])
+        kind = kinds.get(shape)
+        if kind is None:
+            depth = 0
+            for code, _ in program:
+                if code == _PUSH or code == _LOAD:
+                    depth += 1
+                elif depth < (2 if code == _BINARY else 1):
+                    return None
+                elif code == _BINARY:
+                    depth -= 1
+            if depth != 1:
+                return None  # The resulting stack does not hold a single value
+            kind = kinds[shape] = len(kinds)
+        shapes.append(kind)
+    shapes = np.array(shapes, dtype=np.intp)
+    levels = _get_levels(dependencies)
+    order = np.lexsort((shapes, levels))
+    keys = np.concatenate(([-1], levels[order] * len(kinds) + shapes[order], [-1]))
+    bounds = np.flatnonzero(np.diff(keys))  # the first slot of each group, then the end of the last one
+    plan = []
+    for start, end in itertools.izip(bounds[:-1], bounds[1:]):
+        slots = order[start:end]
+        columns = zip(*[programs[slot] for slot in slots.tolist()])  # the instructions at each position
+        codes = []
+        operands = []
+        for column in columns:
+            code, arg = column[0]
+            codes.append(code)
+            if code == _PUSH:
+                operands.append(np.array([arg for _, arg in column], dtype=np.float64))
+            elif code == _LOAD:
+                operands.append(np.array([arg for _, arg in column], dtype=np.intp))
+            else:
+                operands.append(_VECTOR_OPERATORS.get(arg, arg))
+        plan.append((slots, tuple(codes), operands))
+    return plan
+
+def _evaluate_levels(plan, size):
+    """This function evaluates a spreadsheet level by level: the expressions of each group are computed
+       together as array operations over the flat array of the values of the cells. As for the scalar
+       evaluation, a division by zero is an error, while an overflow results in an infinite value.
+
+       Args:
+           plan: the list of the groups returned by _plan_levels.
+           size: the number of cells.
+       Returns:
+           the float64 array of the values of the cells, indexed by slot.
+    """
+    values = np.zeros(size, dtype=np.float64)
+    with np.errstate(all='ignore'):
+        for slots, codes, operands in plan:
+            stack = []
+            for code, operand in itertools.izip(codes, operands):
+                if code == _PUSH:
+                    stack.append(operand)
+                elif code == _LOAD:
+                    stack.append(values[operand])
+                elif code == _BINARY:
+                    a = stack.pop()
+                    if operand is operator.div and not a.all():
+                        raise ZeroDivisionError('float division by zero')
+                    stack.append(operand(stack.pop(), a))
+                else:
+                    stack.append(operand(stack.pop(), 1.0))
+            values[slots] = stack[0]
+    return values
+
+def _get_partitions(dependencies, order, count):
+    """This function splits the cells into independent parts (the connected components of the dependency
+       graph), then packs the parts into the given number of partitions of about the same size. The cells
+       of each partition keep the topological order, so a partition can be evaluated on its own.
+
+       Args:
+           dependencies: the list of the sets of the slots each cell refers to, indexed by slot.
+           order: the list of the slots sorted topologically.
+           count: the number of partitions.
+       Returns:
+           the list of the non-empty partitions, each one as a list of sorted slots.
+    """
+    parents = range(len(dependencies))
+
+    def find(slot):
+        while parents[slot] != slot:
+            parents[slot] = parents[parents[slot]]  # Halves the path
+            slot = parents[slot]
+        return slot
+
+    for slot, references in enumerate(dependencies):
+        for reference in references:
+            parents[find(reference)] = find(slot)
+    components = collections.defaultdict(list)
+    for slot in order:
+        components[find(slot)].append(slot)
+    partitions = [[] for _ in xrange(count)]
+    for component in sorted(components.itervalues(), key=len, reverse=True):
+        min(partitions, key=len).extend(component)  # The biggest parts first, into the smallest partition
+    return [partition for partition in partitions if partition]
+
+def _evaluate_partition(cells):
+    """This function evaluates a partition of the spreadsheet into a forked process: the single values
+       are written into the shared array, while the other resulting stacks are sent back.
+
+       Args:
+           cells: the list of the sorted slots of the partition.
+       Returns:
+           the dictionary mapping the slot of each cell not resulting in a single value to its stack.
+    """
+    programs, shared = _parallel_state
+    values = {}
+    stacks = {}
+    for slot in cells:
+        stack = values[slot] = _evaluate(programs[slot], values)
+        if len(stack) == 1:
+            shared[slot] = stack[0]
         else:
-            new_expression.append(str(token))
-    return _calc_basic(new_expression)
-        
-def _calc(spreadsheet):
-    """This function calls _calc_one for every spreadsheet cell. This means that the
-       expression contained in each cell is recursively evaluated.
-       
+            stacks[slot] = stack
+    return stacks
+
+def _evaluate_parallel(programs, dependencies, order, processes):
+    """This function evaluates the independent partitions of a spreadsheet on a pool of processes. The
+       processes are forked after the programs have been compiled, so only the slots of each partition
+       are sent to them, while the values are gathered into an array shared among all the processes.
+
+       Args:
+           programs: the list of the compiled expressions, indexed by slot.
+           dependencies: the list of the sets of the slots each cell refers to, indexed by slot.
+           order: the list of the slots sorted topologically.
+           processes: the number of processes.
+       Returns:
+           the list of the resulting stacks, indexed by slot.
+    """
+    global _parallel_state
+    partitions = _get_partitions(dependencies, order, processes * _PARTITIONS_PER_PROCESS)
+    _parallel_state = programs, multiprocessing.RawArray('d', len(programs))
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(_evaluate_partition, partitions)
+    finally:
+        pool.close()
+        pool.join()
+    values = [[value] for value in _parallel_state[1]]
+    _parallel_state = None
+    for stacks in results:
+        for slot, stack in stacks.iteritems():
+            values[slot] = stack
+    return values
+
+def _calc(spreadsheet, vectorized=False, processes=None):
+    """This function evaluates every spreadsheet cell exactly once, after the cells it refers to,
+       and replaces its expression with the resulting stack. The time needed is linear in the number
+       of cells plus references.
+
        Args:
            spreadsheet: the spreadsheet at issue.
+           vectorized: tells whether the cells should be evaluated level by level through NumPy, when possible.
+           processes: the number of processes evaluating the independent parts of the spreadsheet.
+       Returns:
+           the evaluated Spreadsheet.
+    """
+    sheet = Spreadsheet(spreadsheet, vectorized, processes)
+    for key, slot in sheet.slots.iteritems():
+        spreadsheet[key] = sheet.values[slot]
+    return sheet
+
+class Spreadsheet(object):
+    """This class keeps an evaluated spreadsheet in memory. Each cell is given a slot: the compiled
+       expressions, the dependencies, the reverse dependencies and the resulting stacks of the cells are
+       all indexed by slot, so that setting a cell only recomputes the cells which depend on it, directly
+       or not, without parsing their expressions again.
+    """
+
+    def __init__(self, cells, vectorized=False, processes=None):
+        """Compiles the given cells, builds their dependency graph and evaluates all of them.
+
+           Args:
+               cells: the dictionary mapping each cell to its expression (as a list of tokens).
+               vectorized: tells whether the cells should be evaluated level by level through NumPy,
+                           when possible.
+               processes: the number of processes evaluating the independent parts of the spreadsheet
+                          (by default, the spreadsheet is evaluated by the current process).
+        """
+        self.keys = list(cells)
+        if not all(_IS_CELL_REGEXP.match(key) for key in self.keys):
+            raise ValueError('An invalid cell was given! Please check your input.')
+        self.slots = dict((key, slot) for slot, key in enumerate(self.keys))
+        constants = {}  # shares the instructions of the numbers and operators among all the cells
+        self.programs = [_compile(cells[key], self.slots, constants) for key in self.keys]
+        self.dependencies = [_get_references(program) for program in self.programs]
+        self.dependents = [set() for _ in self.keys]
+        for slot, references in enumerate(self.dependencies):
+            for reference in references:
+                self.dependents[reference].add(slot)
+        plan = _plan_levels(self.programs, self.dependencies) if vectorized else None
+        if plan is not None:
+            self.values = [[value] for value in _evaluate_levels(plan, len(self.keys)).tolist()]
+        elif processes > 1:
+            self.values = _evaluate_parallel(self.programs, self.dependencies, _sort_cells(self.dependencies),
+                                             processes)
+        else:
+            self.values = [None] * len(self.keys)
+            for slot in _sort_cells(self.dependencies):
+                self.values[slot] = _evaluate(self.programs[slot], self.values)
+
+    def __getitem__(self, key):
+        """Returns the computed value of a cell.
+
+           Args:
+               key: the cell at issue.
+           Returns:
+               the floating point value of the cell.
+        """
+        return self.values[self.slots[key]][0]
+
+    def _get_affected(self, slot):
+        """Collects a cell together with all the cells which depend on it, directly or not.
+
+           Args:
+               slot: the slot of the cell at issue.
+           Returns:
+               the set of the slots of the affected cells.
+        """
+        affected = set([slot])
+        stack = [slot]
+        while stack:
+            for dependent in self.dependents[stack.pop()]:
+                if dependent not in affected:
+                    affected.add(dependent)
+                    stack.append(dependent)
+        return affected
+
+    def _link(self, slot, references):
+        """Replaces the references of a cell into both the dependencies and the reverse dependencies.
+
+           Args:
+               slot: the slot of the cell at issue.
+               references: the set of the slots of the cells it refers to.
+        """
+        for reference in self.dependencies[slot] - references:
+            self.dependents[reference].discard(slot)
+        for reference in references - self.dependencies[slot]:
+            self.dependents[reference].add(slot)
+        self.dependencies[slot] = references
+
+    def set(self, key, expression):
+        """Sets the expression of a cell and recomputes the cells which depend on it in dependency order.
+           The spreadsheet is left unchanged if any error occurs, either while checking the new expression
+           or while evaluating it or its dependents (e.g. a division by zero).
+
+           Args:
+               key: the cell at issue.
+               expression: the new expression, either as a string or as a list of tokens.
+           Returns:
+               the list of the cells whose value has changed, in evaluation order.
+           Raises:
+               ValueError: if the cell, the expression or the resulting dependencies are not valid.
+        """
+        if isinstance(expression, basestring):
+            expression = expression.split()
+        if key not in self.slots:
+            raise ValueError('An invalid cell was given! Please check your input.')
+        slot = self.slots[key]
+        program = _compile(expression, self.slots)
+        references = _get_references(program)
+        affected = self._get_affected(slot)
+        if references & affected:
+            raise ValueError('A cyclic dependence was found! Please check your input.')
+        value = _evaluate(program, self.values)  # Fails before anything is changed
+        old_program, old_references = self.programs[slot], self.dependencies[slot]
+        self._link(slot, references)
+        self.programs[slot] = program
+        changed = []
+        old_values = {}  # The previous stacks of the changed cells, restored on failure
+        try:
+            for cell in _sort_cells(self.dependencies, affected):
+                if cell != slot:
+                    if not self.dependencies[cell] & old_values.viewkeys():
+                        continue  # None of the cells it refers to has changed
+                    value = _evaluate(self.programs[cell], self.values)
+                if value != self.values[cell]:
+                    old_values[cell] = self.values[cell]
+                    self.values[cell] = value
+                    changed.append(cell)
+        except:
+            for cell, old_value in old_values.iteritems():
+                self.values[cell] = old_value
+            self._link(slot, old_references)
+            self.programs[slot] = old_program
+            raise
+        return [self.keys[cell] for cell in changed]
+
+    def save(self, path):
+        """Writes the spreadsheet into a binary snapshot (see SpreadsheetSnapshot), so that it can be
+           queried or loaded again without parsing nor evaluating its cells. The cells are stored sorted
+           by label, so that a cell can be found by a binary search into the snapshot. The file is written
+           aside and then renamed, so that a process mapping the previous file is not disturbed.
+
+           Args:
+               path: the path of the snapshot file.
+        """
+        order = sorted(xrange(len(self.keys)), key=self.keys.__getitem__)
+        ranks = [0] * len(order)
+        for rank, slot in enumerate(order):
+            ranks[slot] = rank
+        labels = ''.join(self.keys[slot] for slot in order)
+        label_offsets = _get_offsets(len(self.keys[slot]) for slot in order)
+        program_offsets = _get_offsets(len(self.programs[slot]) for slot in order)
+        codes = array.array('B')
+        args = array.array('d')
+        for slot in order:
+            for code, arg in self.programs[slot]:
+                codes.append(code)
+                if code == _LOAD:
+                    args.append(ranks[arg])
+                elif code == _PUSH:
+                    args.append(arg)
+                else:
+                    args.append(_OPERATOR_CODES[arg])
+        stack_offsets = _get_offsets(len(self.values[slot]) for slot in order)
+        values = array.array('d', itertools.chain.from_iterable(self.values[slot] for slot in order))
+        dependent_offsets = _get_offsets(len(self.dependents[slot]) for slot in order)
+        dependents = array.array('I', (ranks[dependent] for slot in order
+                                       for dependent in sorted(self.dependents[slot])))
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as snapshot_file:
+            snapshot_file.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, len(order), len(labels), len(codes),
+                                                      len(values), len(dependents)))
+            for section in (label_offsets, labels, program_offsets, codes, args, stack_offsets, values,
+                            dependent_offsets, dependents):
+                if isinstance(section, array.array) and sys.byteorder != 'little':
+                    section = array.array(section.typecode, section)
+                    section.byteswap()
+                snapshot_file.write(section if isinstance(section, str) else section.tostring())
+        os.rename(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Loads a spreadsheet from a binary snapshot, without parsing nor evaluating its cells, so that
+           it can be edited again.
+
+           Args:
+               path: the path of the snapshot file.
+           Returns:
+               the loaded Spreadsheet.
+           Raises:
+               ValueError: if the file is not a valid snapshot.
+        """
+        snapshot = SpreadsheetSnapshot(path)
+        try:
+            label_offsets = snapshot.get_array('label_offsets')
+            labels = snapshot.get_bytes('labels')
+            program_offsets = snapshot.get_array('program_offsets')
+            codes = snapshot.get_array('codes')
+            args = snapshot.get_array('args')
+            stack_offsets = snapshot.get_array('stack_offsets')
+            values = snapshot.get_array('values')
+            dependent_offsets = snapshot.get_array('dependent_offsets')
+            dependents = snapshot.get_array('dependents')
+        finally:
+            snapshot.close()
+        sheet = cls.__new__(cls)
+        size = len(label_offsets) - 1
+        sheet.keys = [labels[label_offsets[slot]:label_offsets[slot + 1]] for slot in xrange(size)]
+        sheet.slots = dict((key, slot) for slot, key in enumerate(sheet.keys))
+        instructions = {}  # shares the instructions of the numbers and operators among all the cells
+        sheet.programs = []
+        for slot in xrange(size):
+            program = []
+            for i in xrange(program_offsets[slot], program_offsets[slot + 1]):
+                code, arg = codes[i], args[i]
+                if code == _LOAD:
+                    program.append((_LOAD, int(arg)))
+                    continue
+                instruction = instructions.get((code, arg))
+                if instruction is None:
+                    if code == _PUSH:
+                        instruction = (_PUSH, arg)
+                    else:
+                        instruction = (code, operators[_OPERATOR_TOKENS[int(arg)]])
+                    instructions[code, arg] = instruction
+                program.append(instruction)
+            sheet.programs.append(tuple(program))
+        sheet.dependencies = [_get_references(program) for program in sheet.programs]
+        sheet.dependents = [set(dependents[dependent_offsets[slot]:dependent_offsets[slot + 1]])
+                            for slot in xrange(size)]
+        sheet.values = [values[stack_offsets[slot]:stack_offsets[slot + 1]].tolist() for slot in xrange(size)]
+        return sheet
+
+class SpreadsheetSnapshot(object):
+    """This class reads a binary snapshot of an evaluated spreadsheet through mmap: the snapshot is not
+       loaded, so a process can answer queries about the cells straight away. The snapshot is made of a
+       header followed by the sections below (little-endian), where each cell is identified by its rank
+       among the labels sorted and the offsets of each section hold one more item than the cells:
+       * the cell table: the offsets of the labels (uint32) and the labels;
+       * the compiled expressions: the offsets of the programs (uint32), the instruction codes (uint8) and
+         the instruction arguments (float64), i.e. the constants, the referred cells and the operators;
+       * the values: the offsets of the resulting stacks (uint32) and their values (float64);
+       * the dependency index: the offsets of the dependents of each cell (uint32) and the dependents.
     """
-    for key, value in spreadsheet.items():
-        spreadsheet[key] = _calc_one(spreadsheet, [key], value)
+
+    def __init__(self, path):
+        """Maps the snapshot into memory and locates its sections, checking that they fill the whole file.
+
+           Args:
+               path: the path of the snapshot file.
+           Raises:
+               ValueError: if the file is not a valid snapshot (e.g. it is truncated).
+        """
+        with open(path, 'rb') as snapshot_file:
+            try:
+                self.buffer = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # The file is empty
+                raise ValueError('An invalid snapshot was given! Please check your input.')
+        try:
+            self._locate_sections()
+        except:
+            self.close()
+            raise
+
+    def _locate_sections(self):
+        """Reads the header of the snapshot and computes the offset of each section.
+
+           Raises:
+               ValueError: if the header, the sizes of the sections or their offsets do not match the file.
+        """
+        if len(self.buffer) < _SNAPSHOT_HEADER.size:
+            raise ValueError('An invalid snapshot was given! Please check your input.')
+        magic, self.size, labels, instructions, values, dependents = _SNAPSHOT_HEADER.unpack_from(self.buffer)
+        if magic != _SNAPSHOT_MAGIC:
+            raise ValueError('An invalid snapshot was given! Please check your input.')
+        self.sections = {}
+        offset = _SNAPSHOT_HEADER.size
+        for name, typecode, count in (('label_offsets', 'I', self.size + 1), ('labels', 'c', labels),
+                                      ('program_offsets', 'I', self.size + 1), ('codes', 'B', instructions),
+                                      ('args', 'd', instructions), ('stack_offsets', 'I', self.size + 1),
+                                      ('values', 'd', values), ('dependent_offsets', 'I', self.size + 1),
+                                      ('dependents', 'I', dependents)):
+            item = struct.Struct('<' + typecode)
+            self.sections[name] = (offset, item, count)
+            offset += item.size * count
+        if offset != len(self.buffer):
+            raise ValueError('An invalid snapshot was given! Please check your input.')
+        for name, count in (('label_offsets', labels), ('program_offsets', instructions),
+                            ('stack_offsets', values), ('dependent_offsets', dependents)):
+            if self._get_item(name, self.size) != count:  # The items of the last cell end the section
+                raise ValueError('An invalid snapshot was given! Please check your input.')
+
+    def _get_item(self, name, index):
+        """Reads an item of a section.
+
+           Args:
+               name: the name of the section.
+               index: the index of the item.
+           Returns:
+               the item.
+        """
+        offset, item, _ = self.sections[name]
+        return item.unpack_from(self.buffer, offset + index * item.size)[0]
+
+    def get_bytes(self, name):
+        """Returns a whole section as a string.
+
+           Args:
+               name: the name of the section.
+           Returns:
+               the bytes of the section.
+        """
+        offset, item, count = self.sections[name]
+        return self.buffer[offset:offset + item.size * count]
+
+    def get_array(self, name):
+        """Returns a whole section as an array.
+
+           Args:
+               name: the name of the section.
+           Returns:
+               the array of the items of the section.
+        """
+        section = array.array(self.sections[name][1].format[1])
+        section.fromstring(self.get_bytes(name))
+        if sys.byteorder != 'little':
+            section.byteswap()
+        return section
+
+    def _get_label(self, slot):
+        """Returns the label of a cell.
+
+           Args:
+               slot: the rank of the cell.
+           Returns:
+               the label of the cell.
+        """
+        offset = self.sections['labels'][0]
+        return self.buffer[offset + self._get_item('label_offsets', slot):
+                           offset + self._get_item('label_offsets', slot + 1)]
+
+    def find(self, key):
+        """Finds a cell through a binary search among the sorted labels.
+
+           Args:
+               key: the cell at issue.
+           Returns:
+               the rank of the cell, or None if the cell does not exist.
+        """
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_label(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.size and self._get_label(low) == key:
+            return low
+        return None
+
+    def __getitem__(self, key):
+        """Returns the computed value of a cell.
+
+           Args:
+               key: the cell at issue.
+           Returns:
+               the floating point value of the cell.
+           Raises:
+               KeyError: if the cell does not exist.
+               IndexError: if the resulting stack of the cell is empty.
+        """
+        slot = self.find(key)
+        if slot is None:
+            raise KeyError(key)
+        offset = self._get_item('stack_offsets', slot)
+        if offset == self._get_item('stack_offsets', slot + 1):
+            raise IndexError(key)
+        return self._get_item('values', offset)
+
+    def close(self):
+        """Unmaps the snapshot.
+        """
+        self.buffer.close()
         
+def _get_offsets(lengths):
+    """This function computes the offsets of consecutive items from their lengths.
+
+       Args:
+           lengths: the iterable of the lengths of the items.
+       Returns:
+           the array of the offsets (uint32), holding one more offset than the items.
+    """
+    offsets = array.array('I', [0])
+    for length in lengths:
+        offsets.append(offsets[-1] + length)
+    return offsets
+
+def _get_row_label(row):
+    """This function computes the label of a row: A, B, ..., Z, AA, AB, ..., AZ, BA, ...
+
+       Args:
+           row: the index of the row (starting from 0).
+       Returns:
+           the label of the row.
+    """
+    label = ''
+    row += 1
+    while row:
+        row, letter = divmod(row - 1, 26)
+        label = chr(65 + letter) + label
+    return label
+
 def main():
-    """The main function of the program. It first collects the input into a proper data
-       structure, then it executes the computations needed to get the final results and
-       finally it prints the results in the required format.
-    """
-    n, m = map(int, raw_input().split())
-    rows_range = map(chr, range(65, 65+m))
-    cols_range = [i+1 for i in xrange(n)]
-    spreadsheet = {}
-    for r in rows_range:
-        for c in cols_range:
-            spreadsheet['%s%s' % (r,c)] = raw_input().split()
-    _calc(spreadsheet)
-    print n, m
-    for r in rows_range:
-        for c in cols_range:
-            print '%.5f' % spreadsheet['%s%s' % (r,c)][0]
+    """The main function of the program. It first collects the whole input at once into a proper data
+       structure, then it executes the computations needed to get the final results and finally it
+       writes all the results at once in the required format.
+    """
+    parser = argparse.ArgumentParser(description='Evaluates the spreadsheet read from the standard input.')
+    parser.add_argument('-vectorized', help='evaluates the spreadsheet level by level through NumPy',
+                        action='store_true')
+    parser.add_argument('-processes', help='evaluates the independent parts of the spreadsheet on N processes',
+                        type=int, metavar='N')
+    parser.add_argument('-save', help='writes a binary snapshot of the evaluated spreadsheet', metavar='PATH')
+    parser.add_argument('-load', help='prints the values of the given cells from a binary snapshot, without '
+                        'reading the standard input', nargs='+', metavar=('PATH', 'CELL'))
+    args = parser.parse_args()
+    if args.load:
+        try:
+            snapshot = SpreadsheetSnapshot(args.load[0])
+        except ValueError as e:
+            sys.exit(str(e))
+        except (IOError, OSError) as e:
+            sys.exit('The snapshot could not be read (%s)! Please check your input.' % e.strerror)
+        try:
+            values = [snapshot[key] for key in args.load[1:]]
+        except KeyError:
+            sys.exit('An invalid cell was given! Please check your input.')
+        except IndexError:
+            sys.exit('An empty cell was given! Please check your input.')
+        finally:
+            snapshot.close()
+        sys.stdout.write(''.join(['%.5f\n' % value for value in values]))
+        return
+    gc.disable()  # Millions of cells would trigger many useless collections
+    lines = sys.stdin.read().splitlines()
+    n, m = map(int, lines[0].split())
+    keys = ['%s%d' % (label, c) for label in map(_get_row_label, xrange(m)) for c in xrange(1, n + 1)]
+    if len(lines) <= len(keys):
+        sys.exit('Some spreadsheet cells are missing! Please check your input.')
+    spreadsheet = dict(itertools.izip(keys, (line.split() for line in itertools.islice(lines, 1, None))))
+    del lines  # Releases the input before the computations
+    try:
+        sheet = _calc(spreadsheet, args.vectorized, args.processes)
+    except ValueError as e:
+        sys.exit(str(e))
+    if args.save:
+        sheet.save(args.save)
+    sys.stdout.write('%d %d\n' % (n, m))
+    sys.stdout.write(''.join(['%.5f\n' % spreadsheet[key][0] for key in keys]))
 
 if __name__ == '__main__':
     """The entry point of the program. It simply calls the main function.
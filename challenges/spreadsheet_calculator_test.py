@@ -0,0 +1,238 @@
+"""
+Created on 17/10/2026
+
+@author: gioia
+
+This script provides test cases for the spreadsheet calculator.
+
+The code is organized as follows:
+- the SpreadsheetTest class tests both the evaluation and the incremental recalculation of the Spreadsheet (defined
+  in the spreadsheet_calculator module);
+- the SpreadsheetSnapshotTest class tests the binary snapshots written and read by both the Spreadsheet and the
+  SpreadsheetSnapshot (defined in the spreadsheet_calculator module).
+
+The programming language used is Python 2.7 and it is assumed you have it installed into your PC.
+The operating system of reference is Linux. There are two basic ways to execute this script in Linux:
+1 - launching it by the command shell through the python command;
+2 - making it executable first and then launching it by the command shell.
+
+
+Enjoy!
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from spreadsheet_calculator import Spreadsheet, SpreadsheetSnapshot, _get_row_label, np
+
+_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spreadsheet_calculator.py')
+
+
+class SpreadsheetTest(unittest.TestCase):
+    """
+    Provides tests for the Spreadsheet.
+    """
+
+    def setUp(self):
+        """
+        Sets up the test environment by evaluating a small spreadsheet: A1 = 4, A2 = A1 * 2, B1 = A2 + 1, B2 = 3.
+        """
+        self.sheet = Spreadsheet({'A1': ['4'], 'A2': ['A1', '2', '*'], 'B1': ['A2', '1', '+'], 'B2': ['3']})
+
+    def _get_state(self):
+        """
+        Returns a copy of the whole state of the spreadsheet.
+
+        :return: the tuple of the copied programs, dependencies, reverse dependencies and values
+        """
+        return (list(self.sheet.programs), [set(references) for references in self.sheet.dependencies],
+                [set(dependents) for dependents in self.sheet.dependents], [list(stack) for stack in self.sheet.values])
+
+    def test_set(self):
+        """
+        Tests that setting a cell recomputes the cells which depend on it, and only the changed ones are reported.
+        """
+        self.assertEqual(self.sheet.set('A1', '5'), ['A1', 'A2', 'B1'])
+        self.assertEqual([self.sheet[key] for key in ('A1', 'A2', 'B1', 'B2')], [5.0, 10.0, 11.0, 3.0])
+        self.assertEqual(self.sheet.set('A2', 'B2 2 * 4 +'), [])  # The value does not change
+        self.assertEqual(self.sheet.set('B2', '4'), ['B2', 'A2', 'B1'])  # A2 now depends on B2 only
+        self.assertEqual(self.sheet.set('A1', '1'), ['A1'])
+        self.assertEqual([self.sheet[key] for key in ('A1', 'A2', 'B1', 'B2')], [1.0, 12.0, 13.0, 4.0])
+
+    def test_invalid_expressions(self):
+        """
+        Tests that invalid cells, operands and cyclic dependencies raise ValueError and change nothing.
+        """
+        state = self._get_state()
+        self.assertRaises(ValueError, self.sheet.set, 'C1', '1')
+        self.assertRaises(ValueError, self.sheet.set, 'A1', '1 x +')
+        self.assertRaises(ValueError, self.sheet.set, 'A1', 'B1 1 +')
+        self.assertRaises(ValueError, self.sheet.set, 'A1', 'A1')
+        self.assertEqual(self._get_state(), state)
+
+    def test_evaluation_errors(self):
+        """
+        Tests that an error raised while evaluating either the cell or its dependents changes nothing.
+        """
+        self.sheet.set('B2', '1 A2 4 - /')  # B2 depends on A2, so it is evaluated after it
+        state = self._get_state()
+        self.assertRaises(ZeroDivisionError, self.sheet.set, 'A1', '1 0 /')
+        self.assertRaises(IndexError, self.sheet.set, 'A1', '+')
+        self.assertRaises(ZeroDivisionError, self.sheet.set, 'A1', '2')  # A2 is updated before B2 fails
+        self.assertEqual(self._get_state(), state)
+        self.assertEqual(sorted(self.sheet.set('A1', '3')), ['A1', 'A2', 'B1', 'B2'])
+
+    @unittest.skipIf(np is None, 'NumPy is not installed')
+    def test_vectorized(self):
+        """
+        Tests that the level by level evaluation gives the same values as the scalar one and detects the cycles.
+        """
+        cells = {'A1': ['4'], 'A2': ['A1', '2', '*'], 'A3': ['A2', '--'], 'B1': ['A2', '1', '+'], 'B2': ['3'],
+                 'B3': ['B2', 'A1', '-', 'A3', '/'], 'C1': ['B3', '2', '*'], 'C2': ['B1', '5', '*']}
+        sheet = Spreadsheet(cells, vectorized=True)
+        self.assertEqual(sheet.values, Spreadsheet(cells).values)
+        self.assertEqual(sheet.set('B2', '0'), ['B2', 'B3', 'C1'])
+        self.assertRaises(ValueError, Spreadsheet, dict(cells, A1=['C1']), vectorized=True)
+        sheet = Spreadsheet({'A1': ['1', '2'], 'A2': ['A1', '+']}, vectorized=True)  # A1 results in two values
+        self.assertEqual((sheet.values[sheet.slots['A1']], sheet['A2']), ([1.0, 2.0], 3.0))
+
+    def test_processes(self):
+        """
+        Tests that the evaluation on a pool of processes gives the same values as the scalar one, also for the
+        empty cells and the cells resulting in many values, and detects the cycles.
+        """
+        cells = {'A1': ['4'], 'A2': ['A1', '2', '*'], 'A3': ['A2', '1', '+'],  # The first independent part
+                 'B1': ['3'], 'B2': ['B1', '1.5', '--'], 'B3': ['B2', '+'],  # B2 results in two values
+                 'C1': [], 'C2': ['5'], 'C3': ['C2', 'C2', '*'], 'D1': ['7']}  # C1 is empty
+        sheet = Spreadsheet(cells, processes=2)
+        self.assertEqual(sheet.values, Spreadsheet(cells).values)
+        self.assertEqual((sheet.values[sheet.slots['B2']], sheet.values[sheet.slots['C1']]), ([3.0, 0.5], []))
+        self.assertEqual(sheet.set('A1', '5'), ['A1', 'A2', 'A3'])
+        self.assertRaises(ValueError, Spreadsheet, dict(cells, A1=['A3']), processes=2)
+
+    def test_row_labels(self):
+        """
+        Tests the labels of the rows across the boundaries where they get one more letter or change the first one.
+        """
+        self.assertEqual([_get_row_label(row) for row in (0, 25, 26, 27, 51, 52, 701, 702, 703)],
+                         ['A', 'Z', 'AA', 'AB', 'AZ', 'BA', 'ZZ', 'AAA', 'AAB'])
+
+    def test_rows_beyond_z(self):
+        """
+        Tests that a spreadsheet of 28 rows, whose last rows are labelled AA and AB, is read and evaluated.
+        """
+        cells = ['%d' % row for row in xrange(1, 27)] + ['Z1 2 *', 'AA1 A1 +']  # Z1 = 26, AA1 = 52, AB1 = 53
+        process = subprocess.Popen([sys.executable, _SCRIPT], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        output = process.communicate('1 28\n' + '\n'.join(cells) + '\n')[0]
+        self.assertEqual(process.returncode, 0)
+        self.assertEqual(output.splitlines(),
+                         ['1 28'] + ['%.5f' % row for row in xrange(1, 27)] + ['52.00000', '53.00000'])
+
+
+class SpreadsheetSnapshotTest(unittest.TestCase):
+    """
+    Provides tests for the binary snapshots of the Spreadsheet.
+    """
+
+    def setUp(self):
+        """
+        Sets up the test environment by saving a small spreadsheet, holding also an empty cell (C1) and a cell
+        resulting in two values (C2), into a temporary directory.
+        """
+        self.sheet = Spreadsheet({'A1': ['4'], 'A2': ['A1', '2', '*'], 'B1': ['A2', '1', '+'], 'B2': ['3'],
+                                  'C1': [], 'C2': ['B2', '1.5', '--']})
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'sheet.bin')
+        self.sheet.save(self.path)
+
+    def tearDown(self):
+        """
+        Removes the temporary directory.
+        """
+        shutil.rmtree(self.directory)
+
+    def _write(self, data):
+        """
+        Overwrites the snapshot file.
+
+        :param data: the new content of the file
+        """
+        with open(self.path, 'wb') as snapshot_file:
+            snapshot_file.write(data)
+
+    def test_snapshot(self):
+        """
+        Tests that the snapshot gives the values of the saved cells, while the missing cells raise KeyError
+        and the empty cells raise IndexError, as for the Spreadsheet.
+        """
+        snapshot = SpreadsheetSnapshot(self.path)
+        try:
+            for key in ('A1', 'A2', 'B1', 'B2', 'C2'):
+                self.assertEqual(snapshot[key], self.sheet[key])
+            self.assertRaises(KeyError, snapshot.__getitem__, 'D1')
+            self.assertRaises(IndexError, snapshot.__getitem__, 'C1')
+            self.assertRaises(IndexError, self.sheet.__getitem__, 'C1')
+        finally:
+            snapshot.close()
+
+    def test_save_while_open(self):
+        """
+        Tests that saving the spreadsheet again does not change the snapshot already open.
+        """
+        snapshot = SpreadsheetSnapshot(self.path)
+        try:
+            self.sheet.set('A1', '5')
+            self.sheet.save(self.path)
+            self.assertEqual(snapshot['A1'], 4.0)
+        finally:
+            snapshot.close()
+        snapshot = SpreadsheetSnapshot(self.path)
+        try:
+            self.assertEqual(snapshot['A1'], 5.0)
+        finally:
+            snapshot.close()
+        self.assertEqual(os.listdir(self.directory), ['sheet.bin'])
+
+    def test_load_errors(self):
+        """
+        Tests that the script reports a missing snapshot as an input error, rather than with a traceback.
+        """
+        process = subprocess.Popen([sys.executable, _SCRIPT, '-load', os.path.join(self.directory, 'missing.bin'),
+                                    'A1'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        error = process.communicate()[1]
+        self.assertEqual(process.returncode, 1)
+        self.assertEqual(error, 'The snapshot could not be read (No such file or directory)! '
+                                'Please check your input.\n')
+
+    def test_load(self):
+        """
+        Tests that the loaded spreadsheet holds the same cells as the saved one and can be edited again.
+        """
+        sheet = Spreadsheet.load(self.path)
+        self.assertEqual(sorted(sheet.keys), sorted(self.sheet.keys))
+        for key in self.sheet.keys:
+            self.assertEqual(sheet.values[sheet.slots[key]], self.sheet.values[self.sheet.slots[key]])
+        self.assertEqual(sheet.set('A1', '5'), self.sheet.set('A1', '5'))
+        self.assertEqual(sheet.set('B2', 'B1 2 /'), self.sheet.set('B2', 'B1 2 /'))
+        self.assertEqual([sheet[key] for key in ('A1', 'A2', 'B1', 'B2', 'C2')],
+                         [self.sheet[key] for key in ('A1', 'A2', 'B1', 'B2', 'C2')])
+
+    def test_invalid_snapshots(self):
+        """
+        Tests that empty, short, truncated, extended or foreign files raise ValueError.
+        """
+        with open(self.path, 'rb') as snapshot_file:
+            data = snapshot_file.read()
+        for invalid in ('', data[:10], data[:-1], data + '\0', 'RPN0' + data[4:], data[:4] + '\xff' * 20 + data[24:]):
+            self._write(invalid)
+            self.assertRaises(ValueError, SpreadsheetSnapshot, self.path)
+            self.assertRaises(ValueError, Spreadsheet.load, self.path)
+
+
+if __name__ == '__main__':
+    """The entry point of the program. It simply runs the test cases.
+    """
+    unittest.main()